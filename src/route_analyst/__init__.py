@@ -1,3 +1,30 @@
-from .responses import *
-from .routes import *
-from .clients import *
+"""
+Submodules are imported on first access of their classes, e.g. ``from route_analyst import ORSRoutingClient``,
+so that importing the package doesn't import geopandas, pandas and matplotlib.
+"""
+import importlib
+
+_LAZY_ATTRIBUTES = {
+    "GoogleDirectionsResponse": "responses",
+    "ORSDirectionsResponse": "responses",
+    "GoogleRoute": "routes",
+    "ORSRoute": "routes",
+    "GoogleRoutingClient": "clients",
+    "ORSRoutingClient": "clients",
+}
+
+__all__ = list(_LAZY_ATTRIBUTES)
+
+
+def __getattr__(name):
+    try:
+        module = _LAZY_ATTRIBUTES[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
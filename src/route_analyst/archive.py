@@ -0,0 +1,279 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Memory-mapped coordinate archives of all routes of a city"""
+
+import json
+from pathlib import Path
+
+import numpy as np
+import shapely
+
+from .io import iter_google_routes
+from .routes import GoogleRoute, ORSRoute
+
+COORDINATES = "coordinates.f64"
+OFFSETS = "offsets.npy"
+IDS = "ids.npy"
+ATTRIBUTES = "attributes"
+
+
+class ArchiveWriter(object):
+    """
+    Writes a coordinate archive route by route, so that the routes of a city don't have to fit into memory
+
+    >>> with ArchiveWriter("data/berlin/archive/google") as writer:
+    ...     writer.add("h00_0_0", coordinates, duration=1200, distance=10500)
+    """
+
+    def __init__(self, directory):
+        """
+        :param directory: Directory of the archive, created if it doesn't exist
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._coordinates = None
+        self._offsets = [0]
+        self._ids = []
+        self._attributes = {}
+
+    def __enter__(self):
+        self._coordinates = open(self.directory / COORDINATES, "wb")
+        return self
+
+    def __exit__(self, *exc_info):
+        self._coordinates.close()
+        if exc_info[0] is None:
+            self._finish()
+
+    def add(self, route_id, coordinates, **attributes):
+        """
+        Appends a route
+        :param route_id: Id of the route
+        :param coordinates: Vertices of the route, array-like of shape (n, 2)
+        :param attributes: Numeric attributes of the route, e.g. duration and distance
+        """
+        coordinates = np.asarray(coordinates, dtype="<f8")[:, :2]
+        self._coordinates.write(coordinates.tobytes())
+        self._offsets.append(self._offsets[-1] + len(coordinates))
+        for name, value in attributes.items():
+            self._attributes.setdefault(name, [np.nan] * len(self._ids)).append(value)
+        self._ids.append(str(route_id))
+        for values in self._attributes.values():
+            if len(values) < len(self._ids):
+                values.append(np.nan)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _finish(self):
+        np.save(self.directory / OFFSETS, np.asarray(self._offsets, dtype=np.int64))
+        np.save(self.directory / IDS, np.asarray(self._ids, dtype=str))
+        attribute_dir = self.directory / ATTRIBUTES
+        attribute_dir.mkdir(exist_ok=True)
+        for name, values in self._attributes.items():
+            np.save(attribute_dir / f"{name}.npy", np.asarray(values, dtype=np.float64))
+
+
+class CoordinateArchive(object):
+    """
+    Read-only view of a coordinate archive: one float64 vertex buffer of all routes, the offsets of each route in it,
+    the route ids and optional numeric attributes per route. The vertex buffer is memory-mapped, so processes reading
+    the same archive share its pages instead of each loading a copy, and the coordinates of a route are a view into
+    the buffer without any parsing.
+    """
+
+    def __init__(self, directory):
+        """
+        :param directory: Directory of an archive written by ArchiveWriter
+        """
+        self.directory = Path(directory)
+        self.offsets = np.load(self.directory / OFFSETS)
+        self.ids = np.load(self.directory / IDS)
+        n_vertices = int(self.offsets[-1])
+        if n_vertices:
+            self.vertices = np.memmap(
+                self.directory / COORDINATES,
+                dtype="<f8",
+                mode="r",
+                shape=(n_vertices, 2),
+            )
+        else:
+            self.vertices = np.empty((0, 2))
+        self.attributes = {
+            file.stem: np.load(file, mmap_mode="r")
+            for file in sorted((self.directory / ATTRIBUTES).glob("*.npy"))
+        }
+        self._index = None
+
+    @property
+    def index(self):
+        """
+        Returns the position of each route id
+        :return: dict
+        """
+        if self._index is None:
+            self._index = {route_id: i for i, route_id in enumerate(self.ids.tolist())}
+        return self._index
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, route_id):
+        return route_id in self.index
+
+    def coordinates(self, route_id):
+        """
+        Returns the coordinates of a route as a read-only view into the vertex buffer
+        :param route_id: Id of the route
+        :return: numpy array of shape (n, 2)
+        """
+        i = self.index[route_id]
+        return self.vertices[self.offsets[i] : self.offsets[i + 1]]
+
+    def attributes_of(self, route_id):
+        """
+        Returns the attributes of a route
+        :param route_id: Id of the route
+        :return: dict
+        """
+        i = self.index[route_id]
+        return {name: float(values[i]) for name, values in self.attributes.items()}
+
+    def geometry(self, route_id):
+        """
+        Returns the geometry of a route
+        :param route_id: Id of the route
+        :return: LineString
+        """
+        return shapely.linestrings(self.coordinates(route_id))
+
+    def geometries(self, route_ids=None):
+        """
+        Creates the geometries of several routes in one vectorized call
+        :param route_ids: Ids of the routes. Default None, i.e. all routes
+        :return: numpy array of LineStrings
+        """
+        if route_ids is None:
+            return shapely.linestrings(
+                self.vertices,
+                indices=np.repeat(np.arange(len(self)), np.diff(self.offsets)),
+            )
+        positions = np.array([self.index[i] for i in route_ids], dtype=np.int64)
+        starts = self.offsets[positions]
+        lengths = self.offsets[positions + 1] - starts
+        # position of each vertex in the buffer: start of its route + its number within the route
+        vertex_index = np.repeat(
+            starts - (lengths.cumsum() - lengths), lengths
+        ) + np.arange(lengths.sum())
+        return shapely.linestrings(
+            self.vertices[vertex_index],
+            indices=np.repeat(np.arange(len(positions)), lengths),
+        )
+
+    def ors_route(self, route_id):
+        """
+        Creates an ORSRoute with the geometry and summary from the archive
+        :param route_id: Id of the route
+        :return: ORSRoute
+        """
+        return ORSRoute(
+            {"properties": {"summary": self.attributes_of(route_id)}},
+            coordinates=self.coordinates(route_id),
+        )
+
+    def google_route(self, google_route):
+        """
+        Creates a GoogleRoute with the geometry from the archive
+        :param google_route: Row of the Google routes (Geo)DataFrame, its id has to be in the archive
+        :return: GoogleRoute
+        """
+        return GoogleRoute(google_route, coordinates=self.coordinates(google_route.id))
+
+
+def route_id_of(ors_file, ors_type):
+    """
+    Returns the Google route id of an ORS route file written by generate_ors_routes.py
+    :param ors_file: Path of the file, i.e. route_{ors_type}_{hour}_{id}.geojson
+    :param ors_type: ORS type
+    :return: str
+    """
+    return Path(ors_file).stem[len(f"route_{ors_type}_") :].split("_", 1)[1]
+
+
+def write_ors_archive(ors_routes_dir, ors_type, directory):
+    """
+    Archives the coordinates, duration and distance of all ORS routes of an ORS type
+    :param ors_routes_dir: Directory with the ORS routes written by generate_ors_routes.py
+    :param ors_type: ORS type
+    :param directory: Directory of the archive
+    :return: Number of archived routes
+    """
+    with ArchiveWriter(directory) as writer:
+        for file in sorted(Path(ors_routes_dir).glob(f"route_{ors_type}_*.geojson")):
+            with open(file) as src:
+                feature = json.load(src)["features"][0]
+            writer.add(
+                route_id_of(file, ors_type),
+                feature["geometry"]["coordinates"],
+                **feature["properties"]["summary"],
+            )
+        return len(writer)
+
+
+def write_google_archive(google_routes_file, directory, chunksize=10000):
+    """
+    Archives the coordinates of the Google routes under the ids used by route_analysis.py, i.e. with the
+    alternative route number appended
+    :param google_routes_file: Google routes file written by generate_google_routes.py
+    :param directory: Directory of the archive
+    :return: Number of archived routes
+    """
+    with ArchiveWriter(directory) as writer:
+        for route_id, geometry in iter_google_geometries(google_routes_file, chunksize):
+            writer.add(route_id, shapely.get_coordinates(geometry))
+        return len(writer)
+
+
+def iter_google_geometries(google_routes_file, chunksize=10000):
+    """
+    Iterates over the geometries of the Google routes under the ids used by route_analysis.py, i.e. with the
+    alternative route number appended
+    :param google_routes_file: Google routes file written by generate_google_routes.py
+    :return: generator of route ids and LineStrings
+    """
+    routes_id_list = set()
+    alternative_id = 0
+    for chunk in iter_google_routes(
+        google_routes_file, chunksize=chunksize, columns=[]
+    ):
+        for route_id, geometry in zip(chunk.id, chunk.geometry):
+            if route_id in routes_id_list:
+                alternative_id += 1
+            else:
+                alternative_id = 0
+                routes_id_list.add(route_id)
+            yield f"{route_id}_{alternative_id}", geometry
+
+
+def archive_dir(data_dir, city, route_set):
+    """
+    Returns the directory of the archive of a route set of a city
+    :param route_set: 'google' or the ORS type
+    :return: Path
+    """
+    return Path(data_dir) / city / "archive" / route_set
+
+
+def open_archives(data_dir, city):
+    """
+    Opens all archives of a city
+    :return: dict mapping the route set ('google' or the ORS type) to its CoordinateArchive
+    """
+    directory = Path(data_dir) / city / "archive"
+    if not directory.exists():
+        return {}
+    return {
+        route_set.name: CoordinateArchive(route_set)
+        for route_set in sorted(directory.iterdir())
+        if (route_set / OFFSETS).exists()
+    }
@@ -0,0 +1,306 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Cascade of increasingly expensive checks comparing the geometries of ORS and Google routes"""
+
+import threading
+
+import numpy as np
+import shapely
+
+from .shared import SharedArray, release, route_view, run_shared, share_routes
+
+from .similarity import (
+    METRIC_TOLERANCE,
+    _as_array,
+    bbox_gap,
+    bbox_lower_bound,
+    hausdorff,
+    point_segment_distances,
+    segment_overlap,
+)
+
+#: Tiers of the cascade in the order they are tried
+TIERS = ("identical", "bounds", "simplified", "full")
+
+#: Metrics computed by the cascade, named as the result columns of route_analysis.py
+METRICS = ("geometry_diff_perc", "geometry_diff_hausdorff")
+
+#: Tolerance of the simplified routes in metres
+SIMPLIFY_TOLERANCE = 2.0
+
+#: Number of route pairs per task of ComparisonCascade.compare_batch
+TASK_SIZE = 100
+
+
+def _douglas_peucker(coordinates, tolerance):
+    """Returns the positions of the vertices kept by the Douglas-Peucker algorithm"""
+    keep = np.zeros(len(coordinates), dtype=bool)
+    keep[[0, -1]] = True
+    pending = [(0, len(coordinates) - 1)]
+    while pending:
+        first, last = pending.pop()
+        if last - first < 2:
+            continue
+        distances = point_segment_distances(
+            coordinates[first + 1 : last], coordinates[[first, last]]
+        )
+        k = int(np.argmax(distances))
+        if distances[k] > tolerance:
+            k += first + 1
+            keep[k] = True
+            pending += [(first, k), (k, last)]
+    return np.flatnonzero(keep)
+
+
+def simplify(coordinates, tolerance):
+    """
+    Simplifies a line with the Douglas-Peucker algorithm. The line between two consecutive vertices of the
+    simplified line lies within tolerance of the segment connecting them.
+    :param coordinates: Array of shape (n, 2)
+    :param tolerance: Maximum distance of the removed vertices to the simplified line
+    :return: Array of shape (m, 2) with 2 <= m <= n and the positions of its vertices in coordinates, the first
+    position is 0 and the last n - 1
+    """
+    # repeated vertices are dropped, the first vertex of each repetition is kept
+    moved = np.ones(len(coordinates), dtype=bool)
+    moved[1:] = np.any(coordinates[1:] != coordinates[:-1], axis=1)
+    distinct = np.flatnonzero(moved)
+    line = coordinates[distinct]
+    if len(line) < 2:
+        positions = np.array([0, len(coordinates) - 1])
+        return coordinates[positions], positions
+    simple = shapely.get_coordinates(
+        shapely.simplify(shapely.linestrings(line), tolerance, preserve_topology=False)
+    )
+    # the vertices of the simplified line are a subsequence of the vertices of the line, found by their
+    # coordinates unless the line passes a vertex twice
+    keys = line[:, 0] + 1j * line[:, 1]
+    candidates = np.flatnonzero(np.isin(keys, simple[:, 0] + 1j * simple[:, 1]))
+    if len(candidates) != len(simple):
+        candidates = _douglas_peucker(line, tolerance)
+    positions = distinct[candidates]
+    positions[-1] = len(coordinates) - 1
+    return coordinates[positions], positions
+
+
+def _compare_slice(arrays, start, stop, tolerance, threshold, simplify_tolerance):
+    """
+    Compares the routes start:stop of a batch shared by ComparisonCascade.compare_batch to their reference routes
+    and writes the metrics to the shared output array
+    :return: Number of pairs decided by each tier per metric
+    """
+    cascade = ComparisonCascade(tolerance, threshold, simplify_tolerance)
+    for k in range(start, stop):
+        arrays["output"][k] = cascade.compare(
+            route_view(arrays["coordinates"], arrays["offsets"], k),
+            route_view(
+                arrays["reference_coordinates"],
+                arrays["reference_offsets"],
+                arrays["positions"][k],
+            ),
+        )
+    return cascade.counts
+
+
+def _within(starts, vectors, line, radius):
+    """Returns whether each segment lies entirely within radius of the line"""
+    if radius <= 0:
+        return np.zeros(len(starts), dtype=bool)
+    lengths = np.hypot(*vectors.T)
+    covered = segment_overlap(starts, vectors, line, radius)
+    return (lengths > 0) & (covered >= lengths * (1 - 1e-9))
+
+
+class ComparisonCascade(object):
+    """
+    Computes the geometry deviation in percent (the share of a route farther than the tolerance from the other
+    route, as ORSRoute.geometry_diff_perc) and the Hausdorff distance of route pairs in a metric CRS. Each metric
+    passes the tiers
+
+    - identical: both routes have the same coordinates, both metrics are 0
+    - bounds: the bounding boxes are farther apart than the tolerance, so the deviation is 100 %, or the bounding
+      boxes and the endpoints show that the Hausdorff distance exceeds the threshold
+    - simplified: each segment of the simplified route decides whether the part of the route it replaces lies
+      within the tolerance of the other route or outside it, or the vertices kept by the simplification show that
+      the Hausdorff distance exceeds the threshold
+    - full: the parts of the route which the simplified route can't decide and the Hausdorff distance are computed
+      at full resolution
+
+    until it is decided. Apart from the lower bound above the threshold the metrics are exact. The number of pairs
+    decided by each tier is counted per metric.
+
+    >>> cascade = ComparisonCascade(threshold=30)
+    >>> geometry_diff_perc, hausdorff_distance = cascade.compare(ors_coordinates, google_coordinates)
+    >>> cascade.report()
+    """
+
+    def __init__(
+        self,
+        tolerance=METRIC_TOLERANCE,
+        threshold=np.inf,
+        simplify_tolerance=SIMPLIFY_TOLERANCE,
+    ):
+        """
+        :param tolerance: Buffer of the geometry deviation in metres
+        :param threshold: Hausdorff distance in metres above which only a lower bound is computed, e.g. 30 if only
+        the matching routes are of interest. Default: all distances are computed.
+        :param simplify_tolerance: Tolerance of the simplified routes in metres, less than the tolerance
+        """
+        self.tolerance = tolerance
+        self.threshold = threshold
+        self.simplify_tolerance = simplify_tolerance
+        self.counts = {metric: dict.fromkeys(TIERS, 0) for metric in METRICS}
+        self._lock = threading.Lock()
+
+    def _resolved(self, geometry_diff_perc, hausdorff_distance, tiers):
+        with self._lock:
+            for metric, tier in zip(METRICS, tiers):
+                self.counts[metric][tier] += 1
+        return float(geometry_diff_perc), float(hausdorff_distance)
+
+    def _merge(self, counts):
+        """Adds the counts of another cascade, e.g. of a worker process"""
+        with self._lock:
+            for metric, tiers in counts.items():
+                for tier, count in tiers.items():
+                    self.counts[metric][tier] += count
+
+    def _hausdorff(self, a, b):
+        """Returns the Hausdorff distance or a lower bound above the threshold and the tier which decided it"""
+        if self.threshold == np.inf:
+            return hausdorff(a, b), "full"
+        # the endpoints are vertices, so their distances to the other route are lower bounds too
+        lower_bound = max(
+            bbox_lower_bound(a, b),
+            point_segment_distances(a[[0, -1]], b).max(),
+            point_segment_distances(b[[0, -1]], a).max(),
+        )
+        if lower_bound > self.threshold:
+            return lower_bound, "bounds"
+        lower_bound = max(
+            point_segment_distances(simplify(a, self.simplify_tolerance)[0], b).max(),
+            point_segment_distances(simplify(b, self.simplify_tolerance)[0], a).max(),
+        )
+        if lower_bound > self.threshold:
+            return lower_bound, "simplified"
+        return hausdorff(a, b), "full"
+
+    def _deviation(self, a, b):
+        """Returns the geometry deviation in percent and the tier which decided it"""
+        lengths = np.hypot(*np.diff(a, axis=0).T)
+        if lengths.sum() == 0:
+            inside = point_segment_distances(a[:1], b)[0] <= self.tolerance
+            return 0.0 if inside else 100.0, "full"
+        if bbox_gap(a, b) > self.tolerance:
+            return 100.0, "bounds"
+        # the part of a route replaced by a segment of its simplified route lies within the simplify tolerance of
+        # the segment, and the other route within the simplify tolerance of its simplified route. So the part lies
+        # within the tolerance of the other route if the segment lies within the tolerance minus twice the simplify
+        # tolerance of the other simplified route, and outside if the segment lies outside the tolerance plus twice
+        # the simplify tolerance.
+        simple_a, positions_a = simplify(a, self.simplify_tolerance)
+        simple_b = simplify(b, self.simplify_tolerance)[0]
+        margin = 2 * self.simplify_tolerance
+        starts, vectors = simple_a[:-1], np.diff(simple_a, axis=0)
+        inside = _within(starts, vectors, simple_b, self.tolerance - margin)
+        outside = (
+            segment_overlap(starts, vectors, simple_b, self.tolerance + margin) == 0
+        )
+        owner = np.repeat(np.arange(len(simple_a) - 1), np.diff(positions_a))
+        covered = lengths[inside[owner]].sum()
+        partial = np.flatnonzero(~(inside | outside)[owner])
+        tier = "simplified"
+        if len(partial):
+            covered += segment_overlap(
+                a[partial], a[partial + 1] - a[partial], b, self.tolerance
+            ).sum()
+            tier = "full"
+        # rounding may let the covered length exceed the length of the route
+        return max((1 - covered / lengths.sum()) * 100, 0.0), tier
+
+    def compare(self, a, b):
+        """
+        Compares a route to a reference route
+        :param a: Coordinates of the route in a metric CRS, e.g. of the ORS route
+        :param b: Coordinates of the reference route in the same CRS, e.g. of the Google route
+        :return: geometry deviation in percent and Hausdorff distance in metres
+        """
+        a, b = _as_array(a), _as_array(b)
+        if a.shape == b.shape and np.array_equal(a, b):
+            return self._resolved(0.0, 0.0, ("identical", "identical"))
+        if len(a) == 1:
+            a = np.repeat(a, 2, axis=0)
+        if len(b) == 1:
+            b = np.repeat(b, 2, axis=0)
+        deviation, deviation_tier = self._deviation(a, b)
+        distance, distance_tier = self._hausdorff(a, b)
+        return self._resolved(deviation, distance, (deviation_tier, distance_tier))
+
+    def compare_batch(
+        self, routes, references, positions=None, executor=None, task_size=TASK_SIZE
+    ):
+        """
+        Compares routes to their reference routes, in the worker processes of an executor if given. The coordinates
+        are placed once in shared memory and the workers write the metrics to a shared array, so neither the routes
+        nor the results are pickled. The counts of the workers are added to the counts of this cascade.
+        :param routes: Sequence of coordinate arrays in a metric CRS, e.g. of the ORS routes
+        :param references: Sequence of coordinate arrays of the reference routes, e.g. of the Google routes
+        :param positions: Position of the reference route of each route in references. Default None, i.e. the
+        reference of each route is at the same position.
+        :param executor: ProcessPoolExecutor. Default None, i.e. the routes are compared in this process.
+        :param task_size: Number of route pairs per task
+        :return: Array of shape (n, 2) with the geometry deviation in percent and the Hausdorff distance in metres
+        """
+        if positions is None:
+            positions = np.arange(len(routes))
+        positions = np.asarray(positions, dtype=np.int64)
+        if executor is None:
+            return np.array(
+                [
+                    self.compare(route, references[i])
+                    for route, i in zip(routes, positions)
+                ]
+            ).reshape(-1, 2)
+        references = share_routes(references)
+        handles = {
+            **share_routes(routes, positions=positions),
+            "reference_coordinates": references["coordinates"],
+            "reference_offsets": references["offsets"],
+            "output": SharedArray((len(routes), 2), np.float64),
+        }
+        try:
+            tasks = [
+                executor.submit(
+                    run_shared,
+                    _compare_slice,
+                    handles,
+                    start,
+                    min(start + task_size, len(routes)),
+                    self.tolerance,
+                    self.threshold,
+                    self.simplify_tolerance,
+                )
+                for start in range(0, len(routes), task_size)
+            ]
+            for task in tasks:
+                self._merge(task.result())
+            return handles["output"].array.copy()
+        finally:
+            release(handles)
+
+    def report(self):
+        """
+        Returns the number of compared pairs and the share of them decided by each tier per metric
+        :return: dict
+        """
+        n_pairs = sum(self.counts[METRICS[0]].values())
+        return {
+            "pairs": n_pairs,
+            **{
+                metric: {
+                    tier: count / n_pairs if n_pairs else None
+                    for tier, count in counts.items()
+                }
+                for metric, counts in self.counts.items()
+            },
+        }
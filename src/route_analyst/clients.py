@@ -1,18 +1,46 @@
-import openrouteservice as ors
+import time
+
 import requests
 
-from route_analyst import ORSDirectionsResponse
+from route_analyst.responses import ORSDirectionsResponse
+from route_analyst.routingpy.client_default import Client
+from route_analyst.routingpy.client_pool import PoolClient
+from route_analyst.routingpy.exceptions import RouterApiError
+from route_analyst.routingpy.hedging import HedgingPolicy
+from route_analyst.routingpy.metrics import MetricsRegistry
+from route_analyst.routingpy.singleflight import SingleFlight, request_key
+
+#: Base url of the public openrouteservice API, used if no base url is given
+ORS_API_URL = "https://api.openrouteservice.org"
 
 
 class ORSRoutingClient:
-    def __init__(self, base_url: str = None, api_key: str = None):
+    def __init__(
+        self,
+        base_url=None,
+        api_key: str = None,
+        eject_seconds: int = 30,
+        hedging: HedgingPolicy = None,
+        single_flight: bool = False,
+        metrics: MetricsRegistry = None,
+    ):
         """
         Initializes parameters and sends request to ORS server
         :param params: dict
-        :param base_url: string
+        :param base_url: string or list of strings. If a list is given, requests are distributed over all replicas
+        of the ORS instance (see route_analyst.routingpy.client_pool.PoolClient).
+        :param eject_seconds: Time in seconds a failing replica is taken out of rotation
+        :param hedging: Policy to send a duplicate request to another replica (or over another connection) if a
+        request is slow. Default None, i.e. no hedging.
+        :param single_flight: If True, concurrent identical requests share one network call and one parsed response.
+        :param metrics: Registry recording latency, status, payload sizes and parse time of every request, as well as
+        replica, hedging and single-flight statistics. Default None.
         """
         self.base_url = base_url  # if base_url else
         self.api_key = api_key
+        self.pool = None
+        self.single_flight = SingleFlight() if single_flight else None
+        self.metrics = metrics
         self.__headers = {
             "headers": {
                 "Accept": "application/json, application/geo+json, application/gpx+xml, img/png; charset=utf-8",
@@ -20,10 +48,36 @@ class ORSRoutingClient:
                 "Content-Type": "application/json; charset=utf-8",
             }
         }
-        if self.base_url:
-            self.client = ors.Client(base_url=self.base_url)
+        # routingpy sets its own JSON content type, which decides how the body is sent
+        headers = dict(self.__headers["headers"])
+        headers.pop("Content-Type")
+        if isinstance(self.base_url, (list, tuple)) or (self.base_url and hedging):
+            self.pool = PoolClient(
+                self.base_url,
+                eject_seconds=eject_seconds,
+                hedging=hedging,
+                metrics=metrics,
+                headers=headers,
+            )
+            self.pool.router = "ors"
         else:
-            self.client = ors.Client(key=self.api_key)
+            # routingpy's client records the status, payload sizes, retries and parse time of every request
+            self.client = Client(
+                (self.base_url or ORS_API_URL).rstrip("/"),
+                metrics=metrics,
+                headers=headers,
+            )
+            self.client.router = "ors"
+
+        if self.metrics is not None:
+            if self.pool is not None:
+                self.metrics.add_stats("routingpy_replica", self.stats)
+            if hedging is not None:
+                self.metrics.add_stats("routingpy_hedging", self.hedging_stats)
+            if self.single_flight is not None:
+                self.metrics.add_stats(
+                    "routingpy_single_flight", self.single_flight_stats
+                )
 
     def request(self, params: dict, profile: str, format: str):
         """
@@ -34,16 +88,66 @@ class ORSRoutingClient:
         :param params: dict containing request parameters
         :return: dict of ORS response
         """
-        try:
-            response = self.client.request(
-                url="/v2/directions/{}/{}".format(profile, format),
-                post_json=params,
-                requests_kwargs=self.__headers,
-                get_params=[],
+        if self.single_flight is not None:
+            return self.single_flight.do(
+                request_key(f"/v2/directions/{profile}/{format}", post_params=params),
+                self._request,
+                params,
+                profile,
+                format,
             )
-            return ORSDirectionsResponse(response)
-        except ors.exceptions.ApiError as e:
+        return self._request(params, profile, format)
+
+    def _request(self, params: dict, profile: str, format: str):
+        """
+        Send route request to ORS server and parse the response
+        :return: ORSDirectionsResponse
+        """
+        url = "/v2/directions/{}/{}".format(profile, format)
+        client = self.pool if self.pool is not None else self.client
+        try:
+            response = client._request(url, post_params=params)
+        except RouterApiError as e:
             raise ValueError(e.message)
+        return self._parse(response)
+
+    def _parse(self, response: dict):
+        """
+        Parses the JSON response into routes and records the time it takes. The time to decode the JSON is recorded
+        by the routingpy client.
+        :return: ORSDirectionsResponse
+        """
+        start = time.monotonic()
+        result = ORSDirectionsResponse(response)
+        if self.metrics is not None:
+            self.metrics.observe(
+                "route_analyst_response_parse_seconds",
+                time.monotonic() - start,
+                router="ors",
+            )
+        return result
+
+    def stats(self):
+        """
+        Returns latency and health statistics per replica if a pool of ORS instances is used
+        :return: list of dict
+        """
+        return self.pool.stats() if self.pool is not None else []
+
+    def hedging_stats(self):
+        """
+        Returns the number of hedged and wasted requests if hedging is enabled
+        :return: dict
+        """
+        return self.pool.hedging_stats() if self.pool is not None else {}
+
+    def single_flight_stats(self):
+        """
+        Returns the number of requests sent, requests which shared the response of an identical request in flight
+        and the time they waited, if single-flight is enabled
+        :return: dict
+        """
+        return self.single_flight.stats() if self.single_flight is not None else {}
 
 
 class GoogleRoutingClient:
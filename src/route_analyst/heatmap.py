@@ -0,0 +1,295 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Spatial aggregation of the route comparisons in square or hexagonal cells of a metric grid"""
+
+import json
+
+import numpy as np
+import pandas as pd
+import shapely
+
+from .projection import _as_array, transformer
+
+#: Cell shapes of the grid
+GRIDS = ("square", "hex")
+
+#: Default cell size in metres, the edge length of square cells and the distance between the centres of hexagons
+CELL_SIZE = 250.0
+
+#: Number of points per cell size at which the routes are sampled
+SAMPLES_PER_CELL = 4
+
+#: Number of chunk aggregates kept by HeatmapAccumulator before they are combined
+PENDING_SUMS = 8
+
+#: Key of the grid, cell size and CRS in the Parquet metadata
+METADATA_KEY = b"route_heatmap"
+
+
+def densify(routes, step):
+    """
+    Samples the routes at most step apart along each segment, all vertices included
+    :param routes: Sequence of coordinate arrays in a metric CRS, e.g. the segments of ORSRoute.as_dataframe() or the
+    raw coordinates of the routes
+    :param step: Maximum distance between consecutive points
+    :return: Array of shape (n, 2) of the points and the position of the route of each point
+    """
+    routes = [_as_array(route) for route in routes]
+    if not routes:
+        return np.empty((0, 2)), np.empty(0, dtype=np.int64)
+    vertices = np.concatenate(routes)
+    owner = np.repeat(np.arange(len(routes)), [len(route) for route in routes])
+    # segments connecting the last vertex of a route to the first of the next are dropped
+    same = owner[1:] == owner[:-1]
+    starts = vertices[:-1][same]
+    vectors = np.diff(vertices, axis=0)[same]
+    n_points = np.maximum(np.ceil(np.hypot(*vectors.T) / step).astype(np.int64), 1)
+    segment = np.repeat(np.arange(len(starts)), n_points)
+    position = np.arange(len(segment)) - np.repeat(
+        np.cumsum(n_points) - n_points, n_points
+    )
+    fraction = position / n_points[segment]
+    points = starts[segment] + vectors[segment] * fraction[:, None]
+    return (
+        np.concatenate([points, vertices]),
+        np.concatenate([owner[:-1][same][segment], owner]),
+    )
+
+
+def bin_points(points, cell_size, grid="square"):
+    """
+    Returns the cell of each point. Square cells are indexed by column and row, hexagons (pointy-top) by their axial
+    coordinates. The grid is aligned to the origin of the CRS, so the cells of different runs coincide.
+    :param points: Array of shape (n, 2) in a metric CRS
+    :param cell_size: Edge length of square cells or distance between the centres of neighbouring hexagons
+    :param grid: 'square' or 'hex'
+    :return: Integer array of shape (n, 2)
+    """
+    points = np.asarray(points, dtype=np.float64)
+    if grid == "square":
+        return np.floor(points / cell_size).astype(np.int64)
+    if grid != "hex":
+        raise ValueError(f"Unknown grid {grid}, choose one of {GRIDS}")
+    # fractional cube coordinates rounded to the nearest hexagon
+    r = points[:, 1] * 2 / (np.sqrt(3) * cell_size)
+    q = points[:, 0] / cell_size - r / 2
+    s = -q - r
+    rq, rr, rs = np.round(q), np.round(r), np.round(s)
+    dq, dr, ds = np.abs(rq - q), np.abs(rr - r), np.abs(rs - s)
+    fix_q = (dq > dr) & (dq > ds)
+    fix_r = ~fix_q & (dr > ds)
+    rq = np.where(fix_q, -rr - rs, rq)
+    rr = np.where(fix_r, -rq - rs, rr)
+    return np.column_stack([rq, rr]).astype(np.int64)
+
+
+def cell_centres(cells, cell_size, grid="square"):
+    """
+    Returns the centres of cells
+    :param cells: Integer array of shape (n, 2) as returned by bin_points
+    :param cell_size: Cell size of the grid
+    :param grid: 'square' or 'hex'
+    :return: Array of shape (n, 2) in the CRS of the grid
+    """
+    cells = np.asarray(cells, dtype=np.float64)
+    if grid == "square":
+        return (cells + 0.5) * cell_size
+    q, r = cells.T
+    return np.column_stack([(q + r / 2) * cell_size, r * np.sqrt(3) / 2 * cell_size])
+
+
+def cell_polygons(cells, cell_size, grid="square"):
+    """
+    Creates the polygons of cells for mapping, e.g. gpd.GeoDataFrame(heatmap, geometry=cell_polygons(...), crs=crs)
+    :param cells: Integer array of shape (n, 2) as returned by bin_points
+    :param cell_size: Cell size of the grid
+    :param grid: 'square' or 'hex'
+    :return: numpy array of Polygons
+    """
+    centres = cell_centres(cells, cell_size, grid)
+    if grid == "square":
+        corners = np.array([[-1, -1], [1, -1], [1, 1], [-1, 1]]) * cell_size / 2
+    else:
+        angles = np.radians(np.arange(30, 360, 60))
+        corners = np.column_stack([np.cos(angles), np.sin(angles)]) * (
+            cell_size / np.sqrt(3)
+        )
+    return shapely.polygons(centres[:, None, :] + corners[None, :, :])
+
+
+def rasterize(routes, cell_size, grid="square"):
+    """
+    Returns the cells each route passes. A route may miss a cell whose corner it cuts by less than the sampling step
+    of cell_size / SAMPLES_PER_CELL.
+    :param routes: Sequence of coordinate arrays in a metric CRS
+    :param cell_size: Cell size of the grid
+    :param grid: 'square' or 'hex'
+    :return: DataFrame with the columns route (position in routes), i and j, one row per route and cell
+    """
+    points, owner = densify(routes, cell_size / SAMPLES_PER_CELL)
+    cells = bin_points(points, cell_size, grid)
+    return pd.DataFrame(
+        {"route": owner, "i": cells[:, 0], "j": cells[:, 1]}
+    ).drop_duplicates(ignore_index=True)
+
+
+class HeatmapAccumulator(object):
+    """
+    Accumulates the comparisons of ORS and Google routes per cell, ORS type and hour. A pair of routes counts in each
+    cell passed by the ORS route or the Google route, and disagrees in a cell if only one of them passes it. Per cell
+    the number of pairs, of Google and of ORS routes, the share of disagreeing pairs and the mean of the metric are
+    kept. The sums are accumulated chunk by chunk and combined every PENDING_SUMS chunks, so tens of thousands of
+    routes can be added while only the cells passed by any route are held.
+
+    >>> heatmap = HeatmapAccumulator(cell_size=250, grid="hex")
+    >>> heatmap.add(pairs, google_routes, ors_routes)
+    >>> heatmap.result(crs="EPSG:32633")
+    """
+
+    def __init__(self, cell_size=CELL_SIZE, grid="square", metric="duration_diff_perc"):
+        """
+        :param cell_size: Cell size of the grid in metres
+        :param grid: 'square' or 'hex'
+        :param metric: Result column averaged per cell
+        """
+        if grid not in GRIDS:
+            raise ValueError(f"Unknown grid {grid}, choose one of {GRIDS}")
+        self.cell_size = cell_size
+        self.grid = grid
+        self.metric = metric
+        self._sums = []
+
+    def add(self, pairs, google_routes, ors_routes):
+        """
+        Adds route pairs
+        :param pairs: DataFrame with one row per ORS route and the columns route_id, ors_type, hour and the metric,
+        e.g. read with read_results
+        :param google_routes: dict mapping the route ids to the coordinates of the Google routes in a metric CRS
+        :param ors_routes: Coordinates of the ORS route of each row of pairs in the same CRS
+        """
+        if not len(pairs):
+            return
+        codes, google_ids = pd.factorize(pairs["route_id"])
+        google = rasterize(
+            [google_routes[route_id] for route_id in google_ids],
+            self.cell_size,
+            self.grid,
+        ).merge(pd.DataFrame({"route": codes, "pair": np.arange(len(pairs))}))
+        ors = rasterize(ors_routes, self.cell_size, self.grid).rename(
+            columns={"route": "pair"}
+        )
+        # 1: only the Google route passes the cell, 2: only the ORS route, 3: both
+        passes = (
+            pd.concat(
+                [
+                    google[["pair", "i", "j"]].assign(source=1),
+                    ors.assign(source=2),
+                ],
+                ignore_index=True,
+            )
+            .groupby(["pair", "i", "j"], sort=False)["source"]
+            .sum()
+            .reset_index()
+        )
+        metric = pairs[self.metric].to_numpy(dtype=np.float64)[passes["pair"]]
+        passes = passes.assign(
+            ors_type=pairs["ors_type"].array.take(passes["pair"].to_numpy()),
+            hour=pairs["hour"].to_numpy()[passes["pair"]],
+            n_pairs=1,
+            n_google=(passes["source"] & 1) > 0,
+            n_ors=(passes["source"] & 2) > 0,
+            n_disagree=passes["source"] != 3,
+            metric_sum=np.nan_to_num(metric),
+            metric_count=~np.isnan(metric),
+        )
+        self._sums.append(self._aggregate(passes.drop(columns=["pair", "source"])))
+        if len(self._sums) > PENDING_SUMS:
+            self._combine()
+
+    @staticmethod
+    def _aggregate(sums):
+        return (
+            sums.groupby(["ors_type", "hour", "i", "j"], sort=False, observed=True)
+            .sum()
+            .reset_index()
+        )
+
+    def _combine(self):
+        """Combines the aggregates of the chunks added so far into one"""
+        self._sums = [self._aggregate(pd.concat(self._sums, ignore_index=True))]
+
+    def result(self, crs=None):
+        """
+        Returns the aggregated cells
+        :param crs: Metric CRS of the routes. If given, the longitude and latitude of the cell centres are added.
+        :return: DataFrame with one row per ORS type, hour and cell. The columns i and j index the cell (see
+        bin_points), x and y are its centre, n_pairs, n_google and n_ors count the pairs, Google and ORS routes
+        passing it, disagreement is the share of the pairs of which only one route passes it and mean_METRIC the
+        mean of the metric.
+        """
+        if self._sums:
+            self._combine()
+            sums = self._sums[0]
+        else:
+            sums = pd.DataFrame(
+                columns=["ors_type", "hour", "i", "j", "n_pairs", "n_google", "n_ors"]
+                + ["n_disagree", "metric_sum", "metric_count"]
+            )
+        centres = cell_centres(sums[["i", "j"]].to_numpy(), self.cell_size, self.grid)
+        heatmap = pd.DataFrame(
+            {
+                "ors_type": sums["ors_type"],
+                "hour": sums["hour"].astype("int8"),
+                "i": sums["i"].astype("int32"),
+                "j": sums["j"].astype("int32"),
+                "x": centres[:, 0],
+                "y": centres[:, 1],
+                "n_pairs": sums["n_pairs"].astype("int32"),
+                "n_google": sums["n_google"].astype("int32"),
+                "n_ors": sums["n_ors"].astype("int32"),
+                "disagreement": (sums["n_disagree"] / sums["n_pairs"]).astype(
+                    "float32"
+                ),
+                f"mean_{self.metric}": (
+                    sums["metric_sum"] / sums["metric_count"].where(lambda n: n > 0)
+                ).astype("float32"),
+            }
+        )
+        if crs is not None:
+            lon, lat = transformer(crs).transform(
+                heatmap["x"].to_numpy(), heatmap["y"].to_numpy(), direction="INVERSE"
+            )
+            heatmap["lon"], heatmap["lat"] = lon, lat
+        heatmap = heatmap.sort_values(["ors_type", "hour", "j", "i"], ignore_index=True)
+        heatmap.attrs = {"grid": self.grid, "cell_size": self.cell_size, "crs": crs}
+        return heatmap
+
+
+def write_heatmap(heatmap, path):
+    """
+    Writes a heatmap as Parquet. The grid, cell size and CRS are stored in the file metadata.
+    :param heatmap: DataFrame returned by HeatmapAccumulator.result
+    :param path: Output file
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    table = pa.Table.from_pandas(heatmap, preserve_index=False)
+    table = table.replace_schema_metadata(
+        {**table.schema.metadata, METADATA_KEY: json.dumps(heatmap.attrs)}
+    )
+    pq.write_table(table, path)
+
+
+def read_heatmap(path):
+    """
+    Reads a heatmap written by write_heatmap
+    :param path: Parquet file
+    :return: DataFrame with the grid, cell size and CRS in its attrs
+    """
+    import pyarrow.parquet as pq
+
+    table = pq.read_table(path)
+    heatmap = table.to_pandas()
+    heatmap.attrs = json.loads(table.schema.metadata.get(METADATA_KEY, b"{}"))
+    return heatmap
@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Chunked and filtered reading of the Google route files"""
+
+from itertools import islice
+
+import geopandas as gpd
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401
+    from pyogrio.raw import open_arrow
+except ImportError:  # pragma: no cover
+    open_arrow = None
+
+#: Number of routes read per chunk
+CHUNKSIZE = 10000
+
+#: Escape character of the LIKE patterns of route_filter
+LIKE_ESCAPE = "\\"
+
+
+def route_hours(ids):
+    """
+    Returns the departure hour encoded in the route ids, e.g. '07' for 'h07_12'
+    :param ids: pandas Series of route ids
+    :return: pandas Series of str
+    """
+    return ids.str.slice(1).str.split("_", n=1).str[0]
+
+
+def _quote(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def route_filter(hours=None, ids=None):
+    """
+    Creates the OGR SQL where clause selecting routes by departure hour and id
+    :param hours: Departure hours, e.g. [7, 8] or ['07', '08']
+    :param ids: Route ids
+    :return: str or None
+    """
+    clauses = []
+    if hours is not None:
+        # the underscore is a wildcard in LIKE patterns and has to be escaped
+        patterns = [_quote(f"h{int(hour):02d}{LIKE_ESCAPE}_%") for hour in hours]
+        escape = _quote(LIKE_ESCAPE)
+        clauses.append(
+            "("
+            + " OR ".join(f"id LIKE {pattern} ESCAPE {escape}" for pattern in patterns)
+            + ")"
+        )
+    if ids is not None:
+        clauses.append(f"id IN ({', '.join(_quote(i) for i in ids)})")
+    return " AND ".join(clauses) or None
+
+
+def _arrow_chunks(file, chunksize, where, bbox, columns, geometry):
+    """Streams the routes as Arrow record batches, filtered by GDAL"""
+    with open_arrow(
+        file,
+        columns=columns,
+        read_geometry=geometry,
+        where=where,
+        bbox=bbox,
+        batch_size=chunksize,
+        use_pyarrow=True,
+    ) as (meta, reader):
+        geometry_name = meta["geometry_name"] or "wkb_geometry"
+        for batch in reader:
+            df = batch.to_pandas()
+            if not geometry:
+                yield df
+                continue
+            geometries = gpd.GeoSeries.from_wkb(
+                df.pop(geometry_name), index=df.index, crs=meta["crs"]
+            )
+            yield gpd.GeoDataFrame(df, geometry=geometries)
+
+
+def _file_chunks(file, chunksize, bbox, columns, hours, ids, geometry):
+    """Streams the routes with fiona in a single pass and filters them afterwards"""
+    import fiona
+
+    with fiona.open(file) as src:
+        features = src.filter(bbox=bbox) if bbox is not None else iter(src)
+        while True:
+            batch = list(islice(features, chunksize))
+            if not batch:
+                return
+            chunk = gpd.GeoDataFrame.from_features(
+                batch, crs=src.crs_wkt, columns=[*src.schema["properties"], "geometry"]
+            )
+            if not geometry:
+                chunk = pd.DataFrame(chunk.drop(columns="geometry"))
+            yield _filter_chunk(chunk, columns, hours, ids, geometry)
+
+
+def _filter_chunk(chunk, columns, hours, ids, geometry):
+    """Applies the filters to a chunk read without pushing them down to GDAL"""
+    if hours is not None:
+        chunk = chunk[
+            route_hours(chunk.id).isin([f"{int(hour):02d}" for hour in hours])
+        ]
+    if ids is not None:
+        chunk = chunk[chunk.id.isin(ids)]
+    if columns is not None:
+        chunk = chunk[[*columns, "geometry"] if geometry else columns]
+    return chunk
+
+
+def iter_google_routes(
+    file,
+    chunksize=CHUNKSIZE,
+    hours=None,
+    ids=None,
+    bbox=None,
+    columns=None,
+    geometry=True,
+):
+    """
+    Iterates over the Google routes in chunks, so that the memory does not grow with the number of routes. The
+    filters are pushed down to GDAL if pyogrio and pyarrow are installed, so that only the matching routes are loaded.
+    :param file: Google routes file written by generate_google_routes.py
+    :param chunksize: Maximum number of routes per chunk
+    :param hours: Departure hours to read, e.g. [7, 8]. Default None, i.e. all
+    :param ids: Route ids to read. Default None, i.e. all
+    :param bbox: (xmin, ymin, xmax, ymax) the routes have to intersect. Default None, i.e. all
+    :param columns: Attribute columns to read. Default None, i.e. all. The id is always read.
+    :param geometry: If False, the geometries are not read, e.g. if they are taken from a CoordinateArchive
+    :return: generator of GeoDataFrames (DataFrames without geometry) with an additional column 'hour'
+    """
+    if columns is not None and "id" not in columns:
+        columns = ["id", *columns]
+    if open_arrow is not None:
+        chunks = _arrow_chunks(
+            file, chunksize, route_filter(hours, ids), bbox, columns, geometry
+        )
+    else:
+        chunks = _file_chunks(file, chunksize, bbox, columns, hours, ids, geometry)
+    for chunk in chunks:
+        if chunk.empty:
+            continue
+        chunk["hour"] = route_hours(chunk.id)
+        yield chunk
+
+
+def read_google_routes(file, hours=None, ids=None, bbox=None, columns=None):
+    """
+    Reads the filtered Google routes at once, see iter_google_routes
+    :return: GeoDataFrame
+    """
+    chunks = list(
+        iter_google_routes(file, hours=hours, ids=ids, bbox=bbox, columns=columns)
+    )
+    if not chunks:
+        return gpd.GeoDataFrame(columns=["id", "hour", "geometry"], geometry="geometry")
+    return gpd.GeoDataFrame(pd.concat(chunks, ignore_index=True), crs=chunks[0].crs)
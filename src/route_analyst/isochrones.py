@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Batch generation and comparison of isochrones across routing engines"""
+
+import hashlib
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+from .routingpy.routers import ORS
+
+logger = logging.getLogger(__name__)
+
+
+class IsochroneSource(object):
+    """A named routing engine and profile to request isochrones from"""
+
+    def __init__(self, name, router, profile, **isochrone_kwargs):
+        """
+        :param name: Name of the source, e.g. the ORS type
+        :param router: routingpy router offering an ``isochrones`` method (ORS, Valhalla, Graphhopper)
+        :param profile: Routing profile of the router, e.g. 'driving-car' for ORS or 'auto' for Valhalla
+        :param isochrone_kwargs: Additional arguments passed to ``router.isochrones``
+        """
+        self.name = name
+        self.router = router
+        self.profile = profile
+        self.isochrone_kwargs = isochrone_kwargs
+
+    def isochrones(self, center, intervals):
+        """
+        Requests the isochrones around a center
+        :param center: [lon, lat] of the center
+        :param intervals: list of time ranges in seconds
+        :return: list of (interval, exterior ring coordinates) tuples
+        """
+        isochrones = self.router.isochrones(
+            locations=list(center),
+            profile=self.profile,
+            intervals=list(intervals),
+            **self.isochrone_kwargs,
+        )
+        return [
+            (iso.interval, _exterior_ring(iso.geometry))
+            for iso in isochrones or []
+            if iso.geometry
+        ]
+
+
+def ors_sources(instances, profile="driving-car", **router_kwargs):
+    """
+    Creates isochrone sources for local ORS instances
+    :param instances: dict mapping the ORS type to its base url, e.g. ``ORS_INSTANCES``
+    :param profile: ORS routing profile
+    :return: list of IsochroneSource
+    """
+    return [
+        IsochroneSource(
+            ors_type, ORS(base_url=base_url.rstrip("/"), **router_kwargs), profile
+        )
+        for ors_type, base_url in instances.items()
+    ]
+
+
+def _exterior_ring(geometry):
+    """
+    Returns the exterior ring of an isochrone geometry, which is a ring for ORS and Graphhopper and a list of rings
+    for Valhalla polygons.
+    """
+    if isinstance(geometry[0][0], (list, tuple)):
+        return [c[:2] for c in geometry[0]]
+    return [c[:2] for c in geometry]
+
+
+def center_grid(aoi, spacing):
+    """
+    Creates a regular grid of isochrone centers within an area of interest
+    :param aoi: shapely polygon in EPSG:4326
+    :param spacing: Distance between centers in meters
+    :return: numpy array of [lon, lat] centers
+    """
+    aoi_series = gpd.GeoSeries([aoi], crs="epsg:4326")
+    utm = aoi_series.estimate_utm_crs()
+    aoi_utm = aoi_series.to_crs(utm).iloc[0]
+    xmin, ymin, xmax, ymax = aoi_utm.bounds
+    xx, yy = np.meshgrid(
+        np.arange(xmin + spacing / 2, xmax, spacing),
+        np.arange(ymin + spacing / 2, ymax, spacing),
+    )
+    xx, yy = xx.ravel(), yy.ravel()
+    inside = shapely.contains_xy(aoi_utm, xx, yy)
+    centers = gpd.GeoSeries(shapely.points(xx[inside], yy[inside]), crs=utm).to_crs(
+        "epsg:4326"
+    )
+    return shapely.get_coordinates(centers.values)
+
+
+class IsochroneCache(object):
+    """Caches isochrone rings on disk, one json file per source, center and intervals"""
+
+    def __init__(self, cache_dir):
+        self.cache_dir = Path(cache_dir)
+
+    def _path(self, source, center, intervals):
+        key = json.dumps(
+            [source.profile, [round(c, 6) for c in center], list(intervals)]
+        )
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return self.cache_dir / source.name / f"{digest}.json"
+
+    def get(self, source, center, intervals):
+        path = self._path(source, center, intervals)
+        if not path.is_file():
+            return None
+        with open(path) as src:
+            return [tuple(item) for item in json.load(src)]
+
+    def put(self, source, center, intervals, isochrones):
+        path = self._path(source, center, intervals)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as dst:
+            json.dump(isochrones, dst)
+
+
+def generate_isochrones(sources, centers, intervals, cache_dir=None, max_workers=8):
+    """
+    Requests isochrones for all centers from all sources concurrently
+    :param sources: list of IsochroneSource
+    :param centers: array of [lon, lat] centers
+    :param intervals: list of time ranges in seconds
+    :param cache_dir: Directory to cache responses in. Cached isochrones are not requested again.
+    :param max_workers: Number of concurrent requests
+    :return: GeoDataFrame with one polygon per source, center and interval, ordered by center, source (in the order
+    of sources) and interval
+    """
+    cache = IsochroneCache(cache_dir) if cache_dir else None
+    centers = [tuple(float(c) for c in center[:2]) for center in centers]
+
+    def request(source, center):
+        if cache:
+            cached = cache.get(source, center, intervals)
+            if cached is not None:
+                return cached
+        isochrones = source.isochrones(center, intervals)
+        if cache:
+            cache.put(source, center, intervals, isochrones)
+        return isochrones
+
+    names, center_ids, iso_intervals, rings = [], [], [], []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(request, source, center): (source.name, center_id)
+            for source in sources
+            for center_id, center in enumerate(centers)
+        }
+        for future in as_completed(futures):
+            name, center_id = futures[future]
+            try:
+                isochrones = future.result()
+            except Exception as e:
+                logger.warning(f"Could not process isochrone {name} - {center_id}:")
+                logger.warning(e)
+                continue
+            for interval, ring in isochrones:
+                names.append(name)
+                center_ids.append(center_id)
+                iso_intervals.append(interval)
+                rings.append(ring)
+
+    # the requests complete in any order, so the rows are sorted to write the same files on every run
+    ranks = {source.name: rank for rank, source in enumerate(sources)}
+    order = np.lexsort(
+        (iso_intervals, [ranks[name] for name in names], center_ids)
+    ).astype(np.int64)
+    return gpd.GeoDataFrame(
+        {
+            "source": [names[i] for i in order],
+            "center_id": np.asarray(center_ids, dtype=np.int64)[order],
+            "interval": np.asarray(iso_intervals, dtype=np.int64)[order],
+        },
+        geometry=_polygons([rings[i] for i in order]),
+        crs="epsg:4326",
+    )
+
+
+def _polygons(rings):
+    """Builds a shapely polygon array from a list of exterior rings in one vectorized call"""
+    if not rings:
+        return np.array([], dtype=object)
+    counts = np.fromiter((len(ring) for ring in rings), dtype=np.int64)
+    coords = np.concatenate([np.asarray(ring, dtype=np.float64) for ring in rings])
+    ring_index = np.repeat(np.arange(len(rings)), counts)
+    return shapely.polygons(shapely.linearrings(coords, indices=ring_index))
+
+
+def compare_isochrones(isochrones, reference="normal"):
+    """
+    Compares the isochrones of each source to the ones of a reference source with the same center and interval
+    :param isochrones: GeoDataFrame as returned by ``generate_isochrones``
+    :param reference: Name of the reference source
+    :return: DataFrame with area difference and intersection over union (IoU) per source, center and interval
+    """
+    projected = isochrones.to_crs(isochrones.estimate_utm_crs())
+    keys = ["center_id", "interval"]
+    ref = projected.loc[projected.source == reference, keys + ["geometry"]]
+    others = projected.loc[projected.source != reference]
+    pairs = pd.merge(
+        pd.DataFrame(others), pd.DataFrame(ref), on=keys, suffixes=("", "_reference")
+    )
+
+    geoms = np.asarray(pairs["geometry"].values)
+    ref_geoms = np.asarray(pairs["geometry_reference"].values)
+    area = shapely.area(geoms)
+    ref_area = shapely.area(ref_geoms)
+    intersection = shapely.area(
+        shapely.intersection(shapely.make_valid(geoms), shapely.make_valid(ref_geoms))
+    )
+    union = area + ref_area - intersection
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return pd.DataFrame(
+            {
+                "source": pairs["source"].values,
+                "reference": reference,
+                "center_id": pairs["center_id"].values,
+                "interval": pairs["interval"].values,
+                "area_sqm": area,
+                "reference_area_sqm": ref_area,
+                "area_diff_sqm": area - ref_area,
+                "area_diff_perc": (area - ref_area) / ref_area * 100,
+                "iou": np.where(union > 0, intersection / union, np.nan),
+            }
+        )
@@ -0,0 +1,316 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Incremental pipeline runner skipping stages whose inputs didn't change"""
+
+import hashlib
+import json
+import logging
+import subprocess
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+SKIPPED = "skipped"
+ADOPTED = "adopted"
+RAN = "ran"
+FAILED = "failed"
+UPSTREAM_FAILED = "upstream_failed"
+
+
+class Stage(object):
+    """A step of the pipeline with declared inputs, outputs and parameters"""
+
+    def __init__(
+        self, name, command, inputs=(), outputs=(), params=None, partition=None
+    ):
+        """
+        :param name: Unique name, e.g. 'ors_routes[berlin/normal]'
+        :param command: Command line run as subprocess (list of str) or a function without arguments
+        :param inputs: Files or directories read by the stage. Stages producing them run before this stage.
+        :param outputs: Files or directories written by the stage
+        :param params: dict of parameters which change the outputs, e.g. the ORS url
+        :param partition: dict describing the partition of the stage, e.g. {'city': 'berlin', 'ors_type': 'normal'}
+        """
+        self.name = name
+        self.command = command
+        self.inputs = [Path(p) for p in inputs]
+        self.outputs = [Path(p) for p in outputs]
+        self.params = params or {}
+        self.partition = partition or {}
+
+    @property
+    def kind(self):
+        """
+        Returns the name without the partition, e.g. 'ors_routes'
+        :return: str
+        """
+        return self.name.split("[")[0]
+
+    def run(self, cwd=None):
+        if callable(self.command):
+            self.command()
+        else:
+            subprocess.run([str(c) for c in self.command], cwd=cwd, check=True)
+
+    def __repr__(self):
+        return f"Stage({self.name})"
+
+
+class FileHasher(object):
+    """
+    SHA-256 content hashes of files and directories. File hashes are cached by path, size and modification time,
+    so unchanged files are not read again.
+    """
+
+    def __init__(self, cache=None, lock=None):
+        """
+        :param cache: dict of previously computed hashes, e.g. from the pipeline state
+        :param lock: Lock guarding the cache. Default None, i.e. a new lock. Code reading the whole cache, e.g. to
+        save it, has to hold the same lock.
+        """
+        self.cache = cache if cache is not None else {}
+        self._lock = lock if lock is not None else threading.Lock()
+
+    def file_hash(self, path):
+        stat = path.stat()
+        key = str(path.resolve())
+        signature = [stat.st_size, stat.st_mtime_ns]
+        with self._lock:
+            cached = self.cache.get(key)
+        if cached is not None and cached[:2] == signature:
+            return cached[2]
+        digest = hashlib.sha256()
+        with open(path, "rb") as src:
+            for block in iter(lambda: src.read(2**20), b""):
+                digest.update(block)
+        with self._lock:
+            self.cache[key] = [*signature, digest.hexdigest()]
+        return digest.hexdigest()
+
+    def __call__(self, path):
+        """
+        Returns the hash of a file or of the names and contents of all files in a directory. Compiled Python files in
+        __pycache__ directories are ignored.
+        :param path: Path of a file or directory
+        :return: str or None if the path doesn't exist
+        """
+        path = Path(path)
+        if path.is_file():
+            return self.file_hash(path)
+        if not path.is_dir():
+            return None
+        digest = hashlib.sha256()
+        files = (
+            p
+            for p in path.rglob("*")
+            if p.is_file() and "__pycache__" not in p.relative_to(path).parts
+        )
+        for file in sorted(files):
+            digest.update(str(file.relative_to(path)).encode())
+            digest.update(self.file_hash(file).encode())
+        return digest.hexdigest()
+
+
+def _contains(path, other):
+    """Returns True if other is path or lies within the directory path"""
+    return path == other or path in other.parents
+
+
+class Pipeline(object):
+    """
+    Runs stages as a DAG in dependency order, independent stages in parallel. A stage is skipped if its command,
+    parameters and the content hashes of its inputs equal those of its last successful run and its outputs exist.
+
+    Stages whose outputs exist but which have never been run by the pipeline (e.g. Google routes requested before)
+    are adopted, i.e. recorded as up to date without running them.
+    """
+
+    def __init__(self, stages, state_file, cwd=None, workers=1):
+        """
+        :param stages: list of Stage
+        :param state_file: JSON file storing the keys of the successful runs and the file hash cache
+        :param cwd: Working directory of the commands
+        :param workers: Number of stages run at the same time
+        """
+        self.stages = {stage.name: stage for stage in stages}
+        if len(self.stages) != len(stages):
+            raise ValueError("Stage names have to be unique.")
+        self.state_file = Path(state_file)
+        self.cwd = cwd
+        self.workers = workers
+        self.state = {"stages": {}, "files": {}}
+        if self.state_file.exists():
+            with open(self.state_file) as src:
+                self.state = json.load(src)
+        # the hasher adds to the file hashes of the state while _save writes it, so both share one lock
+        self._lock = threading.Lock()
+        self.hasher = FileHasher(self.state["files"], lock=self._lock)
+        self.dependencies = {
+            stage.name: {
+                other.name
+                for other in stages
+                if other is not stage
+                and any(
+                    _contains(output, path) or _contains(path, output)
+                    for path in stage.inputs
+                    for output in other.outputs
+                )
+            }
+            for stage in stages
+        }
+
+    def upstream(self, names):
+        """
+        Returns the stages and all stages they depend on
+        :param names: Names of stages
+        :return: set of names
+        """
+        selected, pending = set(), list(names)
+        while pending:
+            name = pending.pop()
+            if name not in selected:
+                selected.add(name)
+                pending.extend(self.dependencies[name])
+        return selected
+
+    def select(self, kinds=None, **partition):
+        """
+        Selects the stages of some kinds and partitions and the stages of these partitions they depend on
+        :param kinds: Stage kinds, e.g. ['analysis']. Default None, i.e. all
+        :param partition: Allowed values per partition key, e.g. city=['berlin'], ors_type=['normal']. Stages without
+        the key are not filtered by it.
+        :return: set of names
+        """
+
+        def in_partition(stage):
+            return all(
+                values is None
+                or key not in stage.partition
+                or stage.partition[key] in values
+                for key, values in partition.items()
+            )
+
+        names = [
+            stage.name
+            for stage in self.stages.values()
+            if (kinds is None or stage.kind in kinds) and in_partition(stage)
+        ]
+        return {
+            name for name in self.upstream(names) if in_partition(self.stages[name])
+        }
+
+    def key(self, stage):
+        """
+        Returns the hash of the command, parameters and inputs of a stage
+        :return: str
+        """
+        command = stage.command
+        if callable(command):
+            command = f"{command.__module__}.{command.__qualname__}"
+        description = {
+            "command": [str(c) for c in command]
+            if isinstance(command, (list, tuple))
+            else command,
+            "params": stage.params,
+            "inputs": {str(path): self.hasher(path) for path in stage.inputs},
+        }
+        return hashlib.sha256(
+            json.dumps(description, sort_keys=True, default=str).encode()
+        ).hexdigest()
+
+    def outputs_exist(self, stage):
+        return all(path.exists() for path in stage.outputs)
+
+    def is_fresh(self, stage, key):
+        return self.state["stages"].get(stage.name) == key and self.outputs_exist(stage)
+
+    def _save(self):
+        self.state_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.state_file.with_suffix(".tmp")
+        with open(tmp, "w") as dst:
+            json.dump(self.state, dst, indent=2)
+        tmp.replace(self.state_file)
+
+    def _execute(self, stage, force, dry_run):
+        missing = [str(path) for path in stage.inputs if not path.exists()]
+        if missing:
+            logger.info(f"Missing inputs of {stage.name}: {missing}")
+        key = self.key(stage)
+        if not force and self.is_fresh(stage, key):
+            return SKIPPED
+        if (
+            not force
+            and stage.name not in self.state["stages"]
+            and stage.outputs
+            and self.outputs_exist(stage)
+        ):
+            status = ADOPTED
+        elif dry_run:
+            return RAN
+        else:
+            logger.info(f"Running {stage.name}")
+            stage.run(self.cwd)
+            status = RAN
+        if not dry_run:
+            with self._lock:
+                self.state["stages"][stage.name] = key
+                self._save()
+        return status
+
+    def run(self, names=None, force=(), dry_run=False):
+        """
+        Runs the stages which are out of date
+        :param names: Names of the stages to run, e.g. from select. Default None, i.e. all
+        :param force: Names or kinds of stages which are run even if they are up to date
+        :param dry_run: If True, only reports which stages would run. Stages downstream of a stage that would run
+        are reported as running too.
+        :return: dict mapping the stage names to 'skipped', 'adopted', 'ran', 'failed' or 'upstream_failed'
+        """
+        names = set(self.stages) if names is None else set(names)
+        force = set(force)
+        pending = {name: self.dependencies[name] & names for name in names}
+        status = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            running = {}
+            while pending or running:
+                progress = True
+                while progress:
+                    progress = False
+                    for name in sorted(pending):
+                        dependencies = pending[name]
+                        if not all(d in status for d in dependencies):
+                            continue
+                        del pending[name]
+                        progress = True
+                        upstream = {status[d] for d in dependencies}
+                        if upstream & {FAILED, UPSTREAM_FAILED}:
+                            status[name] = UPSTREAM_FAILED
+                        elif dry_run and RAN in upstream:
+                            status[name] = RAN
+                        else:
+                            stage = self.stages[name]
+                            future = executor.submit(
+                                self._execute,
+                                stage,
+                                name in force or stage.kind in force,
+                                dry_run,
+                            )
+                            running[future] = name
+                if not running:
+                    if pending:
+                        raise ValueError(
+                            f"Cyclic dependencies between {sorted(pending)}"
+                        )
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        status[name] = future.result()
+                    except Exception as e:
+                        logger.error(f"Stage {name} failed: {e}")
+                        status[name] = FAILED
+                    logger.info(f"{name}: {status[name]}")
+        return status
@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Stage-level profiling of the route generation and analysis scripts"""
+
+import cProfile
+import json
+import platform
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+_END = object()
+
+
+class StageStats(object):
+    """Accumulated timings, peak memory and cProfile statistics of a named stage"""
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.wall_time = 0.0
+        self.max_time = 0.0
+        self.cpu_time = 0.0
+        self.peak_memory = None
+        self.profile = None
+
+    def add(self, wall_time, cpu_time):
+        self.calls += 1
+        self.wall_time += wall_time
+        self.max_time = max(self.max_time, wall_time)
+        self.cpu_time += cpu_time
+
+    def top_functions(self, n=20):
+        """
+        Returns the functions with the highest cumulative time in this stage
+        :param n: Number of functions
+        :return: list of dict
+        """
+        if self.profile is None:
+            return []
+        stats = pstats.Stats(self.profile)
+        rows = []
+        for (filename, line, function), (_, ncalls, tottime, cumtime, _) in sorted(
+            stats.stats.items(), key=lambda item: item[1][3], reverse=True
+        )[:n]:
+            rows.append(
+                {
+                    "function": f"{filename}:{line}({function})",
+                    "ncalls": ncalls,
+                    "tottime": tottime,
+                    "cumtime": cumtime,
+                }
+            )
+        return rows
+
+    def to_dict(self, n_functions=20):
+        result = {
+            "calls": self.calls,
+            "wall_time": self.wall_time,
+            "mean_time": self.wall_time / self.calls if self.calls else None,
+            "max_time": self.max_time,
+            "cpu_time": self.cpu_time,
+        }
+        if self.peak_memory is not None:
+            result["peak_memory_bytes"] = self.peak_memory
+        if self.profile is not None:
+            result["top_functions"] = self.top_functions(n_functions)
+        return result
+
+
+class Profiler(object):
+    """
+    Measures the wall and CPU time of named stages and optionally captures a cProfile and the tracemalloc peak
+    memory per stage. Writes a JSON report.
+
+    >>> profiler = Profiler(cprofile=True, memory=True)
+    >>> with profiler.stage("read_routes"):
+    ...     routes = gpd.read_file(file)
+    >>> profiler.write("profile.json")
+
+    Stages can be entered repeatedly (e.g. in a loop) and from several threads, their timings are accumulated.
+    cProfile and tracemalloc are process-wide, so they are only captured for stages that are entered while no other
+    stage is active. Nested and concurrent stages are timed only. A disabled profiler does nothing.
+    """
+
+    def __init__(self, enabled=True, cprofile=False, memory=False, name=None):
+        """
+        :param enabled: If False, stages are not measured at all
+        :param cprofile: If True, a cProfile is captured for each stage
+        :param memory: If True, the peak memory allocated by Python during each stage is traced with tracemalloc
+        :param name: Name of the profiled run, e.g. the script name
+        """
+        self.enabled = enabled
+        self.cprofile = cprofile
+        self.memory = memory
+        self.name = name
+        self.stages = {}
+        self._active = 0
+        self._lock = threading.Lock()
+        self._started = datetime.now()
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Context manager measuring the enclosed code as stage ``name``
+        :param name: Name of the stage
+        """
+        if not self.enabled:
+            yield
+            return
+
+        with self._lock:
+            stats = self.stages.get(name)
+            if stats is None:
+                stats = self.stages[name] = StageStats(name)
+            exclusive = self._active == 0
+            self._active += 1
+
+        profile = None
+        if exclusive and self.cprofile:
+            if stats.profile is None:
+                stats.profile = cProfile.Profile()
+            profile = stats.profile
+        trace_memory = exclusive and self.memory
+        if trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            memory_start = tracemalloc.get_traced_memory()[0]
+
+        start, cpu_start = time.perf_counter(), time.thread_time()
+        if profile is not None:
+            profile.enable()
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+            wall_time = time.perf_counter() - start
+            cpu_time = time.thread_time() - cpu_start
+            peak = None
+            if trace_memory:
+                peak = tracemalloc.get_traced_memory()[1] - memory_start
+            with self._lock:
+                self._active -= 1
+                stats.add(wall_time, cpu_time)
+                if peak is not None:
+                    stats.peak_memory = max(stats.peak_memory or 0, peak)
+
+    def iterate(self, name, iterable):
+        """
+        Yields the items of an iterable, measuring the time to produce each item as stage ``name``, e.g. to profile
+        reading a file in chunks
+        :param name: Name of the stage
+        :param iterable: Iterable, e.g. a generator
+        """
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                item = next(iterator, _END)
+            if item is _END:
+                return
+            yield item
+
+    def report(self, n_functions=20, **metadata):
+        """
+        Returns the profile report
+        :param n_functions: Number of functions with the highest cumulative time reported per stage
+        :param metadata: Additional information stored in the report, e.g. the command line arguments
+        :return: dict
+        """
+        with self._lock:
+            stages = {
+                name: stats.to_dict(n_functions) for name, stats in self.stages.items()
+            }
+        return {
+            "name": self.name,
+            "started": self._started.isoformat(),
+            "wall_time": time.perf_counter() - self._start,
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cprofile": self.cprofile,
+            "memory": self.memory,
+            "metadata": metadata,
+            "stages": stages,
+        }
+
+    def write(self, path, **metadata):
+        """
+        Writes the profile report as JSON
+        :param path: Output file
+        :param metadata: Additional information stored in the report
+        """
+        if not self.enabled:
+            return
+        with open(path, "w") as dst:
+            json.dump(self.report(**metadata), dst, indent=2, default=str)
+        if self.memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+
+def profiler_from_args(options, name=None):
+    """
+    Creates the profiler from the command line option of the scripts
+    :param options: None if profiling is disabled, otherwise a list which may contain 'cprofile' and 'memory'
+    :param name: Name of the profiled run
+    :return: Profiler
+    """
+    if options is None:
+        return Profiler(enabled=False, name=name)
+    return Profiler(
+        cprofile="cprofile" in options, memory="memory" in options, name=name
+    )
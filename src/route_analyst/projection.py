@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Reprojection of route coordinates into a local metric CRS"""
+
+from functools import lru_cache
+
+import numpy as np
+from pyproj import Transformer
+
+#: CRS of the route geometries
+GEOGRAPHIC_CRS = "EPSG:4326"
+
+
+def _as_array(coordinates):
+    """Returns the x and y coordinates of a coordinate list, array or LineString as array of shape (n, 2)"""
+    coordinates = getattr(coordinates, "coords", coordinates)
+    return np.asarray(coordinates, dtype=np.float64)[:, :2]
+
+
+def local_crs(lon, lat):
+    """
+    Returns the UTM zone of a location, a metric CRS with little distortion around it
+    :param lon: Longitude
+    :param lat: Latitude
+    :return: EPSG code, e.g. 'EPSG:32633' for Berlin
+    """
+    zone = int((lon + 180) // 6) % 60 + 1
+    return f"EPSG:{(32600 if lat >= 0 else 32700) + zone}"
+
+
+def local_crs_of(routes):
+    """
+    Returns the UTM zone of the centre of the bounding box of routes
+    :param routes: Sequence of coordinate arrays or LineStrings with longitudes and latitudes
+    :return: EPSG code
+    """
+    routes = [_as_array(route) for route in routes]
+    lower = np.min([route.min(axis=0) for route in routes], axis=0)
+    upper = np.max([route.max(axis=0) for route in routes], axis=0)
+    lon, lat = (lower + upper) / 2
+    return local_crs(lon, lat)
+
+
+@lru_cache(maxsize=None)
+def transformer(crs, source=GEOGRAPHIC_CRS):
+    """
+    Returns the transformer from the source CRS to crs. It is created once per CRS, since creating it takes longer
+    than transforming thousands of coordinates.
+    :param crs: Target CRS, e.g. 'EPSG:32633'
+    :param source: Source CRS
+    :return: pyproj.Transformer
+    """
+    return Transformer.from_crs(source, crs, always_xy=True)
+
+
+def project(coordinates, crs, source=GEOGRAPHIC_CRS):
+    """
+    Projects coordinates into crs
+    :param coordinates: Array-like of shape (n, 2) in the source CRS
+    :param crs: Target CRS
+    :param source: Source CRS
+    :return: Array of shape (n, 2)
+    """
+    coordinates = _as_array(coordinates)
+    x, y = transformer(crs, source).transform(coordinates[:, 0], coordinates[:, 1])
+    return np.column_stack([x, y])
+
+
+def project_routes(routes, crs, source=GEOGRAPHIC_CRS):
+    """
+    Projects the coordinates of several routes with one transformation of their concatenated coordinates
+    :param routes: Sequence of coordinate arrays or LineStrings, e.g. ORSRoute.coordinates
+    :param crs: Target CRS
+    :param source: Source CRS
+    :return: list of arrays of shape (n, 2), views into the projected buffer
+    """
+    routes = [_as_array(route) for route in routes]
+    if not routes:
+        return []
+    projected = project(np.concatenate(routes), crs, source)
+    return np.split(projected, np.cumsum([len(route) for route in routes])[:-1])
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Typed columnar (GeoParquet) storage of the route analysis results"""
+
+import geopandas as gpd
+import pandas as pd
+
+#: ORS types in the order of the analysis
+ORS_TYPES = ["normal", "modelled_mean", "modelled_p50", "modelled_p85", "uber_p85"]
+
+#: dtypes of the result columns written by route_analysis.py
+RESULT_DTYPES = {
+    "route_id": "string",
+    "ors_route": "string",
+    "ors_type": pd.CategoricalDtype(ORS_TYPES),
+    "hour": "int8",
+    "google_distance": "float64",
+    "ors_distance": "float64",
+    "google_dur_in_traffic_sec": "float64",
+    "google_dur_sec": "float64",
+    "ors_dur_sec": "float64",
+    "duration_diff_sec": "float64",
+    "duration_diff_perc": "float64",
+    "google_dist_meter": "float64",
+    "ors_dist_meter": "float64",
+    "distance_diff_meter": "float64",
+    "distance_diff_perc": "float64",
+    "geometry_diff_perc": "float64",
+    "geometry_diff_hausdorff": "float64",
+}
+
+#: Number of rows per Parquet row group. Readers skip row groups whose statistics don't match the filters.
+ROW_GROUP_SIZE = 50000
+
+
+def typed_results(results):
+    """
+    Casts the result columns to their dtypes, e.g. the ORS type to a category and the hour to int8
+    :param results: (Geo)DataFrame with the results of route_analysis.py
+    :return: (Geo)DataFrame
+    """
+    return results.astype(
+        {
+            column: dtype
+            for column, dtype in RESULT_DTYPES.items()
+            if column in results.columns
+        }
+    )
+
+
+def write_results(results, path, row_group_size=ROW_GROUP_SIZE):
+    """
+    Writes the results as GeoParquet with typed columns in row groups
+    :param results: GeoDataFrame with the results of route_analysis.py
+    :param path: Output file, e.g. '{city}_results_full.parquet'
+    :param row_group_size: Number of rows per row group
+    """
+    typed_results(results).to_parquet(path, index=False, row_group_size=row_group_size)
+
+
+def read_results(files, columns=None, filters=None):
+    """
+    Reads results written by write_results. Only the requested columns and the row groups matching the filters are
+    read. Without the geometry column, a DataFrame is returned and the geometries are not decoded.
+
+    >>> read_results(
+    ...     {"berlin": "berlin_results_full.parquet", "nairobi": "nairobi_results_full.parquet"},
+    ...     columns=["route_id", "ors_type", "duration_diff_perc"],
+    ...     filters=[("geometry_diff_hausdorff", "<", 30), ("ors_type", "!=", "uber_p85")],
+    ... )
+
+    :param files: Path of a results file or dict of city names and paths. For several cities, a categorical column
+    'city' is added.
+    :param columns: Columns to read. Default None, i.e. all
+    :param filters: Row filters in the pyarrow format, e.g. [("distance_diff_perc", "<", 1)]. A list of tuples is
+    combined with AND, a list of lists of tuples with OR.
+    :return: GeoDataFrame if the geometry is read, otherwise DataFrame
+    """
+    if not isinstance(files, dict):
+        return _read_results(files, columns, filters)
+    frames = [
+        _read_results(path, columns, filters).assign(city=city)
+        for city, path in files.items()
+    ]
+    results = pd.concat(frames, ignore_index=True)
+    results["city"] = pd.Categorical(results["city"], categories=list(files))
+    return results
+
+
+def _read_results(path, columns, filters):
+    if columns is None or "geometry" in columns:
+        results = gpd.read_parquet(path, columns=columns, filters=filters)
+    else:
+        results = pd.read_parquet(path, columns=columns, filters=filters)
+    # filters on a categorical column return the column as plain string
+    return typed_results(results)
@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Persistent spatial index of the Google and ORS routes of a city"""
+
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import shapely
+
+from .projection import GEOGRAPHIC_CRS, local_crs, project
+
+ROUTE_SETS = "route_sets.npy"
+IDS = "ids.npy"
+BOUNDS = "bounds.npy"
+WKB = "geometries.wkb"
+WKB_OFFSETS = "wkb_offsets.npy"
+METADATA = "metadata.json"
+
+#: Route set of the Google routes, the ORS routes are in the route set of their ORS type
+GOOGLE = "google"
+
+
+def _to_crs(geometries, crs, source):
+    """Reprojects geometries from the source CRS into crs"""
+    if source is None or source == crs:
+        return geometries
+    return shapely.transform(geometries, lambda xy: project(xy, crs, source))
+
+
+def write_route_index(
+    directory, route_sets, ids, geometries, crs=None, source=GEOGRAPHIC_CRS
+):
+    """
+    Writes the geometries of routes as WKB in a metric CRS with their bounds, so that RouteIndex can query them by
+    distance in metres and only decode the geometries of the candidates of a query
+    :param directory: Directory of the index, created if it doesn't exist
+    :param route_sets: Route set of each route, 'google' or the ORS type
+    :param ids: Id of each route, as in the results of route_analysis.py
+    :param geometries: LineString of each route in the source CRS
+    :param crs: Metric CRS of the index. Default None, i.e. the UTM zone of the centre of the routes
+    :param source: CRS of the geometries
+    :return: Number of indexed routes
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    geometries = np.asarray(geometries, dtype=object)
+    if crs is None:
+        if not len(geometries):
+            raise ValueError("The CRS of an empty index has to be given")
+        minx, miny, maxx, maxy = shapely.total_bounds(
+            _to_crs(geometries, GEOGRAPHIC_CRS, source)
+        )
+        crs = local_crs((minx + maxx) / 2, (miny + maxy) / 2)
+    geometries = _to_crs(geometries, crs, source)
+    wkb = shapely.to_wkb(geometries)
+    with open(directory / WKB, "wb") as dst:
+        for blob in wkb:
+            dst.write(blob)
+    np.save(
+        directory / WKB_OFFSETS,
+        np.concatenate([[0], np.cumsum([len(blob) for blob in wkb])]).astype(np.int64),
+    )
+    np.save(directory / BOUNDS, shapely.bounds(geometries).reshape(-1, 4))
+    np.save(directory / IDS, np.asarray(ids, dtype=str))
+    np.save(directory / ROUTE_SETS, np.asarray(route_sets, dtype=str))
+    with open(directory / METADATA, "w") as dst:
+        json.dump({"crs": crs}, dst)
+    return len(geometries)
+
+
+def route_index_dir(data_dir, city):
+    """
+    Returns the directory of the route index of a city
+    :return: Path
+    """
+    return Path(data_dir) / city / "route_index"
+
+
+class RouteIndex(object):
+    """
+    Read-only spatial index of routes written by write_route_index. An STRtree over the bounding boxes of the routes
+    selects the candidates of a query, and only their geometries are decoded from the memory-mapped WKB buffer to
+    test the predicate. Queries return the route set and id of the matching routes, which select_results uses to
+    slice the results of route_analysis.py.
+
+    >>> index = RouteIndex("data/berlin/route_index")
+    >>> hits = index.dwithin(construction_zone, 50)
+    >>> select_results(results, hits)
+    """
+
+    def __init__(self, directory):
+        """
+        :param directory: Directory of an index written by write_route_index
+        """
+        self.directory = Path(directory)
+        with open(self.directory / METADATA) as src:
+            self.crs = json.load(src)["crs"]
+        self.ids = np.load(self.directory / IDS)
+        self.route_sets = np.load(self.directory / ROUTE_SETS)
+        self.bounds = np.load(self.directory / BOUNDS)
+        self.offsets = np.load(self.directory / WKB_OFFSETS)
+        if self.offsets[-1]:
+            self.wkb = np.memmap(self.directory / WKB, dtype=np.uint8, mode="r")
+        else:
+            self.wkb = np.empty(0, dtype=np.uint8)
+        self.tree = shapely.STRtree(shapely.box(*self.bounds.T))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def geometries(self, positions=None):
+        """
+        Decodes the geometries of routes
+        :param positions: Positions of the routes in the index. Default None, i.e. all routes
+        :return: numpy array of LineStrings in the CRS of the index
+        """
+        if positions is None:
+            positions = np.arange(len(self))
+        return shapely.from_wkb(
+            [
+                self.wkb[self.offsets[i] : self.offsets[i + 1]].tobytes()
+                for i in positions
+            ]
+        )
+
+    def _query(self, geometry, distance, route_sets, source):
+        geometry = _to_crs(geometry, self.crs, source)
+        # the bounding box of a route is at least as close to the geometry as the route itself
+        if distance:
+            candidates = self.tree.query(
+                geometry, predicate="dwithin", distance=distance
+            )
+        else:
+            candidates = self.tree.query(geometry)
+        if route_sets is not None:
+            candidates = candidates[np.isin(self.route_sets[candidates], route_sets)]
+        candidates = np.sort(candidates)
+        if distance:
+            matches = shapely.dwithin(self.geometries(candidates), geometry, distance)
+        else:
+            matches = shapely.intersects(self.geometries(candidates), geometry)
+        positions = candidates[matches]
+        return pd.DataFrame(
+            {"route_set": self.route_sets[positions], "route_id": self.ids[positions]}
+        )
+
+    def intersects(self, geometry, route_sets=None, source=GEOGRAPHIC_CRS):
+        """
+        Finds the routes intersecting a geometry, e.g. the routes crossing a bridge or passing through a district
+        :param geometry: shapely geometry
+        :param route_sets: Route sets to search, e.g. ['google', 'normal']. Default None, i.e. all
+        :param source: CRS of the geometry. None if it is in the CRS of the index.
+        :return: DataFrame with the columns route_set and route_id
+        """
+        return self._query(geometry, 0, route_sets, source)
+
+    def dwithin(self, geometry, distance, route_sets=None, source=GEOGRAPHIC_CRS):
+        """
+        Finds the routes within a distance of a geometry, e.g. the routes along a corridor
+        :param geometry: shapely geometry
+        :param distance: Distance in metres
+        :param route_sets: Route sets to search. Default None, i.e. all
+        :param source: CRS of the geometry. None if it is in the CRS of the index.
+        :return: DataFrame with the columns route_set and route_id
+        """
+        return self._query(geometry, distance, route_sets, source)
+
+    def bbox(self, bounds, route_sets=None, source=GEOGRAPHIC_CRS):
+        """
+        Finds the routes intersecting a bounding box
+        :param bounds: (xmin, ymin, xmax, ymax) in the source CRS
+        :param route_sets: Route sets to search. Default None, i.e. all
+        :param source: CRS of the bounds. None if they are in the CRS of the index.
+        :return: DataFrame with the columns route_set and route_id
+        """
+        box = shapely.box(*bounds)
+        # the edges of the box are curved in the CRS of the index
+        box = shapely.segmentize(box, max(box.length / 400, 1e-9))
+        return self._query(box, 0, route_sets, source)
+
+
+def select_results(results, hits):
+    """
+    Selects the results of route_analysis.py whose Google route or ORS route is one of the hits of a query
+    :param results: (Geo)DataFrame with the columns route_id and ors_type
+    :param hits: DataFrame returned by a query of RouteIndex
+    :return: (Geo)DataFrame
+    """
+    google = hits.loc[hits["route_set"] == GOOGLE, "route_id"]
+    ors = pd.MultiIndex.from_frame(hits.loc[hits["route_set"] != GOOGLE])
+    pairs = pd.MultiIndex.from_arrays(
+        [results["ors_type"].astype(str), results["route_id"].astype(str)]
+    )
+    return results.loc[results["route_id"].isin(google) | pairs.isin(ors)]
@@ -2,12 +2,11 @@
 # -*- coding: utf-8 -*-
 """Simulates routes using openrouteservice"""
 
-import geopandas as gpd
 from shapely.geometry import LineString, MultiLineString
 import numpy as np
-import pandas as pd
 import json
-import matplotlib.pyplot as plt
+
+# geopandas, pandas and matplotlib are imported on first use, since they take long to import
 
 
 class ORSRoute(object):
@@ -15,14 +14,17 @@ class ORSRoute(object):
 
     __dataframe = None
 
-    def __init__(self, json_response):
+    def __init__(self, json_response, coordinates=None):
         """
         Initializes parameters and sends request to ORS server
 
         :param params: dict
         :param base_url: string
+        :param coordinates: Coordinates of the route, e.g. a view into a CoordinateArchive. Default None, i.e. they
+        are read from the response.
         """
         self.__json_response = json_response
+        self.__coordinates = coordinates
 
     @property
     def json_response(self):
@@ -38,6 +40,8 @@ class ORSRoute(object):
         Returns the coordinates of the route from the ORS response
         :return: list of coordinates
         """
+        if self.__coordinates is not None:
+            return self.__coordinates
         return self.json_response["geometry"]["coordinates"]
 
     @property
@@ -153,6 +157,8 @@ class ORSRoute(object):
         :param criterion: 'green', 'noise' or 'steepness'
         :return: Dataframe with summary
         """
+        import pandas as pd
+
         if criterion in self.extras.keys():
             return pd.DataFrame(self.extras[criterion]["summary"])
         else:
@@ -164,6 +170,8 @@ class ORSRoute(object):
         :param criterion: 'green', 'noise' or 'steepness'
         :return: Bar plot showing summary
         """
+        import matplotlib.pyplot as plt
+
         summary = self.summary_criterion(criterion)
         return plt.bar(x=summary["value"], height=summary["amount"], color="green")
 
@@ -185,6 +193,8 @@ class ORSRoute(object):
         Converts the route and its extra information into a geopandas dataframe
         :return: GeoDataFrame with route information
         """
+        import geopandas as gpd
+
         if self.__dataframe is not None:
             return self.__dataframe
         else:
@@ -277,6 +287,27 @@ class ORSRoute(object):
         """
         return self.geometry.hausdorff_distance(other_route.geometry)
 
+    def geometry_diff_frechet(self, other_route):
+        """
+        Calculates the discrete Fréchet distance between this route and another route object, which unlike the
+        Hausdorff distance accounts for the direction of the routes
+        :param other route: Object of type Route
+        :return:
+        """
+        from route_analyst.similarity import frechet
+
+        return frechet(self.coordinates, other_route.coordinates)
+
+    def geometry_diff_average(self, other_route):
+        """
+        Calculates the mean distance of the vertices of this route and another route object to the other route
+        :param other route: Object of type Route
+        :return:
+        """
+        from route_analyst.similarity import average_distance
+
+        return average_distance(self.coordinates, other_route.coordinates)
+
 
 class GoogleRoute(object):
     """Route calculated using openrouteservice"""
@@ -284,14 +315,17 @@ class GoogleRoute(object):
     __dataframe = None
     extras = False
 
-    def __init__(self, json_response):
+    def __init__(self, json_response, coordinates=None):
         """
         Initializes parameters and sends request to ORS server
 
         :param params: dict
         :param base_url: string
+        :param coordinates: Coordinates of the route, e.g. a view into a CoordinateArchive. Default None, i.e. they
+        are read from the response.
         """
         self.__json_response = json_response
+        self.__coordinates = coordinates
 
     @property
     def json_response(self):
@@ -315,6 +349,8 @@ class GoogleRoute(object):
         Returns the coordinates of the route from the ORS response
         :return: list of coordinates
         """
+        if self.__coordinates is not None:
+            return self.__coordinates
         return self.json_response["geometry"]
 
     @property
@@ -383,6 +419,8 @@ class GoogleRoute(object):
         Converts the route and its extra information into a geopandas dataframe
         :return: GeoDataFrame with route information
         """
+        import geopandas as gpd
+
         if self.__dataframe is not None:
             return self.__dataframe
         else:
@@ -17,6 +17,8 @@
 
 from .client_base import BaseClient, DEFAULT, _RETRIABLE_STATUSES, options
 from . import exceptions
+from .metrics import endpoint_of
+from .singleflight import request_key
 from .utils import get_ordinal
 
 from datetime import datetime
@@ -30,6 +32,12 @@ import warnings
 class Client(BaseClient):
     """Default client class for requests handling, which is passed to each router. Uses the requests package."""
 
+    #: HTTP status codes which are retried with the same base URL after a backoff.
+    retriable_statuses = _RETRIABLE_STATUSES
+
+    #: Name of the router using this client, used as label of the recorded metrics. Set by the router.
+    router = None
+
     def __init__(
         self,
         base_url,
@@ -38,6 +46,8 @@ class Client(BaseClient):
         retry_timeout=None,
         retry_over_query_limit=None,
         skip_api_error=None,
+        single_flight=None,
+        metrics=None,
         **kwargs
     ):
         """
@@ -66,6 +76,14 @@ class Client(BaseClient):
             encountered (e.g. no route found). If False, processing will discontinue and raise an error. Default False.
         :type skip_api_error: bool
 
+        :param single_flight: If specified, concurrent identical requests (same URL and parameters) share one
+            network call and its response. Default None.
+        :type single_flight: :class:`routingpy.singleflight.SingleFlight`
+
+        :param metrics: If specified, latency, status, retries, payload sizes and parse time of every request are
+            recorded. Default None.
+        :type metrics: :class:`routingpy.metrics.MetricsRegistry`
+
         :param **kwargs: Additional arguments, such as headers or proxies.
         :type **kwargs: dict
         """
@@ -90,6 +108,9 @@ class Client(BaseClient):
         self.kwargs["headers"] = self.headers
         self.kwargs["timeout"] = self.timeout
 
+        self.single_flight = single_flight
+        self.metrics = metrics
+
         self.proxies = self.kwargs.get("proxies") or options.default_proxies
         if self.proxies:
             self.kwargs["proxies"] = self.proxies
@@ -137,6 +158,16 @@ class Client(BaseClient):
         :rtype: dict
         """
 
+        if self.single_flight is not None and not first_request_time and not dry_run:
+            return self.single_flight.do(
+                request_key(self.base_url + url, get_params, post_params),
+                self._request,
+                url,
+                get_params,
+                post_params,
+                datetime.now(),
+            )
+
         if not first_request_time:
             first_request_time = datetime.now()
 
@@ -155,7 +186,8 @@ class Client(BaseClient):
 
         authed_url = self._generate_auth_url(url, get_params)
 
-        final_requests_kwargs = self.kwargs
+        # Copy, so concurrent requests sharing this client don't overwrite each other's body
+        final_requests_kwargs = dict(self.kwargs)
 
         # Determine GET/POST.
         requests_method = self._session.get
@@ -177,6 +209,7 @@ class Client(BaseClient):
             )
             return
 
+        start = time.monotonic()
         try:
             response = requests_method(
                 self.base_url + authed_url, **final_requests_kwargs
@@ -184,11 +217,19 @@ class Client(BaseClient):
             self._req = response.request
 
         except requests.exceptions.Timeout:
+            self._record(url, "timeout", time.monotonic() - start, retry_counter)
             raise exceptions.Timeout()
+        except requests.exceptions.RequestException:
+            self._record(url, "error", time.monotonic() - start, retry_counter)
+            raise
 
+        latency = time.monotonic() - start
         tried = retry_counter + 1
 
-        if response.status_code in _RETRIABLE_STATUSES:
+        if response.status_code in self.retriable_statuses:
+            self._record(
+                url, response.status_code, latency, retry_counter, response=response
+            )
             # Retry request.
             warnings.warn(
                 "Server down.\nRetrying for the {}{} time.".format(
@@ -202,7 +243,7 @@ class Client(BaseClient):
             )
 
         try:
-            result = self._get_body(response)
+            result = self._parse(url, response, latency, retry_counter)
 
             return result
 
@@ -241,6 +282,39 @@ class Client(BaseClient):
         """Holds the :class:`requests.PreparedRequest` property for the last request."""
         return self._req
 
+    def _parse(self, url, response, latency, retry_counter):
+        """Parses the response body and records the request's metrics."""
+        start = time.monotonic()
+        try:
+            return self._get_body(response)
+        finally:
+            self._record(
+                url,
+                response.status_code,
+                latency,
+                retry_counter,
+                response=response,
+                parse_time=time.monotonic() - start,
+            )
+
+    def _record(
+        self, url, status, latency, retry_counter, response=None, parse_time=None
+    ):
+        """Records a request in the metrics registry, if any."""
+        if self.metrics is None:
+            return
+        self.metrics.record_request(
+            self.router,
+            endpoint_of(url),
+            self.base_url,
+            status,
+            latency,
+            bytes_out=len(response.request.body or b"") if response is not None else 0,
+            bytes_in=len(response.content) if response is not None else 0,
+            parse_time=parse_time,
+            retry=retry_counter > 0,
+        )
+
     @staticmethod
     def _get_body(response):
         status_code = response.status_code
@@ -248,9 +322,12 @@ class Client(BaseClient):
         try:
             body = response.json()
         except json.decoder.JSONDecodeError:
-            raise exceptions.JSONParseError(
-                "Can't decode JSON response:{}".format(response.text)
-            )
+            # error pages of proxies and overloaded servers aren't JSON, they are still errors of their status
+            if status_code == 200:
+                raise exceptions.JSONParseError(
+                    "Can't decode JSON response:{}".format(response.text)
+                )
+            body = response.text
 
         if status_code == 429:
             raise exceptions.OverQueryLimit(status_code, body)
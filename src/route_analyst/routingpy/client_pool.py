@@ -0,0 +1,441 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2021 GIS OPS UG
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+#
+"""
+Client distributing requests over several replicas of the same routing backend.
+"""
+
+from .client_base import BaseClient, DEFAULT
+from .client_default import Client
+from .singleflight import request_key
+from . import exceptions
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+import random
+import requests
+import threading
+import time
+
+
+class Replica(object):
+    """A single backend replica of a :class:`PoolClient` and its health and latency statistics."""
+
+    #: Weight of the latest request in the exponentially weighted moving average latency.
+    latency_alpha = 0.2
+
+    def __init__(self, base_url, client):
+        """
+        :param base_url: The base URL of the replica.
+        :type base_url: str
+
+        :param client: The client sending requests to this replica.
+        :type client: :class:`routingpy.client_default.Client`
+        """
+        self.base_url = base_url
+        self.client = client
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0
+        self.ejections = 0
+        self.latency = None
+        self.ejected_until = 0.0
+
+    def healthy(self, now=None):
+        """Whether the replica currently accepts requests, i.e. it's not ejected."""
+        return (now or time.monotonic()) >= self.ejected_until
+
+    def record(self, latency):
+        """Records the latency of a successful request in seconds."""
+        self.requests += 1
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += self.latency_alpha * (latency - self.latency)
+
+    def eject(self, seconds):
+        """Takes the replica out of rotation for ``seconds``."""
+        self.requests += 1
+        self.failures += 1
+        self.ejections += 1
+        self.ejected_until = time.monotonic() + seconds
+
+    def stats(self):
+        """
+        Returns the replica's statistics.
+
+        :rtype: dict
+        """
+        return {
+            "base_url": self.base_url,
+            "healthy": self.healthy(),
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "failures": self.failures,
+            "ejections": self.ejections,
+            "latency_ewma": self.latency,
+        }
+
+    def __repr__(self):  # pragma: no cover
+        return "Replica({}, in_flight={}, latency={})".format(
+            self.base_url, self.in_flight, self.latency
+        )
+
+
+class PoolClient(BaseClient):
+    """
+    Client for a pool of replicas of the same logical routing backend, e.g. several containers of one ORS instance.
+
+    Each request is sent to the healthy replica with the fewest requests in flight, ties are broken by the lowest
+    average latency. Replicas that answer with a server error (HTTP 5xx), time out or refuse the connection are
+    ejected for ``eject_seconds`` and the request is failed over to the next replica. If all replicas are ejected,
+    the one that becomes available first is used. A replica over its query limit (HTTP 429) is not ejected, but the
+    request is failed over as well. If all replicas are over their limit, they are tried again with backoff until
+    ``retry_timeout``, unless ``retry_over_query_limit`` is False.
+
+    Pass it to any router as ``client`` and the list of base URLs as ``base_url``:
+
+    >>> from route_analyst.routingpy import ORS
+    >>> from route_analyst.routingpy.client_pool import PoolClient
+    >>> router = ORS(base_url=["http://localhost:8080/ors", "http://localhost:8090/ors"], client=PoolClient)
+    """
+
+    def __init__(
+        self,
+        base_url,
+        user_agent=None,
+        timeout=DEFAULT,
+        retry_timeout=None,
+        retry_over_query_limit=None,
+        skip_api_error=None,
+        eject_seconds=30,
+        hedging=None,
+        hedge_workers=32,
+        single_flight=None,
+        metrics=None,
+        **kwargs
+    ):
+        """
+        :param base_url: The base URLs of all replicas. A single URL is treated as a pool of one.
+        :type base_url: list of str or str
+
+        :param eject_seconds: Time in seconds a failed replica is taken out of rotation.
+        :type eject_seconds: int or float
+
+        :param hedging: Opt-in policy to send a duplicate of slow requests. Default None, i.e. no hedging.
+        :type hedging: :class:`routingpy.hedging.HedgingPolicy`
+
+        :param hedge_workers: Number of threads sending hedged requests. Each hedged request occupies up to two
+            threads, so this should be at least twice the number of concurrent callers.
+        :type hedge_workers: int
+
+        :param single_flight: If specified, concurrent identical requests (same URL and parameters) share one
+            network call and its response, independent of the replica. Default None.
+        :type single_flight: :class:`routingpy.singleflight.SingleFlight`
+
+        :param metrics: If specified, the requests to each replica and replica ejections are recorded. Default None.
+        :type metrics: :class:`routingpy.metrics.MetricsRegistry`
+
+        For the remaining parameters see :class:`routingpy.client_default.Client`.
+        """
+        base_urls = [base_url] if isinstance(base_url, str) else list(base_url)
+        if not base_urls:
+            raise ValueError("At least one base URL must be specified.")
+
+        super(PoolClient, self).__init__(
+            base_urls[0],
+            user_agent=user_agent,
+            timeout=timeout,
+            retry_timeout=retry_timeout,
+            retry_over_query_limit=retry_over_query_limit,
+            skip_api_error=skip_api_error,
+            **kwargs
+        )
+        self.eject_seconds = eject_seconds
+        self.hedging = hedging
+        self.hedge_workers = hedge_workers
+        self.single_flight = single_flight
+        self.metrics = metrics
+        self._router = None
+        self._executor = None
+        self.replicas = []
+        for url in base_urls:
+            client = Client(
+                url.rstrip("/"),
+                user_agent,
+                timeout,
+                retry_timeout,
+                retry_over_query_limit,
+                skip_api_error,
+                metrics=metrics,
+                **kwargs
+            )
+            # Fail over to another replica instead of retrying the same one
+            client.retriable_statuses = set()
+            client.retry_over_query_limit = False
+            self.replicas.append(Replica(url.rstrip("/"), client))
+        self._lock = threading.Lock()
+
+    def _acquire(self, exclude=(), avoid=()):
+        """Picks the least loaded healthy replica not in ``exclude`` and marks a request in flight. Replicas in
+        ``avoid`` are only picked if no other replica is available."""
+        with self._lock:
+            now = time.monotonic()
+            candidates = [r for r in self.replicas if r not in exclude]
+            if not candidates:
+                return None
+            healthy = [r for r in candidates if r.healthy(now)]
+            if healthy:
+                replica = min(
+                    healthy,
+                    key=lambda r: (
+                        r in avoid,
+                        r.in_flight,
+                        r.latency if r.latency is not None else 0.0,
+                    ),
+                )
+            else:
+                replica = min(candidates, key=lambda r: r.ejected_until)
+            replica.in_flight += 1
+            return replica
+
+    def _release(self, replica, latency=None, failed=False):
+        """Marks the request on ``replica`` as done and updates its statistics. Without latency and failure, e.g. for
+        a rate limited request, only the request in flight is released."""
+        with self._lock:
+            replica.in_flight -= 1
+            if failed:
+                replica.eject(self.eject_seconds)
+            elif latency is not None:
+                replica.record(latency)
+        if failed and self.metrics is not None:
+            self.metrics.inc(
+                "routingpy_replica_ejections_total",
+                router=self.router or "",
+                base_url=replica.base_url,
+            )
+
+    def _request(
+        self,
+        url,
+        get_params={},
+        post_params=None,
+        first_request_time=None,
+        retry_counter=0,
+        dry_run=None,
+    ):
+        """Sends the request to the least loaded healthy replica and fails over to the next one on server errors,
+        timeouts and connection errors. If a :class:`routingpy.hedging.HedgingPolicy` is set and the request takes
+        longer than the policy's delay, a duplicate is sent to another replica (or over another connection to the
+        same replica if there is only one) and the first response wins. The losing request runs to completion, see
+        :meth:`_hedged_send`.
+        See :meth:`routingpy.client_default.Client._request` for the parameters.
+
+        :raises routingpy.exceptions.RouterServerError: when all replicas returned a server error.
+        :raises routingpy.exceptions.Timeout: when all replicas timed out.
+
+        :returns: raw JSON response.
+        :rtype: dict
+        """
+        if self.single_flight is not None and not first_request_time and not dry_run:
+            return self.single_flight.do(
+                request_key(url, get_params, post_params),
+                self._request,
+                url,
+                get_params,
+                post_params,
+                datetime.now(),
+            )
+
+        delay = None
+        if self.hedging is not None and not dry_run:
+            delay = self.hedging.threshold(url)
+
+        if delay is None:
+            result = self._send(url, get_params, post_params, dry_run)
+            if self.hedging is not None and not dry_run:
+                self.hedging.record()
+            return result
+
+        return self._hedged_send(url, get_params, post_params, delay)
+
+    def _send(
+        self,
+        url,
+        get_params,
+        post_params,
+        dry_run=None,
+        avoid=(),
+        tried=None,
+        abandoned=None,
+    ):
+        """Sends a single request with failover. Replicas used are appended to ``tried``. Once the event
+        ``abandoned`` is set, no further replica is tried."""
+        tried = tried if tried is not None else []
+        excluded, error = [], None
+        first_request_time, rounds = datetime.now(), 0
+        while True:
+            if abandoned is not None and abandoned.is_set():
+                raise exceptions.Timeout()
+            replica = self._acquire(exclude=excluded, avoid=avoid)
+            if replica is None:
+                if not (
+                    isinstance(error, exceptions.OverQueryLimit)
+                    and self.retry_over_query_limit
+                ):
+                    raise error
+                if datetime.now() - first_request_time > self.retry_timeout:
+                    raise exceptions.Timeout()
+                # All replicas are over their query limit, back off as Client does and try them again
+                rounds += 1
+                time.sleep(0.5 * 1.5 ** (rounds - 1) * (random.random() + 0.5))
+                excluded = []
+                continue
+            excluded.append(replica)
+            tried.append(replica)
+
+            start = time.monotonic()
+            try:
+                result = replica.client._request(
+                    url, get_params, post_params, dry_run=dry_run
+                )
+            except (
+                exceptions.RouterServerError,
+                exceptions.Timeout,
+                requests.exceptions.ConnectionError,
+            ) as e:
+                self._release(replica, failed=True)
+                error = e
+                continue
+            except exceptions.OverQueryLimit as e:
+                self._release(replica)
+                error = e
+                continue
+            except Exception:
+                self._release(replica, time.monotonic() - start)
+                raise
+
+            latency = time.monotonic() - start
+            self._release(replica, latency)
+            if self.hedging is not None and not dry_run:
+                self.hedging.observe(url, latency)
+            self._req = replica.client.req
+            return result
+
+    def _hedged_send(self, url, get_params, post_params, delay):
+        """Sends the request and a duplicate after ``delay`` seconds, if no response arrived until then.
+        Returns the first successful response.
+
+        Note, that a request which is already being sent can't be interrupted, since requests can't abort a
+        blocking call from another thread. The losing request runs to completion and its response is discarded, but
+        it isn't failed over to further replicas. It is counted as wasted in the policy's statistics if it was still
+        in flight when the other one won. A duplicate which hasn't been started yet is cancelled.
+        """
+        executor = self._get_executor()
+        primary_tried, abandoned = [], threading.Event()
+        primary = executor.submit(
+            self._send,
+            url,
+            get_params,
+            post_params,
+            None,
+            (),
+            primary_tried,
+            abandoned,
+        )
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            self.hedging.record()
+            return primary.result()
+
+        hedge = executor.submit(
+            self._send,
+            url,
+            get_params,
+            post_params,
+            None,
+            tuple(primary_tried),
+            None,
+            abandoned,
+        )
+        pending, error = {primary, hedge}, None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+
+                # Stop the loser from failing over. If it's still in flight, its response will be discarded. A
+                # loser which already failed or hasn't started isn't wasted.
+                abandoned.set()
+                wasted = sum(
+                    1
+                    for other in (primary, hedge)
+                    if other is not future and not other.done() and not other.cancel()
+                )
+                self.hedging.record(
+                    hedged=True, hedge_won=future is hedge, wasted=wasted
+                )
+                return result
+
+        self.hedging.record(hedged=True)
+        raise error
+
+    def _get_executor(self):
+        """Creates the thread pool running hedged requests on first use."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.hedge_workers,
+                    thread_name_prefix="routingpy-hedge",
+                )
+            return self._executor
+
+    @property
+    def router(self):
+        """Name of the router using this pool, used as label of the recorded metrics."""
+        return self._router
+
+    @router.setter
+    def router(self, name):
+        self._router = name
+        for replica in self.replicas:
+            replica.client.router = name
+
+    @property
+    def req(self):
+        """Holds the :class:`requests.PreparedRequest` property for the last request."""
+        return self._req
+
+    def hedging_stats(self):
+        """
+        Returns the hedging statistics, see :meth:`routingpy.hedging.HedgingPolicy.stats`.
+
+        :rtype: dict
+        """
+        return self.hedging.stats() if self.hedging is not None else {}
+
+    def stats(self):
+        """
+        Returns the statistics of all replicas.
+
+        :rtype: list of dict
+        """
+        with self._lock:
+            return [replica.stats() for replica in self.replicas]
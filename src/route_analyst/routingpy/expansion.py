@@ -18,6 +18,10 @@
 :class:`Expansion` returns expansion results.
 """
 
+from itertools import chain
+
+import numpy as np
+
 
 class Edge:
     """
@@ -149,3 +153,213 @@ class Expansions:
 
     def __len__(self):
         return len(self._expansions)
+
+
+class ColumnarExpansions:
+    """
+    Array-backed variant of :class:`Expansions` for large expansion trees. The vertices of all edges are stored in a
+    single coordinate buffer, the vertices of edge ``i`` are located at ``coordinates[offsets[i]:offsets[i + 1]]``.
+    The requested properties are stored as numpy columns, properties not requested are ``None``.
+    Indexing or iterating creates :class:`Edge` objects on the fly.
+    """
+
+    _PROPERTIES = ("distances", "durations", "costs", "edge_ids", "statuses")
+
+    def __init__(
+        self,
+        coordinates=None,
+        offsets=None,
+        distances=None,
+        durations=None,
+        costs=None,
+        edge_ids=None,
+        statuses=None,
+        center=None,
+        raw=None,
+    ):
+        self._coordinates = coordinates if coordinates is not None else np.empty((0, 2))
+        self._offsets = offsets if offsets is not None else np.zeros(1, dtype=np.int64)
+        self._distances = distances
+        self._durations = durations
+        self._costs = costs
+        self._edge_ids = edge_ids
+        self._statuses = statuses
+        self._center = center
+        self._raw = raw
+
+    @classmethod
+    def from_lines(cls, lines, properties=None, center=None, raw=None):
+        """
+        Builds the columnar representation from a list of line coordinates and a dict of property lists,
+        as found in a Valhalla expansion response.
+
+        :param lines: The edge geometries as [[[lon1, lat1], [lon2, lat2]], ...] list.
+        :type lines: list of list
+
+        :param properties: Property name mapped to a list with one value per edge.
+        :type properties: dict
+
+        :rtype: :class:`ColumnarExpansions`
+        """
+        counts = np.fromiter((len(line) for line in lines), dtype=np.int64)
+        offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        coordinates = np.fromiter(
+            chain.from_iterable(chain.from_iterable(lines)),
+            dtype=np.float64,
+            count=int(offsets[-1]) * 2,
+        ).reshape(-1, 2)
+
+        columns = {}
+        for name, values in (properties or {}).items():
+            if name in cls._PROPERTIES:
+                columns[name] = np.asarray(values)
+
+        return cls(coordinates, offsets, center=center, raw=raw, **columns)
+
+    @property
+    def coordinates(self):
+        """
+        The vertices of all edges as (n, 2) array of [lon, lat].
+
+        :rtype: numpy.ndarray
+        """
+        return self._coordinates
+
+    @property
+    def offsets(self):
+        """
+        The start index of each edge in the coordinate buffer, followed by the total number of vertices.
+
+        :rtype: numpy.ndarray
+        """
+        return self._offsets
+
+    @property
+    def distances(self):
+        """
+        The accumulated distance in meters for each edge in order of graph traversal.
+
+        :rtype: numpy.ndarray or None
+        """
+        return self._distances
+
+    @property
+    def durations(self):
+        """
+        The accumulated duration in seconds for each edge in order of graph traversal.
+
+        :rtype: numpy.ndarray or None
+        """
+        return self._durations
+
+    @property
+    def costs(self):
+        """
+        The accumulated cost for each edge in order of graph traversal.
+
+        :rtype: numpy.ndarray or None
+        """
+        return self._costs
+
+    @property
+    def edge_ids(self):
+        """
+        The internal edge IDs for each edge in order of graph traversal.
+
+        :rtype: numpy.ndarray or None
+        """
+        return self._edge_ids
+
+    @property
+    def statuses(self):
+        """
+        The edge states for each edge in order of graph traversal.
+        Can be one of "r" (reached), "s" (settled), "c" (connected).
+
+        :rtype: numpy.ndarray or None
+        """
+        return self._statuses
+
+    @property
+    def raw(self):
+        """
+        Returns the expansion's raw, unparsed response. For details, consult the documentation
+         at https://valhalla.readthedocs.io/en/latest/api/expansion/api-reference/.
+
+        :rtype: dict or None
+        """
+        return self._raw
+
+    @property
+    def center(self):
+        """
+        The center coordinate in [lon, lat] of the expansion, which is the location from the user input.
+
+        :rtype: list of float
+        """
+        return self._center
+
+    def columns(self):
+        """
+        Returns the requested properties as a dict of numpy columns, using the attribute names of :class:`Edge`.
+
+        :rtype: dict
+        """
+        columns = {}
+        for name in self._PROPERTIES:
+            values = getattr(self, name)
+            if values is not None:
+                columns[name[:-1] if name != "statuses" else "status"] = values
+        return columns
+
+    def to_shapely(self):
+        """
+        Converts the edges to an array of shapely LineStrings in a single vectorized call.
+
+        :rtype: numpy.ndarray
+        """
+        import shapely
+
+        indices = np.repeat(np.arange(len(self)), np.diff(self._offsets))
+        return shapely.linestrings(self._coordinates, indices=indices)
+
+    def to_geodataframe(self, crs="epsg:4326"):
+        """
+        Converts the edges and their properties to a GeoDataFrame with one row per edge.
+
+        :param crs: The coordinate reference system of the geometries.
+        :type crs: str
+
+        :rtype: geopandas.GeoDataFrame
+        """
+        import geopandas as gpd
+
+        return gpd.GeoDataFrame(self.columns(), geometry=self.to_shapely(), crs=crs)
+
+    def __repr__(self):  # pragma: no cover
+        return "ColumnarExpansions({} edges, {})".format(
+            len(self), ", ".join(self.columns().keys())
+        )
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self[i] for i in range(*item.indices(len(self)))]
+        if item < 0:
+            item += len(self)
+        if not 0 <= item < len(self):
+            raise IndexError("Expansion index out of range")
+
+        properties = {
+            name: getattr(self, name)[item].item()
+            for name in self._PROPERTIES
+            if getattr(self, name) is not None
+        }
+        start, end = self._offsets[item], self._offsets[item + 1]
+        return Edge(geometry=self._coordinates[start:end].tolist(), **properties)
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def __len__(self):
+        return len(self._offsets) - 1
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2021 GIS OPS UG
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+#
+"""
+Policy for hedged requests, i.e. sending a duplicate request when the first one is slow.
+"""
+
+from collections import deque
+import math
+import threading
+
+
+class HedgingPolicy(object):
+    """
+    Decides after which delay a duplicate of a slow request is sent and keeps track of hedged and wasted requests.
+
+    The delay is either fixed or learned per endpoint as a percentile of the recently observed latencies. Until
+    ``min_samples`` latencies of an endpoint have been observed, a learned policy doesn't hedge.
+
+    >>> from route_analyst.routingpy.client_pool import PoolClient
+    >>> from route_analyst.routingpy.hedging import HedgingPolicy
+    >>> router = ORS(base_url=[url_1, url_2], client=PoolClient, hedging=HedgingPolicy(percentile=95))
+    """
+
+    def __init__(self, delay=None, percentile=95, min_samples=20, window=500):
+        """
+        :param delay: Fixed delay in seconds after which the request is hedged. If None, the delay is learned.
+        :type delay: float
+
+        :param percentile: Percentile of the observed latencies per endpoint used as learned delay.
+        :type percentile: float
+
+        :param min_samples: Number of latencies an endpoint needs before a learned delay is used.
+        :type min_samples: int
+
+        :param window: Number of recent latencies per endpoint the learned delay is based on.
+        :type window: int
+        """
+        self.delay = delay
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.window = window
+        self._latencies = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.wasted = 0
+
+    def threshold(self, endpoint):
+        """
+        Returns the delay in seconds after which a request to ``endpoint`` is hedged.
+
+        :param endpoint: The URL path of the request.
+        :type endpoint: str
+
+        :returns: The delay or None, if the request shouldn't be hedged.
+        :rtype: float or None
+        """
+        if self.delay is not None:
+            return self.delay
+        with self._lock:
+            latencies = self._latencies.get(endpoint)
+            if latencies is None or len(latencies) < self.min_samples:
+                return None
+            ordered = sorted(latencies)
+        rank = max(math.ceil(self.percentile / 100 * len(ordered)) - 1, 0)
+        return ordered[rank]
+
+    def observe(self, endpoint, latency):
+        """Records the latency of a completed request to ``endpoint`` in seconds."""
+        with self._lock:
+            latencies = self._latencies.setdefault(endpoint, deque(maxlen=self.window))
+            latencies.append(latency)
+
+    def record(self, hedged=False, hedge_won=False, wasted=0):
+        """Records the outcome of a request, whether it was hedged, which copy won and how many copies were wasted."""
+        with self._lock:
+            self.requests += 1
+            self.hedged += int(hedged)
+            self.hedge_wins += int(hedge_won)
+            self.wasted += wasted
+
+    def stats(self):
+        """
+        Returns the number of requests, hedged requests, requests won by the hedge and wasted requests, which were
+        still in flight when the other copy won and whose response is discarded.
+
+        :rtype: dict
+        """
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "hedged": self.hedged,
+                "hedge_wins": self.hedge_wins,
+                "wasted": self.wasted,
+            }
@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2021 GIS OPS UG
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+#
+"""
+Collects request metrics (latency histograms, retries, payload sizes, parse times) and exports them as Prometheus
+text file or JSON summary.
+"""
+
+import bisect
+import json
+import math
+import threading
+from urllib.parse import urlparse
+
+#: Default upper bounds of the latency histogram buckets in seconds.
+DEFAULT_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    math.inf,
+)
+
+
+class Histogram(object):
+    """Cumulative histogram with fixed bucket bounds, as used by Prometheus."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        """Adds a value to the histogram."""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """
+        Estimates a quantile by linear interpolation within the bucket containing it.
+
+        :param q: The quantile in [0, 1].
+        :type q: float
+
+        :rtype: float
+        """
+        if self.count == 0:
+            return math.nan
+        rank, seen, lower = q * self.count, 0, 0.0
+        for bound, count in zip(self.buckets, self.counts):
+            if count and seen + count >= rank:
+                upper = min(bound, self.max)
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+            lower = bound
+        return self.max
+
+    def summary(self):
+        """
+        Returns count, sum, mean, max and estimated p50/p95/p99.
+
+        :rtype: dict
+        """
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else math.nan,
+            "max": self.max,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+
+class MetricsRegistry(object):
+    """
+    Thread-safe registry of labelled counters and histograms. Pass it to a routingpy client via ``metrics`` to record
+    every request:
+
+    >>> from route_analyst.routingpy.metrics import MetricsRegistry
+    >>> metrics = MetricsRegistry()
+    >>> router = ORS(base_url="http://localhost:8080/ors", metrics=metrics)
+    >>> ...
+    >>> metrics.write("metrics.prom")
+
+    Statistics of other components, e.g. :meth:`routingpy.client_pool.PoolClient.stats`, can be added with
+    :meth:`add_stats` and are exported as gauges.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """
+        :param buckets: Upper bounds of the histogram buckets.
+        :type buckets: tuple of float
+        """
+        self.buckets = buckets
+        self._counters = {}
+        self._histograms = {}
+        self._stats = []
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        """Increments the counter ``name`` with the given labels by ``value``."""
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        """Adds ``value`` to the histogram ``name`` with the given labels."""
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    def add_stats(self, name, stats, **labels):
+        """
+        Registers a callable returning statistics, which is evaluated on export. Numeric values of the returned
+        dict become gauges named ``<name>_<key>``. If a list of dicts is returned, their string values are used as
+        additional labels, e.g. the ``base_url`` of each replica of a pool.
+
+        :param name: Prefix of the gauge names.
+        :type name: str
+
+        :param stats: Callable returning a dict or a list of dicts.
+        :type stats: callable
+        """
+        with self._lock:
+            self._stats.append((name, stats, labels))
+
+    def record_request(
+        self,
+        router,
+        endpoint,
+        base_url,
+        status,
+        latency,
+        bytes_out=0,
+        bytes_in=0,
+        parse_time=None,
+        retry=False,
+    ):
+        """
+        Records a single HTTP request of a routing client.
+
+        :param router: Name of the router, e.g. 'ors'.
+        :param endpoint: URL path of the request without query string.
+        :param base_url: Base URL the request was sent to.
+        :param status: HTTP status code, or 'timeout'/'error' if no response was received.
+        :param latency: Time until the response was received in seconds.
+        :param bytes_out: Size of the request body in bytes.
+        :param bytes_in: Size of the response body in bytes.
+        :param parse_time: Time to parse the response in seconds.
+        :param retry: Whether the request was a retry.
+        """
+        labels = dict(router=router or "", endpoint=endpoint, base_url=base_url)
+        self.observe("routingpy_request_duration_seconds", latency, **labels)
+        self.inc("routingpy_requests_total", status=status, **labels)
+        self.inc("routingpy_request_bytes_total", bytes_out, **labels)
+        self.inc("routingpy_response_bytes_total", bytes_in, **labels)
+        if parse_time is not None:
+            self.observe("routingpy_parse_duration_seconds", parse_time, **labels)
+        if retry:
+            self.inc("routingpy_retries_total", **labels)
+        if status == 429:
+            self.inc("routingpy_rate_limited_total", **labels)
+
+    @staticmethod
+    def _gauges(stats):
+        """Evaluates the registered statistics."""
+        gauges = []
+        for name, fn, labels in stats:
+            values = fn()
+            for item in values if isinstance(values, list) else [values]:
+                item_labels = dict(labels)
+                item_labels.update(
+                    {k: v for k, v in item.items() if isinstance(v, str)}
+                )
+                for k, v in item.items():
+                    if isinstance(v, (bool, int, float)):
+                        gauges.append((f"{name}_{k}", item_labels, float(v)))
+        return gauges
+
+    @staticmethod
+    def _format_labels(labels):
+        if not labels:
+            return ""
+        escaped = (
+            (k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in labels
+        )
+        return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+    def to_prometheus(self):
+        """
+        Renders all metrics in the Prometheus text exposition format.
+
+        :rtype: str
+        """
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items(), key=lambda item: item[0])
+            stats = list(self._stats)
+        gauges = self._gauges(stats)
+
+        lines, typed = [], set()
+        for (name, labels), value in counters:
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(f"{name}{self._format_labels(labels)} {value}")
+        for (name, labels), histogram in histograms:
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram")
+                typed.add(name)
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                le = "+Inf" if math.isinf(bound) else repr(bound)
+                bucket_labels = labels + (("le", le),)
+                lines.append(
+                    f"{name}_bucket{self._format_labels(bucket_labels)} {cumulative}"
+                )
+            lines.append(f"{name}_sum{self._format_labels(labels)} {histogram.sum}")
+            lines.append(f"{name}_count{self._format_labels(labels)} {histogram.count}")
+        for name, labels, value in gauges:
+            if name not in typed:
+                lines.append(f"# TYPE {name} gauge")
+                typed.add(name)
+            lines.append(
+                f"{name}{self._format_labels(tuple(sorted(labels.items())))} {value}"
+            )
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """
+        Returns all metrics as a JSON serializable dict, with histograms summarized by count, mean and quantiles.
+
+        :rtype: dict
+        """
+        with self._lock:
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self._counters.items())
+            ]
+            histograms = [
+                {"name": name, "labels": dict(labels), **histogram.summary()}
+                for (name, labels), histogram in sorted(
+                    self._histograms.items(), key=lambda item: item[0]
+                )
+            ]
+            stats = list(self._stats)
+        stats = {name: fn() for name, fn, _ in stats}
+        return {"counters": counters, "histograms": histograms, "stats": stats}
+
+    def write(self, path):
+        """
+        Writes the metrics to file, as JSON summary if the file name ends with '.json', otherwise in the Prometheus
+        text format (e.g. for the node exporter's textfile collector).
+
+        :param path: Path of the output file.
+        :type path: str or pathlib.Path
+        """
+        path = str(path)
+        with open(path, "w") as dst:
+            if path.endswith(".json"):
+                json.dump(self.summary(), dst, indent=2, default=_json_default)
+            else:
+                dst.write(self.to_prometheus())
+
+
+def _json_default(value):
+    """Serializes unknown objects for the JSON summary."""
+    return str(value)
+
+
+def endpoint_of(url):
+    """Returns the URL path without query string, used as endpoint label."""
+    return urlparse(url).path or url
@@ -126,6 +126,7 @@ class Google:
             skip_api_error,
             **client_kwargs
         )
+        self.client.router = "google"
 
     class WayPoint(object):
         """
@@ -96,6 +96,7 @@ class Graphhopper:
             skip_api_error,
             **client_kwargs
         )
+        self.client.router = "graphhopper"
 
     def directions(  # noqa: C901
         self,
@@ -107,6 +107,7 @@ class HereMaps:
             skip_api_error,
             **client_kwargs
         )
+        self.client.router = "heremaps"
 
     class Waypoint(object):
         """
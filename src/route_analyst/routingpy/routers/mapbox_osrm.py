@@ -93,6 +93,7 @@ class MapboxOSRM:
             skip_api_error,
             **client_kwargs
         )
+        self.client.router = "mapbox_osrm"
 
     def directions(  # noqa: C901
         self,
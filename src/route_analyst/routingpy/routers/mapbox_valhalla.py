@@ -82,3 +82,4 @@ class MapboxValhalla(Valhalla):
             client=client,
             **client_kwargs
         )
+        self.client.router = "mapbox_valhalla"
@@ -97,6 +97,7 @@ class ORS:
             skip_api_error,
             **client_kwargs
         )
+        self.client.router = "ors"
 
     def directions(  # noqa: C901
         self,
@@ -86,6 +86,7 @@ class OSRM:
             skip_api_error,
             **client_kwargs
         )
+        self.client.router = "osrm"
 
     def directions(
         self,
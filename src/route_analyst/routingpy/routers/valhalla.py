@@ -24,16 +24,27 @@ from ..client_base import DEFAULT
 from ..client_default import Client
 from .. import utils
 from ..direction import Direction
-from ..expansion import Expansions, Edge
+from ..expansion import Expansions, ColumnarExpansions, Edge
 from ..isochrone import Isochrone, Isochrones
 from ..matrix import Matrix
+from ..trace import TraceAttributes
 
+import numpy as np
 from operator import itemgetter
 
 
 class Valhalla:
     """Performs requests to a Valhalla instance."""
 
+    _TRACE_ATTRIBUTES = (
+        "edge.speed",
+        "edge.length",
+        "edge.way_id",
+        "edge.id",
+        "edge.begin_shape_index",
+        "edge.end_shape_index",
+    )
+
     def __init__(
         self,
         base_url,
@@ -97,6 +108,7 @@ class Valhalla:
             skip_api_error,
             **client_kwargs
         )
+        self.client.router = "valhalla"
 
     class Waypoint(object):
         """
@@ -688,7 +700,8 @@ class Valhalla:
         date_time: Optional[dict] = None,
         id: Optional[str] = None,
         dry_run: Optional[bool] = None,
-    ) -> Expansions:
+        columnar: bool = False,
+    ) -> Union[Expansions, ColumnarExpansions]:
         """Gets the expansion tree for a range of time or distance values around a given coordinate.
 
         For more information, visit https://valhalla.readthedocs.io/en/latest/api/expansion/api-reference/.
@@ -722,6 +735,10 @@ class Valhalla:
 
         :param dry_run: Print URL and parameters without sending the request.
 
+        :param columnar: Parse the response into a :class:`routingpy.expansion.ColumnarExpansions`, which holds the
+            edges in numpy arrays instead of one :class:`routingpy.expansion.Edge` per edge. Recommended for large
+            expansion trees. Default False.
+
         :returns: An expansions object consisting of single line strings and their attributes (if specified).
         """
 
@@ -737,7 +754,12 @@ class Valhalla:
             date_time,
             id,
         )
-        return self._parse_expansion_json(
+        parse = (
+            self._parse_expansion_json_columnar
+            if columnar
+            else self._parse_expansion_json
+        )
+        return parse(
             self.client._request(
                 "/expansion", get_params=get_params, post_params=params, dry_run=dry_run
             ),
@@ -791,6 +813,252 @@ class Valhalla:
 
         return Expansions(expansions, locations, response)
 
+    @staticmethod
+    def _parse_expansion_json_columnar(response, locations, expansion_properties):
+        if response is None:  # pragma: no cover
+            return ColumnarExpansions()
+
+        feature = response["features"][0]
+        properties = {
+            expansion_prop: feature["properties"][expansion_prop]
+            for expansion_prop in expansion_properties or []
+        }
+
+        return ColumnarExpansions.from_lines(
+            feature["geometry"]["coordinates"], properties, locations, response
+        )
+
+    def trace_route(
+        self,
+        locations: Sequence[Sequence[float]],
+        profile: str,
+        shape_match: Optional[str] = None,
+        options: Optional[dict] = None,
+        units: Optional[str] = None,
+        language: Optional[str] = None,
+        directions_type: Optional[str] = None,
+        trace_options: Optional[dict] = None,
+        id: Optional[str] = None,
+        dry_run: Optional[bool] = None,
+    ) -> Direction:
+        """Map-matches a trace to the road network and returns the matched route.
+
+        For more information, visit https://valhalla.readthedocs.io/en/latest/api/map-matching/api-reference/.
+
+        :param locations: The trace as a sequence of [lon, lat] coordinates. It's sent as a polyline6 encoded
+            string to keep the request body small.
+
+        :param profile: Specifies the mode of transport to use when matching the trace. One of ["auto", "bicycle",
+            "bus", "pedestrian"].
+
+        :param shape_match: One of "edge_walk", "map_snap" or "walk_or_snap". Default "walk_or_snap".
+
+        :param options: Profiles can have several options that can be adjusted to develop the route path,
+            as well as for estimating time along the path. Only specify the actual options dict, the profile
+            will be filled automatically.
+
+        :param units: Distance units for output. One of ['mi', 'km']. Default km.
+
+        :param language: The language of the narration instructions based on the IETF BCP 47 language tag string.
+
+        :param directions_type: 'none': no instructions are returned. 'maneuvers': only maneuvers are returned.
+            'instructions': maneuvers with instructions are returned. Default 'instructions'.
+
+        :param trace_options: Additional map-matching options, such as ``search_radius``, ``gps_accuracy``,
+            ``breakage_distance`` or ``interpolation_distance``.
+
+        :param id: Name your route request. If id is specified, the naming will be sent thru to the response.
+
+        :param dry_run: Print URL and parameters without sending the request.
+
+        :returns: The matched route.
+        """
+
+        params = self.get_trace_params(
+            locations,
+            profile,
+            shape_match,
+            options,
+            units,
+            trace_options,
+            id,
+        )
+        if any((language, directions_type)):
+            params["directions_options"] = params.get("directions_options", dict())
+            if language:
+                params["directions_options"]["language"] = language
+            if directions_type:
+                params["directions_options"]["directions_type"] = directions_type
+
+        get_params = {"access_token": self.api_key} if self.api_key else {}
+
+        return self._parse_direction_json(
+            self.client._request(
+                "/trace_route",
+                get_params=get_params,
+                post_params=params,
+                dry_run=dry_run,
+            ),
+            units,
+        )
+
+    def trace_attributes(
+        self,
+        locations: Sequence[Sequence[float]],
+        profile: str,
+        shape_match: Optional[str] = None,
+        attributes: Optional[Sequence[str]] = None,
+        options: Optional[dict] = None,
+        units: Optional[str] = None,
+        trace_options: Optional[dict] = None,
+        id: Optional[str] = None,
+        dry_run: Optional[bool] = None,
+    ) -> TraceAttributes:
+        """Map-matches a trace to the road network and returns the attributes of each matched edge.
+
+        For more information, visit https://valhalla.readthedocs.io/en/latest/api/map-matching/api-reference/.
+
+        :param locations: The trace as a sequence of [lon, lat] coordinates. It's sent as a polyline6 encoded
+            string to keep the request body small.
+
+        :param profile: Specifies the mode of transport to use when matching the trace. One of ["auto", "bicycle",
+            "bus", "pedestrian"].
+
+        :param shape_match: One of "edge_walk", "map_snap" or "walk_or_snap". Default "walk_or_snap".
+
+        :param attributes: The edge attributes to include in the response. Defaults to speed, length, way id,
+            edge id and the shape indices of each edge, which are the attributes parsed into the result.
+
+        :param options: Profiles can have several options that can be adjusted to develop the route path,
+            as well as for estimating time along the path. Only specify the actual options dict, the profile
+            will be filled automatically.
+
+        :param units: Distance units for output. One of ['mi', 'km']. Default km.
+
+        :param trace_options: Additional map-matching options, such as ``search_radius``, ``gps_accuracy``,
+            ``breakage_distance`` or ``interpolation_distance``.
+
+        :param id: Name your route request. If id is specified, the naming will be sent thru to the response.
+
+        :param dry_run: Print URL and parameters without sending the request.
+
+        :returns: The matched edges of the trace in columnar form.
+        """
+
+        params = self.get_trace_params(
+            locations,
+            profile,
+            shape_match,
+            options,
+            units,
+            trace_options,
+            id,
+        )
+        params["filters"] = {
+            "attributes": list(attributes or self._TRACE_ATTRIBUTES),
+            "action": "include",
+        }
+
+        get_params = {"access_token": self.api_key} if self.api_key else {}
+
+        return self._parse_trace_attributes_json(
+            self.client._request(
+                "/trace_attributes",
+                get_params=get_params,
+                post_params=params,
+                dry_run=dry_run,
+            ),
+            units,
+        )
+
+    def trace_attributes_batch(
+        self, traces: Sequence[Sequence[Sequence[float]]], profile: str, **kwargs
+    ) -> TraceAttributes:
+        """Map-matches a batch of traces, e.g. the geometries of Google routes, one request per trace.
+
+        The matched edges of all traces are concatenated into one columnar :class:`routingpy.trace.TraceAttributes`,
+        where the edges of trace ``i`` are found at ``offsets[i]:offsets[i + 1]``. Traces which could not be
+        matched (with ``skip_api_error``) contribute zero edges, so indices stay aligned with ``traces``.
+
+        :param traces: The traces, each as a sequence of [lon, lat] coordinates.
+
+        :param profile: Specifies the mode of transport to use when matching the traces.
+
+        :param kwargs: Any further arguments of :meth:`trace_attributes`.
+
+        :returns: The matched edges of all traces in columnar form.
+        """
+        return TraceAttributes.concat(
+            self.trace_attributes(trace, profile, **kwargs) for trace in traces
+        )
+
+    @staticmethod
+    def get_trace_params(
+        locations,
+        profile,
+        shape_match=None,
+        options=None,
+        units=None,
+        trace_options=None,
+        id=None,
+    ):
+        params = {
+            "encoded_polyline": utils.encode_polyline6(
+                [coord[:2] for coord in locations]
+            ),
+            "costing": profile,
+            "shape_match": shape_match or "walk_or_snap",
+        }
+
+        if options:
+            params["costing_options"] = {profile: options}
+
+        if units:
+            params["directions_options"] = {"units": units}
+
+        if trace_options:
+            params["trace_options"] = trace_options
+
+        if id:
+            params["id"] = id
+
+        return params
+
+    @staticmethod
+    def _parse_trace_attributes_json(response, units):
+        if response is None:  # pragma: no cover
+            return TraceAttributes(
+                offsets=np.zeros(2, dtype=np.int64),
+                speeds=np.empty(0, dtype=np.float64),
+                lengths=np.empty(0, dtype=np.float64),
+                way_ids=np.empty(0, dtype=np.int64),
+                edge_ids=np.empty(0, dtype=np.int64),
+                begin_shape_indices=np.empty(0, dtype=np.int64),
+                end_shape_indices=np.empty(0, dtype=np.int64),
+                raw=[None],
+            )
+
+        edges = response.get("edges", [])
+        factor = 1.609344 if units == "mi" else 1
+
+        def column(key, dtype, missing):
+            return np.fromiter(
+                (edge.get(key, missing) for edge in edges),
+                dtype=dtype,
+                count=len(edges),
+            )
+
+        return TraceAttributes(
+            offsets=np.array([0, len(edges)], dtype=np.int64),
+            speeds=column("speed", np.float64, np.nan) * factor,
+            lengths=column("length", np.float64, np.nan) * 1000 * factor,
+            way_ids=column("way_id", np.int64, -1),
+            edge_ids=column("id", np.int64, -1),
+            begin_shape_indices=column("begin_shape_index", np.int64, -1),
+            end_shape_indices=column("end_shape_index", np.int64, -1),
+            raw=[response],
+        )
+
     @staticmethod
     def _build_locations(coordinates):
         """Build the locations object for all methods"""
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2021 GIS OPS UG
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+#
+"""
+Coalesces concurrent identical requests into a single call (single-flight).
+"""
+
+import hashlib
+import json
+import threading
+import time
+
+
+def request_key(url, get_params=None, post_params=None):
+    """
+    Builds the key identifying identical requests from the URL and a hash of the normalized parameters, i.e.
+    dict keys are sorted, so that the key doesn't depend on insertion order.
+
+    :param url: The URL of the request.
+    :type url: str
+
+    :param get_params: HTTP GET parameters.
+    :type get_params: dict or list of tuples
+
+    :param post_params: HTTP POST parameters.
+    :type post_params: dict
+
+    :rtype: str
+    """
+    body = json.dumps(
+        [get_params or None, post_params],
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
+    )
+    return url + "#" + hashlib.sha1(body.encode("utf-8")).hexdigest()
+
+
+class _Call(object):
+    """A call in flight, which other callers with the same key wait for."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """
+    Executes a function only once for all concurrent callers with the same key. Callers arriving while the call is
+    in flight wait for it and get the same result (or exception). Once the call has finished, the next caller
+    executes it again, i.e. results are not cached.
+
+    >>> flight = SingleFlight()
+    >>> flight.do(request_key(url, post_params=body), send, url, body)
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.hits = 0
+        self.wait_time = 0.0
+
+    def do(self, key, fn, *args, **kwargs):
+        """
+        Calls ``fn(*args, **kwargs)`` unless a call with the same key is in flight, in which case its result is
+        returned once it's done.
+
+        :param key: The key identifying identical calls, e.g. from :func:`request_key`.
+        :type key: str
+
+        :param fn: The function to call.
+        :type fn: callable
+
+        :returns: The result of the (shared) call.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.calls += 1
+
+        if not leader:
+            start = time.monotonic()
+            call.done.wait()
+            with self._lock:
+                self.hits += 1
+                self.wait_time += time.monotonic() - start
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self):
+        """
+        Returns the number of executed calls, the number of callers which shared the result of a call in flight
+        (hits) and the total time in seconds these callers waited.
+
+        :rtype: dict
+        """
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "hits": self.hits,
+                "wait_time": self.wait_time,
+                "in_flight": len(self._calls),
+            }
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2021 GIS OPS UG
+#
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+#
+"""
+:class:`TraceAttributes` returns map-matched edge attributes in columnar form.
+"""
+
+import numpy as np
+
+
+class TraceAttributes(object):
+    """
+    Contains the matched edges of one or more traces as flat arrays. Edges of trace ``i`` are located at
+    ``offsets[i]:offsets[i + 1]`` in each column. Access via properties ``speeds``, ``lengths``, ``way_ids``,
+    ``edge_ids``, ``begin_shape_indices``, ``end_shape_indices`` and ``raw``.
+    """
+
+    def __init__(
+        self,
+        offsets=None,
+        speeds=None,
+        lengths=None,
+        way_ids=None,
+        edge_ids=None,
+        begin_shape_indices=None,
+        end_shape_indices=None,
+        raw=None,
+    ):
+        """
+        Initialize a :class:`TraceAttributes` instance.
+
+        :param offsets: Start index of each trace's edges in the columns, with the total edge count appended.
+        :type offsets: numpy.ndarray
+
+        :param raw: The raw responses of the routing engine, one per trace.
+        :type raw: list of dict
+        """
+        self._offsets = offsets if offsets is not None else np.zeros(1, dtype=np.int64)
+        self._speeds = speeds
+        self._lengths = lengths
+        self._way_ids = way_ids
+        self._edge_ids = edge_ids
+        self._begin_shape_indices = begin_shape_indices
+        self._end_shape_indices = end_shape_indices
+        self._raw = raw or []
+
+    @classmethod
+    def concat(cls, traces):
+        """
+        Concatenates several :class:`TraceAttributes` to a single columnar instance.
+
+        :param traces: The trace attributes to concatenate in order.
+        :type traces: list of :class:`TraceAttributes`
+
+        :rtype: :class:`TraceAttributes`
+        """
+        traces = list(traces)
+        if not traces:
+            return cls()
+
+        counts = np.concatenate([np.diff(t.offsets) for t in traces])
+        offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+
+        return cls(
+            offsets=offsets,
+            speeds=np.concatenate([t.speeds for t in traces]),
+            lengths=np.concatenate([t.lengths for t in traces]),
+            way_ids=np.concatenate([t.way_ids for t in traces]),
+            edge_ids=np.concatenate([t.edge_ids for t in traces]),
+            begin_shape_indices=np.concatenate([t.begin_shape_indices for t in traces]),
+            end_shape_indices=np.concatenate([t.end_shape_indices for t in traces]),
+            raw=[r for t in traces for r in t.raw],
+        )
+
+    @property
+    def offsets(self):
+        """
+        The start index of each trace's edges, followed by the total number of edges.
+
+        :rtype: numpy.ndarray
+        """
+        return self._offsets
+
+    @property
+    def trace_index(self):
+        """
+        The index of the trace each edge belongs to, e.g. to group edge columns by route.
+
+        :rtype: numpy.ndarray
+        """
+        return np.repeat(np.arange(len(self), dtype=np.int64), np.diff(self._offsets))
+
+    @property
+    def speeds(self):
+        """
+        The speed of each matched edge in km/h as used by the routing engine.
+
+        :rtype: numpy.ndarray
+        """
+        return self._speeds
+
+    @property
+    def lengths(self):
+        """
+        The length of each matched edge in meters.
+
+        :rtype: numpy.ndarray
+        """
+        return self._lengths
+
+    @property
+    def way_ids(self):
+        """
+        The OSM way ID of each matched edge.
+
+        :rtype: numpy.ndarray
+        """
+        return self._way_ids
+
+    @property
+    def edge_ids(self):
+        """
+        The internal graph edge ID of each matched edge.
+
+        :rtype: numpy.ndarray
+        """
+        return self._edge_ids
+
+    @property
+    def begin_shape_indices(self):
+        """
+        Index of the first point of each edge in the matched shape.
+
+        :rtype: numpy.ndarray
+        """
+        return self._begin_shape_indices
+
+    @property
+    def end_shape_indices(self):
+        """
+        Index of the last point of each edge in the matched shape.
+
+        :rtype: numpy.ndarray
+        """
+        return self._end_shape_indices
+
+    @property
+    def durations(self):
+        """
+        The traversal time of each matched edge in seconds, derived from length and speed.
+
+        :rtype: numpy.ndarray
+        """
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(
+                self._speeds > 0, self._lengths / (self._speeds / 3.6), np.nan
+            )
+
+    @property
+    def raw(self):
+        """
+        Returns the raw, unparsed responses, one per trace. For details, consult the routing engine's API documentation.
+
+        :rtype: list of dict
+        """
+        return self._raw
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __repr__(self):  # pragma: no cover
+        return "TraceAttributes({} traces, {} edges)".format(
+            len(self), int(self._offsets[-1])
+        )
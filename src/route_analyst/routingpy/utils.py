@@ -112,6 +112,67 @@ def decode_polyline6(polyline, is3d=False, order="lnglat"):
     return _decode(polyline, precision=6, is3d=is3d, order=order)
 
 
+def _encode_value(value):
+    """Encodes a single signed integer delta as a polyline character chunk."""
+    value = ~(value << 1) if value < 0 else value << 1
+    chunks = []
+    while value >= 0x20:
+        chunks.append(chr((0x20 | (value & 0x1F)) + 63))
+        value >>= 5
+    chunks.append(chr(value + 63))
+
+    return "".join(chunks)
+
+
+def _encode(coordinates, precision=5, order="lnglat"):
+    """Encodes a sequence of coordinates with the given precision. Inverse of :func:`_decode` for 2D geometries."""
+    if order not in ("lnglat", "latlng"):
+        raise ValueError(f"order must be either 'latlng' or 'lnglat', not {order}.")
+
+    factor = 10**precision
+    encoded, prev_lat, prev_lng = [], 0, 0
+    for coord in coordinates:
+        lng, lat = (coord[0], coord[1]) if order == "lnglat" else (coord[1], coord[0])
+        lat, lng = int(round(lat * factor)), int(round(lng * factor))
+        encoded.append(_encode_value(lat - prev_lat))
+        encoded.append(_encode_value(lng - prev_lng))
+        prev_lat, prev_lng = lat, lng
+
+    return "".join(encoded)
+
+
+def encode_polyline5(coordinates, order="lnglat"):
+    """Encodes a list of coordinates to a polyline string with a precision of 5.
+
+    :param coordinates: The coordinates to encode, only 2D is supported.
+    :type coordinates: list of list
+
+    :param order: Specifies the order of the input coordinates.
+                  Options: latlng, lnglat. Defaults to 'lnglat'.
+    :type order: str
+
+    :returns: The encoded polyline with precision 5.
+    :rtype: str
+    """
+    return _encode(coordinates, precision=5, order=order)
+
+
+def encode_polyline6(coordinates, order="lnglat"):
+    """Encodes a list of coordinates to a polyline string with a precision of 6, e.g. for Valhalla requests.
+
+    :param coordinates: The coordinates to encode, only 2D is supported.
+    :type coordinates: list of list
+
+    :param order: Specifies the order of the input coordinates.
+                  Options: latlng, lnglat. Defaults to 'lnglat'.
+    :type order: str
+
+    :returns: The encoded polyline with precision 6.
+    :rtype: str
+    """
+    return _encode(coordinates, precision=6, order=order)
+
+
 def get_ordinal(number):
     """Produces an ordinal (1st, 2nd, 3rd, 4th) from a number"""
 
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Shared-memory transport of route coordinates and results between worker processes"""
+
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+class SharedArray(object):
+    """
+    Picklable handle of a numpy array in shared memory. Pickling the handle only sends the name, shape and dtype of
+    the block, so workers attach to the array without copying it. The process which created the block owns it and
+    releases it once the workers are done.
+
+    >>> handle = SharedArray.from_array(coordinates)
+    >>> executor.submit(run_shared, function, {"coordinates": handle}).result()
+    >>> handle.release()
+    """
+
+    def __init__(self, shape, dtype=np.float64, name=None):
+        """
+        :param shape: Shape of the array
+        :param dtype: dtype of the array
+        :param name: Name of an existing block. Default None, i.e. a new block is created and owned by this handle.
+        """
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        if name is None:
+            size = max(int(np.prod(self.shape)) * self.dtype.itemsize, 1)
+            self._shm = shared_memory.SharedMemory(create=True, size=size)
+            self.name = self._shm.name
+        else:
+            self._shm = None
+            self.name = name
+        self._array = None
+
+    @classmethod
+    def from_array(cls, array):
+        """
+        Copies an array into a new block
+        :param array: array-like
+        :return: SharedArray
+        """
+        array = np.asarray(array)
+        handle = cls(array.shape, array.dtype)
+        handle.array[...] = array
+        return handle
+
+    def __getstate__(self):
+        return {"shape": self.shape, "dtype": self.dtype.str, "name": self.name}
+
+    def __setstate__(self, state):
+        self.__init__(state["shape"], state["dtype"], state["name"])
+
+    def attach(self):
+        """
+        Attaches to the block in a worker
+        :return: SharedMemory, to be closed by the worker once it doesn't use the array any more
+        """
+        return shared_memory.SharedMemory(name=self.name)
+
+    def view(self, shm):
+        """
+        Returns the array in an attached block
+        :param shm: SharedMemory returned by attach
+        :return: numpy array
+        """
+        return np.ndarray(self.shape, dtype=self.dtype, buffer=shm.buf)
+
+    @property
+    def array(self):
+        """
+        Returns the array in the block owned by this handle
+        :return: numpy array
+        """
+        if self._shm is None:
+            raise ValueError("The array of an attached handle is returned by view")
+        if self._array is None:
+            self._array = self.view(self._shm)
+        return self._array
+
+    def release(self):
+        """Frees the block owned by this handle. Copy the arrays needed later before."""
+        if self._shm is None:
+            return
+        self._array = None
+        self._shm.close()
+        self._shm.unlink()
+        self._shm = None
+
+
+def share_routes(routes, **columns):
+    """
+    Places the coordinates of routes in one shared coordinate buffer with the offsets of each route, as in a
+    CoordinateArchive, and further columns in their own blocks
+    :param routes: Sequence of coordinate arrays of shape (n, 2)
+    :param columns: Arrays with one value per route or any other arrays needed by the workers
+    :return: dict of SharedArrays with the keys coordinates, offsets and the names of the columns
+    """
+    lengths = [len(route) for route in routes]
+    offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+    coordinates = SharedArray((offsets[-1], 2), np.float64)
+    if len(routes):
+        np.concatenate(routes, out=coordinates.array)
+    return {
+        "coordinates": coordinates,
+        "offsets": SharedArray.from_array(offsets),
+        **{name: SharedArray.from_array(values) for name, values in columns.items()},
+    }
+
+
+def release(handles):
+    """
+    Frees the blocks of several handles
+    :param handles: dict of SharedArrays
+    """
+    for handle in handles.values():
+        handle.release()
+
+
+def route_view(coordinates, offsets, i):
+    """
+    Returns the coordinates of a route in a buffer written by share_routes
+    :param coordinates: Coordinate buffer
+    :param offsets: Offsets of the routes in the buffer
+    :param i: Position of the route
+    :return: numpy array of shape (n, 2)
+    """
+    return coordinates[offsets[i] : offsets[i + 1]]
+
+
+def run_shared(function, handles, *args):
+    """
+    Runs a function on the arrays of shared blocks in a worker. The worker attaches to the blocks, passes their
+    arrays to the function and detaches afterwards, so the function must not keep references to the arrays. Write
+    results to a shared output array or return compact arrays, not one object per route.
+    :param function: Function taking a dict of arrays and args, defined at module level so it can be pickled
+    :param handles: dict of SharedArrays
+    :param args: Further arguments of the function
+    :return: Return value of the function
+    """
+    blocks = {name: handle.attach() for name, handle in handles.items()}
+    try:
+        return function(
+            {name: handles[name].view(shm) for name, shm in blocks.items()}, *args
+        )
+    finally:
+        for shm in blocks.values():
+            shm.close()
@@ -0,0 +1,455 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Similarity kernels of route geometries working on coordinate arrays"""
+
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:  # pragma: no cover
+    njit = None
+
+#: Metrics computed by batch_similarity
+METRICS = ("hausdorff", "frechet", "average", "overlap")
+
+#: Tolerance of the overlap in degrees, the buffer of ORSRoute.geometry_diff_perc
+TOLERANCE = 0.0001
+
+#: Tolerance of the overlap in metres, for coordinates projected to a metric CRS (see projection.py)
+METRIC_TOLERANCE = 10.0
+
+#: Number of consecutive segments sharing a bounding box when searching the closest segment
+SEGMENT_BLOCK = 16
+
+#: Number of points whose closest segments are searched at once
+POINT_BLOCK = 4096
+
+#: Number of route pairs whose Fréchet distances are computed at once
+PAIR_BLOCK = 256
+
+
+def _as_array(coordinates):
+    """Returns the x and y coordinates of a coordinate list, array or LineString as array of shape (n, 2)"""
+    coordinates = getattr(coordinates, "coords", coordinates)
+    return np.ascontiguousarray(np.asarray(coordinates, dtype=np.float64)[:, :2])
+
+
+def _segment_blocks(line):
+    """
+    Groups the segments of a line in blocks of SEGMENT_BLOCK segments, padded by repeating the last segment
+    :return: start points and vectors of the segments of shape (n_blocks * SEGMENT_BLOCK, 2) and the minimum and
+    maximum corners of the bounding boxes of the blocks of shape (n_blocks, 2)
+    """
+    if len(line) == 1:
+        line = np.repeat(line, 2, axis=0)
+    n_segments = len(line) - 1
+    n_blocks = -(-n_segments // SEGMENT_BLOCK)
+    index = np.minimum(np.arange(n_blocks * SEGMENT_BLOCK), n_segments - 1)
+    start, end = line[index], line[index + 1]
+    shape = (n_blocks, SEGMENT_BLOCK, 2)
+    return (
+        start,
+        end - start,
+        np.minimum(start, end).reshape(shape).min(axis=1),
+        np.maximum(start, end).reshape(shape).max(axis=1),
+    )
+
+
+def point_segment_distances(points, line):
+    """
+    Computes the distance of each point to the closest segment of a line. The segments are grouped in blocks and
+    only the blocks whose bounding box is closer than the farthest corner of the best block are searched, so
+    points near the line are compared to few segments.
+    :param points: Array of shape (n, 2)
+    :param line: Array of shape (m, 2) with the vertices of the line
+    :return: Array of shape (n,)
+    """
+    points, line = _as_array(points), _as_array(line)
+    start, direction, block_min, block_max = _segment_blocks(line)
+    sx, sy = start.T
+    dx, dy = direction.T
+    length_sq = dx**2 + dy**2
+    length_sq[length_sq == 0] = np.inf
+    min_x, min_y = block_min.T
+    max_x, max_y = block_max.T
+
+    distances = np.empty(len(points))
+    for k in range(0, len(points), POINT_BLOCK):
+        px, py = points[k : k + POINT_BLOCK, :, None].transpose(1, 0, 2)
+        # squared distances to the bounding boxes of the blocks and to their farthest corners, an upper bound since
+        # each block contains a vertex within its bounding box
+        lower = (
+            np.maximum(np.maximum(min_x - px, px - max_x), 0) ** 2
+            + np.maximum(np.maximum(min_y - py, py - max_y), 0) ** 2
+        )
+        upper = (
+            np.maximum(np.abs(px - min_x), np.abs(px - max_x)) ** 2
+            + np.maximum(np.abs(py - min_y), np.abs(py - max_y)) ** 2
+        )
+        point, block = np.nonzero(lower <= upper.min(axis=1)[:, None])
+        segment = block[:, None] * SEGMENT_BLOCK + np.arange(SEGMENT_BLOCK)
+        px, py = px[point], py[point]
+        t = np.clip(
+            ((px - sx[segment]) * dx[segment] + (py - sy[segment]) * dy[segment])
+            / length_sq[segment],
+            0,
+            1,
+        )
+        candidates = np.hypot(
+            px - sx[segment] - t * dx[segment], py - sy[segment] - t * dy[segment]
+        ).min(axis=1)
+        starts = np.flatnonzero(np.r_[True, point[1:] != point[:-1]])
+        distances[k : k + POINT_BLOCK] = np.minimum.reduceat(candidates, starts)
+    return distances
+
+
+def bbox_lower_bound(a, b):
+    """
+    Returns a lower bound of the Hausdorff and Fréchet distance of two lines from their bounding boxes: the vertex
+    with the extreme coordinate of one line is at least as far from the other line as their bounding box sides.
+    :return: float
+    """
+    a, b = _as_array(a), _as_array(b)
+    return max(
+        np.abs(a.min(axis=0) - b.min(axis=0)).max(),
+        np.abs(a.max(axis=0) - b.max(axis=0)).max(),
+    )
+
+
+def bbox_gap(a, b):
+    """
+    Returns the distance between the bounding boxes of two lines, a lower bound of the distance of any point of one
+    line to the other line
+    :return: float
+    """
+    a, b = _as_array(a), _as_array(b)
+    gap = np.maximum(
+        0, np.maximum(a.min(axis=0) - b.max(axis=0), b.min(axis=0) - a.max(axis=0))
+    )
+    return float(np.hypot(*gap))
+
+
+def hausdorff(a, b):
+    """
+    Computes the Hausdorff distance between the vertices of each line and the other line, as
+    shapely.hausdorff_distance
+    :return: float
+    """
+    return float(
+        max(point_segment_distances(a, b).max(), point_segment_distances(b, a).max())
+    )
+
+
+def average_distance(a, b):
+    """
+    Computes the mean distance of the vertices of both lines to the closest point of the other line. Unlike the
+    Hausdorff distance, a short detour only raises it in proportion to its share of the vertices.
+    :return: float
+    """
+    distances = np.concatenate(
+        [point_segment_distances(a, b), point_segment_distances(b, a)]
+    )
+    return float(distances.mean())
+
+
+def _linear_interval(x0, slope, low, high):
+    """Returns the interval of u in which low <= x0 + slope * u <= high, (inf, -inf) if it is empty"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        u_low, u_high = (low - x0) / slope, (high - x0) / slope
+    start = np.where(slope > 0, u_low, u_high)
+    end = np.where(slope > 0, u_high, u_low)
+    inside = (x0 >= low) & (x0 <= high)
+    start = np.where(slope == 0, np.where(inside, -np.inf, np.inf), start)
+    end = np.where(slope == 0, np.where(inside, np.inf, -np.inf), end)
+    return start, end
+
+
+def _disc_interval(w, d, radius):
+    """Returns the interval of u in which |w + d * u| <= radius, (inf, -inf) if it is empty"""
+    a = (d**2).sum(axis=1)
+    b = 2 * (w * d).sum(axis=1)
+    c = (w**2).sum(axis=1) - radius**2
+    discriminant = b**2 - 4 * a * c
+    empty = (discriminant < 0) | (a == 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        root = np.sqrt(discriminant)
+        start, end = (-b - root) / (2 * a), (-b + root) / (2 * a)
+    return np.where(empty, np.inf, start), np.where(empty, -np.inf, end)
+
+
+def _capsule_intervals(p, d, q, e, radius):
+    """
+    Returns the interval of u in [0, 1] in which the point p + d * u of a segment lies within radius of the segment
+    from q to q + e. The neighbourhood of a segment is convex, so the interval is the hull of the intervals within
+    the rectangle along the segment and the discs around its end points.
+    """
+    length = np.hypot(*e.T)
+    unit = e / np.where(length > 0, length, 1)[:, None]
+    normal = np.stack([-unit[:, 1], unit[:, 0]], axis=1)
+    w = p - q
+    along = _linear_interval((w * unit).sum(axis=1), (d * unit).sum(axis=1), 0, length)
+    across = _linear_interval(
+        (w * normal).sum(axis=1), (d * normal).sum(axis=1), -radius, radius
+    )
+    rectangle = np.maximum(along[0], across[0]), np.minimum(along[1], across[1])
+    # an empty intersection must not widen the hull
+    empty = (length == 0) | (rectangle[0] > rectangle[1])
+    rectangle = (
+        np.where(empty, np.inf, rectangle[0]),
+        np.where(empty, -np.inf, rectangle[1]),
+    )
+    first, last = _disc_interval(w, d, radius), _disc_interval(w - e, d, radius)
+    start = np.minimum(np.minimum(rectangle[0], first[0]), last[0])
+    end = np.maximum(np.maximum(rectangle[1], first[1]), last[1])
+    return np.maximum(start, 0), np.minimum(end, 1)
+
+
+def segment_overlap(starts, vectors, b, tolerance=TOLERANCE):
+    """
+    Computes the length of each segment which lies within tolerance of line b. Each segment is intersected with the
+    neighbourhoods of the segments of b near it.
+    :param starts: Start points of the segments, array of shape (n, 2)
+    :param vectors: Vectors from the start to the end points of the segments, array of shape (n, 2)
+    :param b: Array of shape (m, 2) with the vertices of the line
+    :return: Array of shape (n,)
+    """
+    b = _as_array(b)
+    p, d = starts, vectors
+    lengths = np.hypot(*d.T)
+    start, direction, block_min, block_max = _segment_blocks(b)
+    segment_min = np.minimum(p, p + d) - tolerance
+    segment_max = np.maximum(p, p + d) + tolerance
+
+    covered = np.zeros(len(p))
+    for k in range(0, len(p), POINT_BLOCK):
+        chunk = slice(k, k + POINT_BLOCK)
+        near = (segment_min[chunk, None, :] <= block_max).all(axis=2) & (
+            segment_max[chunk, None, :] >= block_min
+        ).all(axis=2)
+        segment, block = np.nonzero(near)
+        segment += k
+        other = (block[:, None] * SEGMENT_BLOCK + np.arange(SEGMENT_BLOCK)).ravel()
+        segment = np.repeat(segment, SEGMENT_BLOCK)
+        other_start, other_end = start[other], start[other] + direction[other]
+        near = (
+            (segment_min[segment] <= np.maximum(other_start, other_end))
+            & (segment_max[segment] >= np.minimum(other_start, other_end))
+        ).all(axis=1)
+        segment, other = segment[near], other[near]
+        low, high = _capsule_intervals(
+            p[segment], d[segment], start[other], direction[other], tolerance
+        )
+        valid = low < high
+        segment, low, high = segment[valid], low[valid], high[valid]
+        order = np.lexsort((low, segment))
+        segment, low, high = segment[order], low[order], high[order]
+        # length of the union of the intervals of each segment: the intervals lie in [0, 1], so shifting them by
+        # the segment number keeps the running maximum of the ends within the segment
+        reach = np.maximum.accumulate(high + segment) - segment
+        previous = np.r_[0.0, reach[:-1]]
+        previous[np.r_[True, segment[1:] != segment[:-1]]] = 0
+        covered += np.bincount(
+            segment,
+            weights=np.maximum(0, high - np.maximum(low, previous)) * lengths[segment],
+            minlength=len(p),
+        )
+    return covered
+
+
+def overlap(a, b, tolerance=TOLERANCE):
+    """
+    Computes the share of the length of line a which lies within tolerance of line b, i.e. the length of a within
+    the buffer of b. 1 - overlap corresponds to ORSRoute.geometry_diff_perc / 100.
+    :return: float between 0 and 1
+    """
+    a, b = _as_array(a), _as_array(b)
+    if len(a) == 1:
+        a = np.repeat(a, 2, axis=0)
+    p, d = a[:-1], np.diff(a, axis=0)
+    lengths = np.hypot(*d.T)
+    if lengths.sum() == 0:
+        return float(point_segment_distances(a[:1], b)[0] <= tolerance)
+    return float(segment_overlap(p, d, b, tolerance).sum() / lengths.sum())
+
+
+def _pad(routes, length):
+    """Stacks coordinate arrays into an array of shape (len(routes), length, 2) padded with infinity"""
+    padded = np.full((len(routes), length, 2), np.inf)
+    for k, route in enumerate(routes):
+        padded[k, : len(route)] = route
+    return padded
+
+
+def _frechet_numpy(routes_a, routes_b, threshold):
+    """
+    Discrete Fréchet distances of pairs of lines, computed along the anti-diagonals of the coupling matrices of all
+    pairs at once
+    """
+    n = np.array([len(a) for a in routes_a])
+    m = np.array([len(b) for b in routes_b])
+    a, b = _pad(routes_a, n.max()), _pad(routes_b, m.max())
+    result = np.empty(len(n))
+    pairs = np.arange(len(n))
+    # column i + 1 holds row i of an anti-diagonal, column 0 stays infinite as border. Three buffers are rotated,
+    # the columns read from the two previous anti-diagonals are always written or still infinite.
+    before, previous, current = np.full((3, len(n), n.max() + 1), np.inf)
+    previous_min = np.full(len(n), np.inf)
+    for k in range(a.shape[1] + b.shape[1] - 1):
+        low, high = max(0, k - b.shape[1] + 1), min(k, a.shape[1] - 1)
+        difference = a[:, low : high + 1] - b[:, k - high : k - low + 1][:, ::-1]
+        distances = np.hypot(difference[..., 0], difference[..., 1])
+        distances[np.isnan(distances)] = np.inf
+        if k == 0:
+            current[:, 1] = distances[:, 0]
+        else:
+            reachable = np.minimum(
+                np.minimum(
+                    previous[:, low : high + 1], previous[:, low + 1 : high + 2]
+                ),
+                before[:, low : high + 1],
+            )
+            current[:, low + 1 : high + 2] = np.maximum(reachable, distances)
+        current_min = current[:, low + 1 : high + 2].min(axis=1)
+        finished = n + m - 2 == k
+        result[pairs[finished]] = current[finished, n[finished]]
+        # a coupling may skip an anti-diagonal with a diagonal step, but not two in a row
+        lower_bound = np.minimum(current_min, previous_min)
+        exceeded = ~finished & (lower_bound > threshold)
+        result[pairs[exceeded]] = lower_bound[exceeded]
+        keep = ~(finished | exceeded)
+        if not keep.all():
+            if not keep.any():
+                break
+            pairs, n, m, a, b = pairs[keep], n[keep], m[keep], a[keep], b[keep]
+            before, previous, current = before[keep], previous[keep], current[keep]
+            current_min = current_min[keep]
+        before, previous, current = previous, current, before
+        previous_min = current_min
+    return result
+
+
+if njit is not None:
+
+    @njit(cache=True)
+    def _frechet_jit(a, b, threshold):
+        """Discrete Fréchet distance row by row of the coupling matrix"""
+        n, m = len(a), len(b)
+        previous = np.empty(m)
+        current = np.empty(m)
+        for i in range(n):
+            row_min = np.inf
+            for j in range(m):
+                d = np.sqrt((a[i, 0] - b[j, 0]) ** 2 + (a[i, 1] - b[j, 1]) ** 2)
+                if i == 0 and j == 0:
+                    reachable = 0.0
+                elif i == 0:
+                    reachable = current[j - 1]
+                elif j == 0:
+                    reachable = previous[j]
+                else:
+                    reachable = min(previous[j], previous[j - 1], current[j - 1])
+                current[j] = max(reachable, d)
+                row_min = min(row_min, current[j])
+            # every coupling passes each row
+            if row_min > threshold:
+                return row_min
+            previous, current = current, previous
+        return previous[m - 1]
+
+
+def frechet_lower_bound(a, b):
+    """
+    Returns a lower bound of the discrete Fréchet distance from the bounding boxes and the end points of two lines
+    :return: float
+    """
+    a, b = _as_array(a), _as_array(b)
+    return max(
+        bbox_lower_bound(a, b), np.hypot(*(a[0] - b[0])), np.hypot(*(a[-1] - b[-1]))
+    )
+
+
+def batch_frechet(routes_a, routes_b, threshold=np.inf):
+    """
+    Computes the discrete Fréchet distances of pairs of lines, i.e. the shortest leash needed to walk both lines
+    vertex by vertex without going back. Unlike the Hausdorff distance it accounts for the order of the vertices.
+    Without numba, the pairs are computed together in blocks of similar length. Compiled with numba if it is
+    installed.
+    :param routes_a: Sequence of coordinate arrays
+    :param routes_b: Sequence of coordinate arrays of the same length
+    :param threshold: Distance above which the computation of a pair stops early. Its value is then a lower bound
+    above the threshold.
+    :return: Array
+    """
+    routes_a = [_as_array(a) for a in routes_a]
+    routes_b = [_as_array(b) for b in routes_b]
+    result = np.array(
+        [frechet_lower_bound(a, b) for a, b in zip(routes_a, routes_b)], dtype=float
+    )
+    todo = np.flatnonzero(result <= threshold)
+    if njit is not None:
+        for k in todo:
+            result[k] = _frechet_jit(routes_a[k], routes_b[k], threshold)
+        return result
+    # blocks of pairs with similar numbers of vertices need little padding
+    todo = todo[np.argsort([len(routes_a[k]) + len(routes_b[k]) for k in todo])]
+    for start in range(0, len(todo), PAIR_BLOCK):
+        block = todo[start : start + PAIR_BLOCK]
+        result[block] = _frechet_numpy(
+            [routes_a[k] for k in block], [routes_b[k] for k in block], threshold
+        )
+    return result
+
+
+def frechet(a, b, threshold=np.inf):
+    """
+    Computes the discrete Fréchet distance of two lines, see batch_frechet
+    :return: float
+    """
+    return float(batch_frechet([a], [b], threshold)[0])
+
+
+def batch_similarity(
+    routes_a, routes_b, metrics=METRICS, threshold=np.inf, tolerance=TOLERANCE
+):
+    """
+    Computes similarity metrics of pairs of routes, e.g. ORS and Google routes. Pairs whose bounding boxes show that
+    a distance exceeds the threshold are not computed, their value is the lower bound.
+    :param routes_a: Sequence of coordinate arrays, e.g. ORSRoute.coordinates or CoordinateArchive.coordinates
+    :param routes_b: Sequence of coordinate arrays of the same length
+    :param metrics: Metrics to compute, any of METRICS
+    :param threshold: Distance above which hausdorff, frechet and average are only bounded, e.g. 30 (metres) for
+    projected coordinates when only matching routes are of interest. Default: all distances are computed exactly.
+    :param tolerance: Tolerance of the overlap
+    :return: dict mapping the metrics to arrays
+    """
+    if len(routes_a) != len(routes_b):
+        raise ValueError("routes_a and routes_b have to be of the same length.")
+    unknown = set(metrics) - set(METRICS)
+    if unknown:
+        raise ValueError(f"Unknown metrics {sorted(unknown)}.")
+    routes_a = [_as_array(a) for a in routes_a]
+    routes_b = [_as_array(b) for b in routes_b]
+    results = {metric: np.empty(len(routes_a)) for metric in metrics}
+    if "frechet" in metrics:
+        results["frechet"] = batch_frechet(routes_a, routes_b, threshold)
+    for k, (a, b) in enumerate(zip(routes_a, routes_b)):
+        gap, lower_bound = bbox_gap(a, b), bbox_lower_bound(a, b)
+        if "overlap" in metrics:
+            results["overlap"][k] = 0.0 if gap > tolerance else overlap(a, b, tolerance)
+        bounded = {"hausdorff": lower_bound > threshold, "average": gap > threshold}
+        needed = [metric for metric in ("hausdorff", "average") if metric in metrics]
+        if not needed:
+            continue
+        if all(bounded[metric] for metric in needed):
+            for metric in needed:
+                results[metric][k] = lower_bound if metric == "hausdorff" else gap
+            continue
+        # the distances of the vertices are shared by the Hausdorff and the average distance
+        distances = np.concatenate(
+            [point_segment_distances(a, b), point_segment_distances(b, a)]
+        )
+        if "hausdorff" in metrics:
+            results["hausdorff"][k] = distances.max()
+        if "average" in metrics:
+            results["average"][k] = distances.mean()
+    return results
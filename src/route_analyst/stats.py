@@ -0,0 +1,258 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Error statistics of the ORS routes compared to the Google routes with bootstrap confidence intervals"""
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+#: Percentiles of the errors reported by error_statistics
+PERCENTILES = (5, 25, 50, 75, 95)
+
+#: Number of resamples per task of the process pool. The resamples of each task have their own seed, so the
+#: results don't depend on the number of workers.
+TASK_RESAMPLES = 500
+
+#: Maximum number of resampled values held in memory per batch
+BATCH_VALUES = 5_000_000
+
+
+def errors(results, metric):
+    """
+    Returns the errors of a metric
+    :param results: DataFrame with the results of route_analysis.py
+    :param metric: Column containing the errors, e.g. 'duration_diff_perc', or a tuple of the columns of the
+    predicted and the observed values, e.g. ('ors_dur_sec', 'google_dur_in_traffic_sec')
+    :return: Series
+    """
+    if isinstance(metric, str):
+        return results[metric]
+    predicted, observed = metric
+    return results[predicted] - results[observed]
+
+
+def error_statistics(
+    results, metric, by="ors_type", tolerance=None, percentiles=PERCENTILES
+):
+    """
+    Computes the count, MAE, RMSE, bias (mean error), standard deviation, percentiles and optionally the share of
+    errors within a tolerance per group in one vectorized pass
+    :param results: DataFrame with the results of route_analysis.py
+    :param metric: Error column or tuple of the predicted and observed columns, see errors
+    :param by: Column or list of columns to group by, e.g. ['city', 'ors_type', 'hour']. None for no grouping.
+    :param tolerance: Maximum absolute error counted as within tolerance, e.g. 10 for ±10 %. Default None, i.e. the
+    share is not computed.
+    :param percentiles: Percentiles of the errors
+    :return: DataFrame with one row per group
+    """
+    error = errors(results, metric)
+    keys = [by] if isinstance(by, str) else list(by or [])
+    frame = pd.DataFrame(
+        {"error": error, "abs_error": error.abs(), "squared_error": error**2}
+    )
+    if tolerance is not None:
+        frame["within_tolerance"] = frame["abs_error"] <= tolerance
+    for key in keys:
+        frame[key] = results[key].to_numpy()
+    if keys:
+        grouped = frame.dropna(subset=["error"]).groupby(keys, observed=True)
+    else:
+        grouped = frame.dropna(subset=["error"]).assign(_all=0).groupby("_all")
+
+    stats = pd.DataFrame(
+        {
+            "n": grouped["error"].count(),
+            "mae": grouped["abs_error"].mean(),
+            "rmse": np.sqrt(grouped["squared_error"].mean()),
+            "bias": grouped["error"].mean(),
+            "std": grouped["error"].std(),
+        }
+    )
+    if tolerance is not None:
+        stats["within_tolerance"] = grouped["within_tolerance"].mean()
+    if percentiles:
+        quantiles = grouped["error"].quantile([p / 100 for p in percentiles]).unstack()
+        quantiles.columns = [f"p{p:g}" for p in percentiles]
+        stats = stats.join(quantiles)
+    if not keys:
+        stats = stats.reset_index(drop=True)
+    return stats
+
+
+def _statistic(samples, statistic):
+    """Computes the statistic of each row of the resampled errors"""
+    if statistic == "mean":
+        return samples.mean(axis=1)
+    if statistic == "mae":
+        return np.abs(samples).mean(axis=1)
+    if statistic == "rmse":
+        return np.sqrt((samples**2).mean(axis=1))
+    if statistic == "median":
+        return np.median(samples, axis=1)
+    raise ValueError(f"Unknown statistic '{statistic}'.")
+
+
+def _bootstrap_batch(values, statistic, n_resamples, seed):
+    """Computes the statistic of n_resamples resamples of values, in batches limiting the memory"""
+    rng = np.random.default_rng(seed)
+    batch_size = max(1, BATCH_VALUES // max(len(values), 1))
+    results = []
+    for start in range(0, n_resamples, batch_size):
+        size = min(batch_size, n_resamples - start)
+        samples = values[rng.integers(0, len(values), (size, len(values)))]
+        results.append(_statistic(samples, statistic))
+    return np.concatenate(results)
+
+
+def _bootstrap_pairs_batch(values, statistic, n_resamples, seed):
+    """Computes the difference of the statistic of both columns of n_resamples paired resamples"""
+    rng = np.random.default_rng(seed)
+    batch_size = max(1, BATCH_VALUES // max(2 * len(values), 1))
+    results = []
+    for start in range(0, n_resamples, batch_size):
+        size = min(batch_size, n_resamples - start)
+        samples = values[rng.integers(0, len(values), (size, len(values)))]
+        results.append(
+            _statistic(samples[:, :, 0], statistic)
+            - _statistic(samples[:, :, 1], statistic)
+        )
+    return np.concatenate(results)
+
+
+def _run(function, tasks, workers):
+    """Runs the bootstrap tasks (values, statistic, n_resamples, seed) in a process pool"""
+    if workers == 1:
+        return [function(*task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(function, *zip(*tasks)))
+
+
+def _split(n_resamples):
+    """Splits the resamples of a group into tasks of TASK_RESAMPLES, so that large groups use several processes"""
+    return [
+        min(TASK_RESAMPLES, n_resamples - start)
+        for start in range(0, n_resamples, TASK_RESAMPLES)
+    ]
+
+
+def bootstrap_ci(
+    results,
+    metric,
+    by="ors_type",
+    statistic="mae",
+    n_resamples=2000,
+    confidence=0.95,
+    seed=0,
+    workers=None,
+):
+    """
+    Computes percentile bootstrap confidence intervals of a statistic of the errors per group. The resamples of all
+    groups are drawn in batches of index arrays and computed across a process pool.
+    :param results: DataFrame with the results of route_analysis.py
+    :param metric: Error column or tuple of the predicted and observed columns, see errors
+    :param by: Column or list of columns to group by
+    :param statistic: 'mean' (bias), 'mae', 'rmse' or 'median'
+    :param n_resamples: Number of bootstrap resamples
+    :param confidence: Confidence level of the interval
+    :param seed: Seed of the resampling
+    :param workers: Number of processes. Default None, i.e. the number of CPUs. 1 runs in the current process.
+    :return: DataFrame with the statistic and the lower and upper bound of the interval per group
+    """
+    frame = pd.DataFrame({"error": errors(results, metric)})
+    keys = [by] if isinstance(by, str) else list(by)
+    for key in keys:
+        frame[key] = results[key].to_numpy()
+    groups = [
+        (name, group["error"].to_numpy(dtype=float))
+        for name, group in frame.dropna(subset=["error"]).groupby(keys, observed=True)
+    ]
+    sizes = _split(n_resamples)
+    seeds = iter(np.random.SeedSequence(seed).spawn(len(sizes) * len(groups)))
+    tasks, owners = [], []
+    for i, (_, values) in enumerate(groups):
+        for size in sizes:
+            tasks.append((values, statistic, size, next(seeds)))
+            owners.append(i)
+    samples = _run(_bootstrap_batch, tasks, workers)
+
+    alpha = (1 - confidence) / 2
+    rows = []
+    for i, (name, values) in enumerate(groups):
+        distribution = np.concatenate(
+            [s for s, owner in zip(samples, owners) if owner == i]
+        )
+        lower, upper = np.quantile(distribution, [alpha, 1 - alpha])
+        rows.append(
+            {
+                **dict(zip(keys, name if isinstance(name, tuple) else (name,))),
+                "n": len(values),
+                statistic: _statistic(values[None, :], statistic)[0],
+                "lower": lower,
+                "upper": upper,
+            }
+        )
+    return pd.DataFrame(rows).set_index(keys)
+
+
+def bootstrap_difference(
+    results,
+    metric,
+    a,
+    b,
+    column="ors_type",
+    pair_on="route_id",
+    statistic="mae",
+    n_resamples=2000,
+    confidence=0.95,
+    seed=0,
+    workers=None,
+):
+    """
+    Paired bootstrap of the difference of a statistic of the errors between two groups, e.g. two traffic models, on
+    the routes both have results for
+    :param a: Value of column of the first group, e.g. 'modelled_p85'
+    :param b: Value of column of the second group, e.g. 'normal'
+    :param column: Column distinguishing the groups
+    :param pair_on: Column identifying the same route in both groups
+    :return: dict with the difference a - b, its confidence interval and the share of resamples in which the
+    difference has the opposite sign (a two-sided p-value estimate)
+    """
+    frame = pd.DataFrame(
+        {
+            "error": errors(results, metric),
+            column: results[column].to_numpy(),
+            pair_on: results[pair_on].to_numpy(),
+        }
+    )
+    paired = (
+        frame[frame[column].isin([a, b])]
+        .pivot_table(index=pair_on, columns=column, values="error", observed=True)
+        .dropna()
+    )
+    if paired.empty:
+        raise ValueError(f"No routes with results for both '{a}' and '{b}'.")
+    values = paired[[a, b]].to_numpy(dtype=float)
+    sizes = _split(n_resamples)
+    tasks = [
+        (values, statistic, size, s)
+        for size, s in zip(sizes, np.random.SeedSequence(seed).spawn(len(sizes)))
+    ]
+    distribution = np.concatenate(_run(_bootstrap_pairs_batch, tasks, workers))
+    difference = (
+        _statistic(values[None, :, 0], statistic)[0]
+        - _statistic(values[None, :, 1], statistic)[0]
+    )
+    alpha = (1 - confidence) / 2
+    lower, upper = np.quantile(distribution, [alpha, 1 - alpha])
+    p_value = min(
+        1.0,
+        2 * min((distribution <= 0).mean(), (distribution >= 0).mean()),
+    )
+    return {
+        "n": len(values),
+        "difference": float(difference),
+        "lower": float(lower),
+        "upper": float(upper),
+        "p_value": float(p_value),
+    }
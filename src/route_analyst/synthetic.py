@@ -0,0 +1,256 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Seeded synthetic ORS and Google routes and responses for benchmarks and load tests"""
+
+import json
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+from shapely.geometry import LineString
+
+from .routingpy.utils import encode_polyline5
+
+#: Center of the synthetic routes (Berlin)
+CENTER = (13.40, 52.52)
+
+#: ORS extra information and the number of distinct values generated for each
+EXTRAS = {"waycategory": 5, "surface": 10, "waytype": 7, "steepness": 9}
+
+EARTH_RADIUS = 6371008.8
+
+
+def random_walk(rng, n_points, center=CENTER, step=0.0005, spread=0.05):
+    """
+    Generates the coordinates of a random route as a correlated random walk
+    :param rng: numpy random Generator
+    :param n_points: Number of coordinates
+    :param center: (lon, lat) around which the route starts
+    :param step: Mean step length in degrees
+    :param spread: Maximum offset of the start from the center in degrees
+    :return: numpy array of shape (n_points, 2) with lon, lat
+    """
+    start = np.asarray(center) + rng.uniform(-spread, spread, 2)
+    heading = rng.uniform(0, 2 * np.pi) + np.cumsum(rng.normal(0, 0.3, n_points - 1))
+    lengths = rng.exponential(step, n_points - 1)
+    steps = np.column_stack([np.cos(heading), np.sin(heading)]) * lengths[:, None]
+    return np.vstack([start, start + np.cumsum(steps, axis=0)])
+
+
+def segment_lengths(coordinates):
+    """
+    Returns the length of each segment in meters (haversine)
+    :param coordinates: numpy array of shape (n, 2) with lon, lat
+    :return: numpy array of length n - 1
+    """
+    lon, lat = np.radians(coordinates[:, 0]), np.radians(coordinates[:, 1])
+    a = (
+        np.sin(np.diff(lat) / 2) ** 2
+        + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(np.diff(lon) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(a))
+
+
+def perturb(rng, coordinates, noise=0.00005, detour=0.2):
+    """
+    Returns a similar route, i.e. the coordinates with some noise and an optional detour in the middle
+    :param rng: numpy random Generator
+    :param coordinates: numpy array of shape (n, 2)
+    :param noise: Standard deviation of the noise in degrees
+    :param detour: Fraction of the route which is shifted sideways
+    :return: numpy array of shape (n, 2)
+    """
+    result = coordinates + rng.normal(0, noise, coordinates.shape)
+    n = len(coordinates)
+    length = int(n * detour)
+    if length > 1:
+        start = rng.integers(0, n - length)
+        result[start : start + length] += rng.normal(0, 0.002, 2)
+    return result
+
+
+def _extra(rng, n_segments, lengths, n_values, mean_run=10):
+    """Generates the values and summary of an ORS extra as runs of equal values along the route"""
+    bounds = np.unique(
+        np.concatenate(
+            [
+                [0],
+                np.cumsum(rng.geometric(1 / mean_run, n_segments)),
+            ]
+        ).clip(max=n_segments)
+    )
+    values = rng.integers(0, n_values, len(bounds) - 1)
+    runs = [
+        [int(s), int(e), int(v)] for s, e, v in zip(bounds[:-1], bounds[1:], values)
+    ]
+    distances = (
+        pd.Series([lengths[s:e].sum() for s, e, _ in runs], index=values)
+        .groupby(level=0)
+        .sum()
+    )
+    total = distances.sum() or 1.0
+    summary = [
+        {
+            "value": float(value),
+            "distance": round(float(distance), 1),
+            "amount": round(float(distance / total * 100), 2),
+        }
+        for value, distance in distances.items()
+    ]
+    return {"values": runs, "summary": summary}
+
+
+def ors_feature(rng, coordinates, extras=EXTRAS, speed=10.0):
+    """
+    Creates an ORS GeoJSON route feature for the coordinates
+    :param rng: numpy random Generator
+    :param coordinates: numpy array of shape (n, 2)
+    :param extras: dict with the names of the extras and the number of distinct values
+    :param speed: Mean speed in m/s used to derive the duration
+    :return: dict
+    """
+    lengths = segment_lengths(coordinates)
+    distance = float(lengths.sum())
+    properties = {
+        "summary": {
+            "distance": round(distance, 1),
+            "duration": round(distance / speed * rng.uniform(0.8, 1.2), 1),
+        },
+        "way_points": [0, len(coordinates) - 1],
+        "ascent": round(float(rng.uniform(0, 50)), 1),
+        "descent": round(float(rng.uniform(0, 50)), 1),
+    }
+    if extras:
+        properties["extras"] = {
+            name: _extra(rng, len(lengths), lengths, n_values)
+            for name, n_values in extras.items()
+        }
+    return {
+        "type": "Feature",
+        "bbox": [*coordinates.min(axis=0).tolist(), *coordinates.max(axis=0).tolist()],
+        "properties": properties,
+        "geometry": {"type": "LineString", "coordinates": coordinates.tolist()},
+    }
+
+
+def ors_response(rng, n_points=200, coordinates=None, extras=EXTRAS):
+    """
+    Creates an ORS directions response in GeoJSON format
+    :param rng: numpy random Generator
+    :param n_points: Number of coordinates of the route, if coordinates are not given
+    :param coordinates: Coordinates of the route, e.g. a perturbed Google route
+    :param extras: dict with the names of the extras and the number of distinct values
+    :return: dict
+    """
+    if coordinates is None:
+        coordinates = random_walk(rng, n_points)
+    feature = ors_feature(rng, np.asarray(coordinates), extras=extras)
+    return {
+        "type": "FeatureCollection",
+        "bbox": feature["bbox"],
+        "features": [feature],
+        "metadata": {
+            "attribution": "openrouteservice.org | OpenStreetMap contributors",
+            "service": "routing",
+            "query": {"profile": "driving-car", "format": "geojson"},
+            "engine": {"version": "synthetic"},
+        },
+    }
+
+
+def google_response(rng, n_points=200, n_steps=10, coordinates=None, speed=10.0):
+    """
+    Creates a Google Directions API response with encoded polylines
+    :param rng: numpy random Generator
+    :param n_points: Number of coordinates of the route, if coordinates are not given
+    :param n_steps: Number of steps the route is split into
+    :param coordinates: Coordinates of the route
+    :param speed: Mean speed in m/s used to derive the duration
+    :return: dict
+    """
+    if coordinates is None:
+        coordinates = random_walk(rng, n_points)
+    coordinates = np.asarray(coordinates)
+    lengths = segment_lengths(coordinates)
+    distance = int(lengths.sum())
+    duration = int(distance / speed)
+    bounds = np.linspace(0, len(coordinates) - 1, n_steps + 1).astype(int)
+    steps = [
+        {
+            "polyline": {"points": encode_polyline5(coordinates[s : e + 1].tolist())},
+            "distance": {"value": int(lengths[s:e].sum())},
+        }
+        for s, e in zip(bounds[:-1], bounds[1:])
+        if e > s
+    ]
+    leg = {
+        "distance": {"value": distance},
+        "duration": {"value": duration},
+        "duration_in_traffic": {"value": int(duration * rng.uniform(0.9, 1.5))},
+        "steps": steps,
+    }
+    return {"status": "OK", "geocoded_waypoints": [], "routes": [{"legs": [leg]}]}
+
+
+def google_routes(rng, n_routes, n_points=200, hours=24, speed=10.0):
+    """
+    Creates a GeoDataFrame of Google routes as written by generate_google_routes.py
+    :param rng: numpy random Generator
+    :param n_routes: Number of routes
+    :param n_points: Number of coordinates per route
+    :param hours: Number of departure hours the routes are distributed over
+    :param speed: Mean speed in m/s used to derive the duration
+    :return: GeoDataFrame
+    """
+    records = []
+    for i in range(n_routes):
+        coordinates = random_walk(rng, n_points)
+        distance = float(segment_lengths(coordinates).sum())
+        duration = distance / speed
+        hour = i % hours
+        records.append(
+            {
+                "id": f"h{hour:02d}_{i // hours}",
+                "departure_time": pd.Timestamp(2023, 6, 14, hour).isoformat(),
+                "duration_in_traffic": int(duration * rng.uniform(0.9, 1.5)),
+                "duration": int(duration),
+                "distance": int(distance),
+                "geometry": LineString(coordinates),
+            }
+        )
+    return gpd.GeoDataFrame(records, crs="epsg:4326")
+
+
+def write_city(data_dir, city, n_routes, ors_types=("normal",), n_points=200, seed=0):
+    """
+    Writes synthetic Google routes and similar ORS routes in the directory layout of the scripts, so that
+    route_analysis.py can be run on them
+    :param data_dir: Data directory
+    :param city: Name of the synthetic city
+    :param n_routes: Number of Google routes
+    :param ors_types: ORS types to generate routes for
+    :param n_points: Number of coordinates per route
+    :param seed: Seed of the random generator
+    :return: Path of the Google routes file
+    """
+    rng = np.random.default_rng(seed)
+    city_dir = Path(data_dir) / city
+    google_dir = city_dir / "google_routes"
+    google_dir.mkdir(parents=True, exist_ok=True)
+
+    routes = google_routes(rng, n_routes, n_points=n_points)
+    google_file = google_dir / f"{city}_50_routes_per_hour.geojson"
+    routes.to_file(google_file, driver="GeoJSON")
+
+    for ors_type in ors_types:
+        ors_dir = city_dir / f"ors_routes_{ors_type}"
+        ors_dir.mkdir(exist_ok=True)
+        for route_id, geometry in zip(routes.id, routes.geometry):
+            hour = route_id[1:].split("_")[0]
+            coordinates = perturb(rng, np.asarray(geometry.coords))
+            response = ors_response(rng, coordinates=coordinates)
+            outfile = ors_dir / f"route_{ors_type}_{hour}_{route_id}_0.geojson"
+            with open(outfile, "w") as dst:
+                json.dump(response, dst)
+    return google_file
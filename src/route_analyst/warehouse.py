@@ -0,0 +1,264 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""SQLite warehouse of the route analysis results of all cities, runs and ORS types"""
+
+import json
+import sqlite3
+import uuid
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+#: Numeric result columns stored in the warehouse
+METRICS = [
+    "google_distance",
+    "ors_distance",
+    "google_dur_in_traffic_sec",
+    "google_dur_sec",
+    "ors_dur_sec",
+    "duration_diff_sec",
+    "duration_diff_perc",
+    "distance_diff_meter",
+    "distance_diff_perc",
+    "geometry_diff_perc",
+    "geometry_diff_hausdorff",
+]
+
+#: Metrics aggregated per run, city, ORS type and hour
+AGGREGATED_METRICS = [
+    "duration_diff_sec",
+    "duration_diff_perc",
+    "distance_diff_perc",
+    "geometry_diff_perc",
+    "geometry_diff_hausdorff",
+]
+
+#: Routes whose geometry and distance match the Google route, as filtered in the Boxenplots notebook. The Hausdorff
+#: distance is in metres.
+MATCHED = "geometry_diff_hausdorff < 30 AND distance_diff_perc > -1 AND distance_diff_perc < 1"
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    city TEXT NOT NULL,
+    started TEXT NOT NULL,
+    n_results INTEGER,
+    metadata TEXT
+);
+CREATE TABLE IF NOT EXISTS results (
+    run_id TEXT NOT NULL REFERENCES runs(run_id) ON DELETE CASCADE,
+    city TEXT NOT NULL,
+    ors_type TEXT NOT NULL,
+    hour INTEGER NOT NULL,
+    route_id TEXT NOT NULL,
+    {", ".join(f"{m} REAL" for m in METRICS)}
+);
+CREATE INDEX IF NOT EXISTS results_partition ON results (city, ors_type, hour);
+CREATE INDEX IF NOT EXISTS results_run ON results (run_id, ors_type);
+CREATE INDEX IF NOT EXISTS results_matched ON results (city, geometry_diff_hausdorff, distance_diff_perc);
+CREATE TABLE IF NOT EXISTS aggregates (
+    run_id TEXT NOT NULL REFERENCES runs(run_id) ON DELETE CASCADE,
+    city TEXT NOT NULL,
+    ors_type TEXT NOT NULL,
+    hour INTEGER NOT NULL,
+    scope TEXT NOT NULL,
+    n INTEGER NOT NULL,
+    {", ".join(f"{m}_sum REAL, {m}_sum_sq REAL, {m}_min REAL, {m}_max REAL" for m in AGGREGATED_METRICS)},
+    PRIMARY KEY (run_id, ors_type, hour, scope)
+);
+CREATE INDEX IF NOT EXISTS aggregates_partition ON aggregates (city, ors_type, scope);
+CREATE VIEW IF NOT EXISTS latest_runs AS
+    SELECT city, run_id FROM runs r
+    WHERE started = (SELECT MAX(started) FROM runs WHERE city = r.city);
+"""
+
+
+class Warehouse(object):
+    """
+    Results of route_analysis.py of all cities and runs in one SQLite database. Each run of the analysis is appended
+    with a run id. Sums, sums of squares, minima and maxima of the main metrics are stored per run, ORS type and hour
+    for all routes and for the matched routes (see MATCHED) when a run is added, so that summaries are read from
+    these aggregates instead of scanning the results.
+
+    >>> warehouse = Warehouse("data/results.sqlite")
+    >>> warehouse.summary("duration_diff_perc", by=["city", "ors_type"], scope="matched")
+    """
+
+    def __init__(self, path):
+        """
+        :param path: Path of the database file, created if it doesn't exist
+        """
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA foreign_keys=ON")
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def add_run(self, city, results, run_id=None, **metadata):
+        """
+        Appends the results of a run of the analysis and materializes its aggregates
+        :param city: City name
+        :param results: (Geo)DataFrame with the results of route_analysis.py
+        :param run_id: Id of the run. Default None, i.e. '{city}_{timestamp}_{random suffix}'
+        :param metadata: Additional information about the run, e.g. the commit or the parameters
+        :return: run id
+        """
+        started = datetime.now()
+        run_id = run_id or f"{city}_{started:%Y%m%dT%H%M%S}_{uuid.uuid4().hex[:6]}"
+        columns = ["ors_type", "hour", "route_id", *METRICS]
+        rows = pd.DataFrame(results)[columns].astype(
+            {"ors_type": str, "hour": int, "route_id": str}
+        )
+        rows.insert(0, "city", city)
+        rows.insert(0, "run_id", run_id)
+        with self.connection:
+            self.connection.execute(
+                "INSERT INTO runs VALUES (?, ?, ?, ?, ?)",
+                (
+                    run_id,
+                    city,
+                    started.isoformat(),
+                    len(rows),
+                    json.dumps(metadata, default=str),
+                ),
+            )
+            self.connection.executemany(
+                f"INSERT INTO results ({', '.join(rows.columns)}) "
+                f"VALUES ({', '.join('?' * len(rows.columns))})",
+                rows.astype(object)
+                .where(rows.notna(), None)
+                .itertuples(index=False, name=None),
+            )
+            self._aggregate(run_id)
+        return run_id
+
+    def _aggregate(self, run_id):
+        statistics = ", ".join(
+            f"SUM({m}), SUM({m} * {m}), MIN({m}), MAX({m})" for m in AGGREGATED_METRICS
+        )
+        for scope, condition in [("all", "1"), ("matched", MATCHED)]:
+            self.connection.execute(
+                f"INSERT INTO aggregates SELECT run_id, city, ors_type, hour, '{scope}', COUNT(*), {statistics} "
+                f"FROM results WHERE run_id = ? AND {condition} GROUP BY run_id, city, ors_type, hour",
+                (run_id,),
+            )
+
+    def delete_run(self, run_id):
+        """
+        Deletes a run with its results and aggregates
+        :param run_id: Id of the run
+        """
+        with self.connection:
+            self.connection.execute("DELETE FROM runs WHERE run_id = ?", (run_id,))
+
+    def query(self, sql, params=()):
+        """
+        Runs a SQL query
+        :param sql: SQL query on the tables runs, results and aggregates or the view latest_runs
+        :param params: Parameters of the query
+        :return: DataFrame
+        """
+        return pd.read_sql_query(sql, self.connection, params=params)
+
+    def runs(self, city=None):
+        """
+        Returns the runs
+        :param city: City name. Default None, i.e. all
+        :return: DataFrame
+        """
+        if city is None:
+            return self.query("SELECT * FROM runs ORDER BY started")
+        return self.query("SELECT * FROM runs WHERE city = ? ORDER BY started", (city,))
+
+    @staticmethod
+    def _filters(run_id, **partition):
+        """Creates the where clause of the run and partition filters"""
+        clauses, params = [], []
+        if run_id == "latest":
+            clauses.append("run_id IN (SELECT run_id FROM latest_runs)")
+        elif run_id is not None:
+            clauses.append("run_id = ?")
+            params.append(run_id)
+        for column, values in partition.items():
+            if values is None:
+                continue
+            if isinstance(values, (str, int)):
+                values = [values]
+            clauses.append(f"{column} IN ({', '.join('?' * len(values))})")
+            params.extend(values)
+        return " AND ".join(clauses) or "1", params
+
+    def results(
+        self,
+        city=None,
+        ors_type=None,
+        hour=None,
+        run_id="latest",
+        columns=None,
+        matched=False,
+    ):
+        """
+        Reads results. The filters accept a single value or a list.
+        :param run_id: Id of a run, 'latest' for the latest run of each city or None for all runs
+        :param columns: Columns to read. Default None, i.e. all
+        :param matched: If True, only the matched routes (see MATCHED) are read
+        :return: DataFrame
+        """
+        where, params = self._filters(run_id, city=city, ors_type=ors_type, hour=hour)
+        if matched:
+            where += f" AND {MATCHED}"
+        return self.query(
+            f"SELECT {', '.join(columns) if columns else '*'} FROM results WHERE {where}",
+            params,
+        )
+
+    def summary(
+        self,
+        metric,
+        by=("city", "ors_type"),
+        city=None,
+        ors_type=None,
+        hour=None,
+        run_id="latest",
+        scope="all",
+    ):
+        """
+        Returns the count, mean, standard deviation, RMSE, minimum and maximum of a metric per group, computed from
+        the aggregates without scanning the results
+        :param metric: One of AGGREGATED_METRICS
+        :param by: Columns to group by, any of 'run_id', 'city', 'ors_type' and 'hour'
+        :param scope: 'all' routes or 'matched' routes
+        :return: DataFrame
+        """
+        if metric not in AGGREGATED_METRICS:
+            raise ValueError(f"Metric '{metric}' is not aggregated.")
+        where, params = self._filters(run_id, city=city, ors_type=ors_type, hour=hour)
+        group = ", ".join(by)
+        summary = self.query(
+            f"SELECT {group}, SUM(n) AS n, SUM({metric}_sum) AS sum, SUM({metric}_sum_sq) AS sum_sq, "
+            f"MIN({metric}_min) AS min, MAX({metric}_max) AS max "
+            f"FROM aggregates WHERE {where} AND scope = ? GROUP BY {group} ORDER BY {group}",
+            [*params, scope],
+        )
+        n = summary.pop("n")
+        total, total_sq = summary.pop("sum"), summary.pop("sum_sq")
+        mean = total / n
+        summary.insert(len(by), "n", n)
+        summary.insert(len(by) + 1, "mean", mean)
+        summary.insert(
+            len(by) + 2,
+            "std",
+            np.sqrt(((total_sq - n * mean**2) / (n - 1)).clip(lower=0)),
+        )
+        summary.insert(len(by) + 3, "rmse", np.sqrt(total_sq / n))
+        return summary
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""Archive the coordinates of all Google and ORS routes of a city for route_analysis.py"""
+
+from pathlib import Path
+import argparse
+import logging
+import sys
+
+# change to the working directory to the python file location so that the imports work
+sys.path.append(str(Path(__file__).parent.parent.resolve()))
+
+from route_analyst.archive import archive_dir, write_google_archive, write_ors_archive
+from generate_ors_routes import ORS_INSTANCES
+
+logger = logging.getLogger(__file__)
+logging.basicConfig(level=logging.INFO)
+
+
+def main(data_dir, city, ors_types):
+    """
+    Writes the coordinate archives of the Google routes and the ORS routes of each ORS type to data/CITY/archive
+    :param ors_types: ORS types whose routes are archived, types without routes are skipped
+    """
+    data_dir = Path(data_dir)
+    google_routes_file = (
+        data_dir / city / "google_routes" / f"{city}_50_routes_per_hour.geojson"
+    )
+    n_routes = write_google_archive(
+        google_routes_file, archive_dir(data_dir, city, "google")
+    )
+    logger.info(f"Archived {n_routes} Google routes")
+
+    for ors_type in ors_types:
+        ors_routes_dir = data_dir / city / f"ors_routes_{ors_type}"
+        if not ors_routes_dir.exists():
+            logger.info(f"No routes for {ors_type}, skipped")
+            continue
+        n_routes = write_ors_archive(
+            ors_routes_dir, ors_type, archive_dir(data_dir, city, ors_type)
+        )
+        logger.info(f"Archived {n_routes} ORS routes of {ors_type}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Archives the route coordinates of a city for route_analysis.py"
+    )
+    parser.add_argument(
+        "-c",
+        required=True,
+        dest="city",
+        metavar="City name",
+        type=str,
+        help="City name. Check Readme for more information.",
+    )
+    parser.add_argument(
+        "-t",
+        required=False,
+        dest="ors_types",
+        metavar="ORS types",
+        type=str,
+        nargs="+",
+        default=list(ORS_INSTANCES),
+        help="ORS types whose routes are archived, default: all",
+    )
+    args = parser.parse_args()
+
+    data_dir = "data"
+
+    main(data_dir, city=args.city, ors_types=args.ors_types)
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""Build the spatial index of all Google and ORS routes of a city for corridor and area queries"""
+
+from pathlib import Path
+import argparse
+import json
+import logging
+import sys
+
+import numpy as np
+import shapely
+
+# change to the working directory to the python file location so that the imports work
+sys.path.append(str(Path(__file__).parent.parent.resolve()))
+
+from route_analyst.archive import iter_google_geometries, open_archives, route_id_of
+from route_analyst.route_index import GOOGLE, route_index_dir, write_route_index
+from generate_ors_routes import ORS_INSTANCES
+
+logger = logging.getLogger(__file__)
+logging.basicConfig(level=logging.INFO)
+
+
+def ors_geometries(ors_routes_dir, ors_type):
+    """
+    Reads the geometries of all ORS routes of an ORS type
+    :param ors_routes_dir: Directory with the ORS routes written by generate_ors_routes.py
+    :return: list of route ids and list of LineStrings
+    """
+    ids, geometries = [], []
+    for file in sorted(Path(ors_routes_dir).glob(f"route_{ors_type}_*.geojson")):
+        with open(file) as src:
+            feature = json.load(src)["features"][0]
+        ids.append(route_id_of(file, ors_type))
+        geometries.append(shapely.linestrings(feature["geometry"]["coordinates"]))
+    return ids, geometries
+
+
+def main(data_dir, city, ors_types, archive=False):
+    """
+    Writes the index of the Google routes and the ORS routes of each ORS type to data/CITY/route_index
+    :param ors_types: ORS types whose routes are indexed, types without routes are skipped
+    :param archive: If True, the geometries are taken from the coordinate archives written by
+    build_coordinate_archive.py instead of parsing the route files
+    """
+    data_dir = Path(data_dir)
+    archives = open_archives(data_dir, city) if archive else {}
+    route_sets, ids, geometries = [], [], []
+
+    if GOOGLE in archives:
+        google_ids, google_geometries = (
+            archives[GOOGLE].ids,
+            archives[GOOGLE].geometries(),
+        )
+    else:
+        google_routes_file = (
+            data_dir / city / "google_routes" / f"{city}_50_routes_per_hour.geojson"
+        )
+        google_ids, google_geometries = zip(*iter_google_geometries(google_routes_file))
+    route_sets += [GOOGLE] * len(google_ids)
+    ids += list(google_ids)
+    geometries += list(google_geometries)
+    logger.info(f"Indexing {len(google_ids)} Google routes")
+
+    for ors_type in ors_types:
+        ors_routes_dir = data_dir / city / f"ors_routes_{ors_type}"
+        if ors_type in archives:
+            ors_ids, ors = archives[ors_type].ids, archives[ors_type].geometries()
+        elif ors_routes_dir.exists():
+            ors_ids, ors = ors_geometries(ors_routes_dir, ors_type)
+        else:
+            logger.info(f"No routes for {ors_type}, skipped")
+            continue
+        route_sets += [ors_type] * len(ors_ids)
+        ids += list(ors_ids)
+        geometries += list(ors)
+        logger.info(f"Indexing {len(ors_ids)} ORS routes of {ors_type}")
+
+    directory = route_index_dir(data_dir, city)
+    n_routes = write_route_index(
+        directory, route_sets, ids, np.asarray(geometries, dtype=object)
+    )
+    logger.info(f"Indexed {n_routes} routes in {directory}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Builds the spatial index of the routes of a city"
+    )
+    parser.add_argument(
+        "-c",
+        required=True,
+        dest="city",
+        metavar="City name",
+        type=str,
+        help="City name. Check Readme for more information.",
+    )
+    parser.add_argument(
+        "-t",
+        required=False,
+        dest="ors_types",
+        metavar="ORS types",
+        type=str,
+        nargs="+",
+        default=list(ORS_INSTANCES),
+        help="ORS types whose routes are indexed, default: all",
+    )
+    parser.add_argument(
+        "-a",
+        required=False,
+        dest="archive",
+        action="store_true",
+        help="Take the geometries from the coordinate archives written by build_coordinate_archive.py",
+    )
+    args = parser.parse_args()
+
+    main(
+        data_dir="data", city=args.city, ors_types=args.ors_types, archive=args.archive
+    )
@@ -10,6 +10,7 @@ from shapely.geometry import LineString
 import os
 import sys
 import random
+import time
 from tqdm import tqdm
 import dotenv
 from pathlib import Path
@@ -19,14 +20,22 @@ sys.path.append(str(Path(__file__).parent.parent.resolve()))
 dotenv.load_dotenv("../.env")
 
 from route_analyst import routingpy, utils, GoogleRoute
+from route_analyst.profiling import Profiler, profiler_from_args
+from route_analyst.routingpy.metrics import MetricsRegistry
 from route_analyst.routingpy.exceptions import (
     RouterApiError,
     RouterServerError,
     OverQueryLimit,
 )
 
+# Can be overridden, e.g. to run against mock_routing_server.py
+GOOGLE_BASE_URL = os.getenv("GOOGLE_BASE_URL", "https://maps.googleapis.com")
+
 random.seed(123)
 
+# Departure times of the routes, one per hour of the day
+DEPARTURE_TIMES = pd.date_range("2023-06-14", periods=24, freq="h")
+
 STATUS_CODES = {
     "NOT_FOUND": {
         "code": 404,
@@ -155,12 +164,20 @@ def _parse_direction_json(response, alternatives):
         )
 
 
-def query_google_route(google_client, start_end_coordinates, departure_time):
+def query_google_route(
+    google_client,
+    start_end_coordinates,
+    departure_time,
+    metrics=None,
+    base_url=GOOGLE_BASE_URL,
+):
     """
     Queries route from Google Directions API
     :param google_client:
     :param start_end_coordinates:
     :param departure_time:
+    :param metrics: MetricsRegistry recording latency, status, payload size and parse time of the request
+    :param base_url: Base url of the Google Directions API
     :return:
     """
     # route_google = google_client.directions(locations=start_end_coordinates,
@@ -173,7 +190,7 @@ def query_google_route(google_client, start_end_coordinates, departure_time):
     end = f"{start_end_coordinates[1][1]},{start_end_coordinates[1][0]}"
     alternatives = True
     url = (
-        f"https://maps.googleapis.com/maps/api/directions/json?"
+        f"{base_url.rstrip('/')}/maps/api/directions/json?"
         f"origin={start}&"
         f"destination={end}&"
         f"&key={os.getenv('GOOGLE_API_KEY')}&"
@@ -184,12 +201,41 @@ def query_google_route(google_client, start_end_coordinates, departure_time):
     payload = {}
     headers = {}
 
+    start = time.monotonic()
     try:
         response = requests.request("GET", url, headers=headers, data=payload)
+    except Exception as e:
+        if metrics is not None:
+            metrics.record_request(
+                "google",
+                "/maps/api/directions/json",
+                base_url,
+                "timeout" if isinstance(e, requests.exceptions.Timeout) else "error",
+                time.monotonic() - start,
+            )
+        print(e)
+        return None
+    latency = time.monotonic() - start
+
+    parse_start, status = time.monotonic(), response.status_code
+    try:
         route_google = _parse_direction_json(response.json(), alternatives)
     except Exception as e:
+        # errors like OVER_QUERY_LIMIT are sent with HTTP 200, record the status they correspond to
+        status = getattr(e, "status", status)
         print(e)
         return None
+    finally:
+        if metrics is not None:
+            metrics.record_request(
+                "google",
+                "/maps/api/directions/json",
+                base_url,
+                status,
+                latency,
+                bytes_in=len(response.content),
+                parse_time=time.monotonic() - parse_start,
+            )
 
     if route_google is None:
         return None
@@ -212,7 +258,63 @@ def query_google_route(google_client, start_end_coordinates, departure_time):
     return routes_google_df
 
 
-def generate_google_routes(aoi_file, n_routes, outfile):
+def sample_google_routes(
+    google_client,
+    aoi,
+    departure_time,
+    n_routes,
+    start=0,
+    metrics=None,
+    profiler=None,
+    base_url=GOOGLE_BASE_URL,
+    pbar=None,
+):
+    """
+    Queries Google routes between random coordinates in the AOI for one departure time
+    :param aoi: Polygon of the AOI
+    :param departure_time: Departure time as pandas Timestamp
+    :param n_routes: Number of routes
+    :param start: Number of the first route, used in the route ids 'hHH_NUMBER'
+    :param pbar: Progress bar updated for each route
+    :return: list of GeoDataFrames, one per route
+    """
+    profiler = profiler or Profiler(enabled=False)
+    routes_collection = []
+    i = start
+    while i < start + n_routes:
+        with profiler.stage("random_coordinates"):
+            start_end_coordinates = utils.get_random_coordinates(polygon=aoi)
+        try:
+            with profiler.stage("query_google_route"):
+                routes = query_google_route(
+                    google_client,
+                    start_end_coordinates,
+                    departure_time.strftime("%s"),
+                    metrics=metrics,
+                    base_url=base_url,
+                )
+        except Exception as e:
+            print(e)
+            continue
+        if routes is None:
+            continue
+        routes["id"] = f"h{departure_time.strftime('%H')}_{i}"
+        routes["departure_time"] = departure_time.isoformat()
+        routes_collection.append(routes)
+        i += 1
+        if pbar is not None:
+            pbar.update(1)
+    return routes_collection
+
+
+def generate_google_routes(
+    aoi_file,
+    n_routes,
+    outfile,
+    metrics_file=None,
+    profiler=None,
+    base_url=GOOGLE_BASE_URL,
+):
     """
     Generates routes using Google Directions API
     :param aoi_file:
@@ -220,39 +322,43 @@ def generate_google_routes(aoi_file, n_routes, outfile):
     :param n_routes:
     :param departure_time: Departure time in ISO format
     :param outfile:
+    :param metrics_file: Path to write request metrics to (.json or Prometheus text format)
+    :param profiler: Profiler measuring the stages. If given, the report is written next to the output file.
+    :param base_url: Base url of the Google Directions API
     :return:
     """
-    # departure times in epocs
-    departure_times = pd.date_range("2023-06-14", periods=24, freq="H")
-
-    aoi = gpd.read_file(aoi_file).geometry.cascaded_union
+    profiler = profiler or Profiler(enabled=False)
+    with profiler.stage("read_aoi"):
+        aoi = gpd.read_file(aoi_file).geometry.cascaded_union
     google_client = routingpy.routers.Google(api_key=os.getenv("GOOGLE_API_KEY"))
+    metrics = MetricsRegistry() if metrics_file else None
 
     routes_collection = []
     with tqdm(total=n_routes * 24) as pbar:
-        for departure_time in departure_times:
-            i = 0
-            while i < n_routes:
-                start_end_coordinates = utils.get_random_coordinates(polygon=aoi)
-                try:
-                    routes = query_google_route(
-                        google_client,
-                        start_end_coordinates,
-                        departure_time.strftime("%s"),
-                    )
-                except Exception as e:
-                    print(e)
-                    continue
-                if routes is None:
-                    continue
-                routes["id"] = f"h{departure_time.strftime('%H')}_{i}"
-                routes["departure_time"] = departure_time.isoformat()
-                routes_collection.append(routes)
-                i += 1
-                pbar.update(1)
+        for departure_time in DEPARTURE_TIMES:
+            routes_collection.extend(
+                sample_google_routes(
+                    google_client,
+                    aoi,
+                    departure_time,
+                    n_routes,
+                    metrics=metrics,
+                    profiler=profiler,
+                    base_url=base_url,
+                    pbar=pbar,
+                )
+            )
 
-    routes_collection_df = gpd.GeoDataFrame(pd.concat(routes_collection, axis=0))
-    routes_collection_df.to_file(outfile, driver="GeoJSON")
+    with profiler.stage("build_geodataframe"):
+        routes_collection_df = gpd.GeoDataFrame(pd.concat(routes_collection, axis=0))
+    with profiler.stage("to_file"):
+        routes_collection_df.to_file(outfile, driver="GeoJSON")
+
+    if metrics is not None:
+        metrics.write(metrics_file)
+    profiler.write(
+        Path(outfile).with_suffix(".profile.json"), aoi_file=aoi_file, n_routes=n_routes
+    )
 
 
 if __name__ == "__main__":
@@ -273,7 +379,7 @@ if __name__ == "__main__":
         required=False,
         default=50,
         dest="n_routes",
-        type=str,
+        type=int,
         help="Number of routes for each hour of the day",
     )
     parser.add_argument(
@@ -284,8 +390,43 @@ if __name__ == "__main__":
         type=str,
         help="Path to output file",
     )
+    parser.add_argument(
+        "--metrics",
+        "-m",
+        required=False,
+        default=None,
+        dest="metrics_file",
+        type=str,
+        help="Path to write request metrics to, as JSON summary (.json) or in Prometheus text format (.prom)",
+    )
+    parser.add_argument(
+        "--url",
+        "-u",
+        required=False,
+        default=GOOGLE_BASE_URL,
+        dest="base_url",
+        type=str,
+        help="Base url of the Google Directions API, e.g. of mock_routing_server.py. "
+        "Default: GOOGLE_BASE_URL or https://maps.googleapis.com",
+    )
+    parser.add_argument(
+        "--profile",
+        "-p",
+        required=False,
+        dest="profile",
+        nargs="*",
+        choices=["cprofile", "memory"],
+        default=None,
+        help="Write a profile report with the time of each stage. Optionally capture a cProfile "
+        "and/or the peak memory per stage, e.g. -p cprofile memory",
+    )
     args = parser.parse_args()
 
     generate_google_routes(
-        aoi_file=args.aoi_file, n_routes=args.n_routes, outfile=args.outfile
+        aoi_file=args.aoi_file,
+        n_routes=args.n_routes,
+        outfile=args.outfile,
+        metrics_file=args.metrics_file,
+        profiler=profiler_from_args(args.profile, name="generate_google_routes"),
+        base_url=args.base_url,
     )
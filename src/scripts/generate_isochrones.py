@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""Generate isochrones on a grid of centers for all ORS instances and compare them"""
+
+from pathlib import Path
+import geopandas as gpd
+import logging
+import sys
+import argparse
+
+# change to the working directory to the python file location so that the imports work
+sys.path.append(str(Path(__file__).parent.parent.resolve()))
+
+from route_analyst.isochrones import (
+    center_grid,
+    compare_isochrones,
+    generate_isochrones,
+    ors_sources,
+)
+from route_analyst.routingpy.metrics import MetricsRegistry
+from generate_ors_routes import ORS_INSTANCES, PROFILE
+
+logger = logging.getLogger(__file__)
+logging.basicConfig(level=logging.INFO)
+
+
+def main(
+    data_dir,
+    city,
+    aoi_file,
+    spacing,
+    intervals,
+    ors_types,
+    reference,
+    workers,
+    metrics_file=None,
+):
+    """
+    Generates isochrones for all centers and ORS instances and compares them to the reference ORS instance
+    :param metrics_file: Path to write request metrics to, as JSON summary (.json) or in Prometheus text format
+    :return: a geojson file with all isochrones and a csv file with the comparison
+    """
+    data_dir = Path(data_dir)
+    out_dir = data_dir / city / "isochrones"
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    aoi = gpd.read_file(aoi_file).to_crs("epsg:4326").geometry.unary_union
+    centers = center_grid(aoi, spacing)
+    logger.info(f"Generating isochrones for {len(centers)} centers...")
+
+    instances = {ors_type: ORS_INSTANCES[ors_type] for ors_type in ors_types}
+    metrics = MetricsRegistry() if metrics_file else None
+    isochrones = generate_isochrones(
+        ors_sources(instances, profile=PROFILE, metrics=metrics),
+        centers,
+        intervals,
+        cache_dir=out_dir / "cache",
+        max_workers=workers,
+    )
+    isochrones.rename(columns={"source": "ors_type"}).to_file(
+        out_dir / f"{city}_isochrones.geojson", driver="GeoJSON"
+    )
+
+    if metrics is not None:
+        metrics.write(metrics_file)
+
+    if reference in ors_types:
+        comparison = compare_isochrones(isochrones, reference=reference)
+        comparison.rename(columns={"source": "ors_type"}).to_csv(
+            out_dir / f"{city}_isochrones_comparison.csv", index=False
+        )
+
+    return len(isochrones)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Generates and compares isochrones of ORS instances"
+    )
+    parser.add_argument(
+        "-c",
+        required=True,
+        dest="city",
+        metavar="City name",
+        type=str,
+        help="City name. Check Readme for more information.",
+    )
+    parser.add_argument(
+        "-a",
+        required=True,
+        dest="aoi_file",
+        metavar="AOI file",
+        type=str,
+        help="Path to the vector file containing polygon of AOI",
+    )
+    parser.add_argument(
+        "-s",
+        required=False,
+        dest="spacing",
+        metavar="Grid spacing",
+        type=float,
+        default=2000,
+        help="Distance between isochrone centers in meters, default = 2000",
+    )
+    parser.add_argument(
+        "-i",
+        required=False,
+        dest="intervals",
+        metavar="Intervals",
+        type=int,
+        nargs="+",
+        default=[300, 600, 900],
+        help="Isochrone intervals in seconds, default = 300 600 900",
+    )
+    parser.add_argument(
+        "-t",
+        required=False,
+        dest="ors_types",
+        metavar="ORS types",
+        type=str,
+        nargs="+",
+        default=list(ORS_INSTANCES.keys()),
+        help="Types of ORS to query, default = all. Check Readme for more information.",
+    )
+    parser.add_argument(
+        "-r",
+        required=False,
+        dest="reference",
+        metavar="Reference ORS type",
+        type=str,
+        default="normal",
+        help="ORS type the others are compared to, default = normal",
+    )
+    parser.add_argument(
+        "-w",
+        required=False,
+        dest="workers",
+        metavar="Workers",
+        type=int,
+        default=8,
+        help="Number of concurrent requests, default = 8",
+    )
+    parser.add_argument(
+        "-m",
+        required=False,
+        dest="metrics_file",
+        metavar="Metrics file",
+        type=str,
+        default=None,
+        help="Path to write request metrics to, as JSON summary (.json) or in Prometheus text format (.prom)",
+    )
+    args = parser.parse_args()
+
+    data_dir = "data"
+
+    main(
+        data_dir,
+        city=args.city,
+        aoi_file=args.aoi_file,
+        spacing=args.spacing,
+        intervals=args.intervals,
+        ors_types=args.ors_types,
+        reference=args.reference,
+        workers=args.workers,
+        metrics_file=args.metrics_file,
+    )
@@ -3,9 +3,10 @@
 """Generate ORS route for each Google Route"""
 
 from pathlib import Path
-import geopandas as gpd
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+import json
 import logging
 import sys
 import argparse
@@ -14,6 +15,10 @@ import argparse
 sys.path.append(str(Path(__file__).parent.parent.resolve()))
 
 from route_analyst import ORSRoutingClient
+from route_analyst.io import CHUNKSIZE, iter_google_routes
+from route_analyst.profiling import Profiler, profiler_from_args
+from route_analyst.routingpy.metrics import MetricsRegistry
+from route_analyst.routingpy.hedging import HedgingPolicy
 
 
 ORS_INSTANCES = {
@@ -23,8 +28,12 @@ ORS_INSTANCES = {
     "modelled_p85": "http://localhost:8083/ors/",  # ors with modelled 85th percentile traffic speed
     "uber_p85": "http://localhost:8084/ors/",  # ors with uber 85th percentile traffic speed
 }
+# To scale an ORS type horizontally, start more containers and list all of their urls, e.g.
+# "normal": ["http://localhost:8080/ors/", "http://localhost:8090/ors/"]
 PROFILE = "driving-car"
 FORMAT = "geojson"
+# File in the data directory with the recommended number of workers per ORS type, see ors_capacity_benchmark.py
+WORKERS_CONFIG = "ors_workers.json"
 
 logger = logging.getLogger(__file__)
 logging.basicConfig(level=logging.INFO)
@@ -43,24 +52,113 @@ def split_line(splits, google_geom):
     return route_coordinates
 
 
-def main(data_dir, ors_type, city, splits):
+def route_body(google_route, splits):
     """
-    Reads Google routes and generates similar ORS routes
-    :return: a geojson file for each route
+    Creates the ORS request body replicating a Google route
+    :param google_route: Row of the Google routes GeoDataFrame
+    :param splits: Number of waypoints the Google route is split into
+    :return: dict
     """
-    # Get ors url
-    ors_url = ORS_INSTANCES[ors_type]
-    data_dir = Path(data_dir)
-
-    # ORS query parameters
-    body = {
-        "coordinates": None,
+    return {
+        "coordinates": split_line(splits, google_route.geometry),
         "instructions": "false",
         "preference": "fastest",
-        "departure": None,
+        "departure": datetime.isoformat(google_route.departure_time),
         # "alternative_routes": {"share_factor": 0.8, "target_count": 2}
     }
 
+
+def configured_workers(data_dir, ors_type):
+    """
+    Reads the recommended number of workers for an ORS type from the config written by ors_capacity_benchmark.py
+    :return: number of workers or None if the ORS type was not benchmarked
+    """
+    config_file = Path(data_dir) / WORKERS_CONFIG
+    try:
+        with open(config_file) as src:
+            return json.load(src)[ors_type]["workers"]
+    except (FileNotFoundError, KeyError):
+        return None
+
+
+def replay_route(
+    ors_client, google_route, ors_type, splits, ors_routes_dir, profiler=None
+):
+    """
+    Generates the ORS route for a single Google route and writes it to file
+    :param profiler: Profiler measuring the stages of the replay
+    :return: path of the written file
+    """
+    profiler = profiler or Profiler(enabled=False)
+    # Extract coordinates from google route to be passed to ORS
+    with profiler.stage("split_line"):
+        body = route_body(google_route, splits)
+
+    # Calculate ORS routes
+    with profiler.stage("request"):
+        response_normal = ors_client.request(
+            params=body, profile=PROFILE, format=FORMAT
+        )
+    outfile = (
+        ors_routes_dir
+        / f"route_{ors_type}_{google_route.hour}_{google_route.id}.geojson"
+    )
+    with profiler.stage("write_route"):
+        response_normal.to_file(outfile)
+    return outfile
+
+
+def hedging_policy(hedge):
+    """
+    Creates the hedging policy from the command line value
+    :param hedge: Fixed delay in seconds, e.g. '5', or percentile of the observed latencies, e.g. 'p95'
+    :return: HedgingPolicy or None
+    """
+    if not hedge:
+        return None
+    if hedge.startswith("p"):
+        return HedgingPolicy(percentile=float(hedge[1:]))
+    return HedgingPolicy(delay=float(hedge))
+
+
+def main(
+    data_dir,
+    ors_type,
+    city,
+    splits,
+    base_urls=None,
+    workers=None,
+    hedge=None,
+    single_flight=False,
+    metrics_file=None,
+    profiler=None,
+    hours=None,
+    chunksize=CHUNKSIZE,
+):
+    """
+    Reads Google routes in chunks and generates similar ORS routes
+    :param base_urls: List of urls of the ORS instance replicas. Overrides the urls in ORS_INSTANCES.
+    :param workers: Number of concurrent requests. Default: the recommended number in WORKERS_CONFIG or 1
+    :param hedge: Delay in seconds (e.g. '5') or latency percentile (e.g. 'p95') after which slow requests are
+    sent again to another replica. Default None, i.e. no hedging.
+    :param single_flight: If True, identical requests in flight at the same time are only sent once
+    :param metrics_file: Path to write request metrics to, as JSON summary (.json) or in Prometheus text format
+    :param profiler: Profiler measuring the stages of the replay. If given, the report is written next to the
+    output directory.
+    :param hours: Departure hours of the Google routes to replay, e.g. [7, 8]. Default None, i.e. all
+    :param chunksize: Number of Google routes read at once
+    :return: a geojson file for each route
+    """
+    profiler = profiler or Profiler(enabled=False)
+    # Get ors url
+    ors_url = base_urls or ORS_INSTANCES[ors_type]
+    if isinstance(ors_url, (list, tuple)) and len(ors_url) == 1:
+        ors_url = ors_url[0]
+    data_dir = Path(data_dir)
+    if workers is None:
+        workers = configured_workers(data_dir, ors_type) or 1
+        logger.info(f"Using {workers} workers")
+
     # Get directories and create output directory
     google_routes_dir = data_dir / city / "google_routes"
     ors_routes_dir = data_dir / city / f"ors_routes_{ors_type}"
@@ -70,48 +168,71 @@ def main(data_dir, ors_type, city, splits):
     google_routes_file = (
         google_routes_dir / f"{city}_50_routes_per_hour.geojson"
     )  # 50 routes
-    all_google_routes = gpd.read_file(google_routes_file)
-    all_google_routes["hour"] = all_google_routes.id.apply(
-        lambda x: x[1:].split("_")[0]
-    )
 
     # Client to query ORS
-    ors_client = ORSRoutingClient(base_url=ors_url)
+    metrics = MetricsRegistry() if metrics_file else None
+    ors_client = ORSRoutingClient(
+        base_url=ors_url,
+        hedging=hedging_policy(hedge),
+        single_flight=single_flight,
+        metrics=metrics,
+    )
 
     routes_id_list = [0]
     alternative_id = 0
 
-    for index, google_route in all_google_routes.iterrows():
-        logger.info(f"Processing route number {google_route.id} - {alternative_id}")
-
-        if google_route.id in routes_id_list:
-            alternative_id += 1
-        else:
-            alternative_id = 0
-            routes_id_list.append(google_route.id)
-        google_route.id = f"{google_route.id}_{alternative_id}"  # check if the id was used before and skip it (no alternative routes)
-
-        google_geom = google_route.geometry
-        google_departure = datetime.isoformat(google_route.departure_time)
-
-        # Extract coordinates from google route to be passed to ORS
-        route_coordinates = split_line(splits, google_geom)
-
-        # Calculate ORS routes
-        body["coordinates"] = route_coordinates
-        body["departure"] = google_departure
-        try:
-            response_normal = ors_client.request(
-                params=body, profile=PROFILE, format=FORMAT
-            )
-            response_normal.to_file(
-                ors_routes_dir
-                / f"route_{ors_type}_{google_route.hour}_{google_route.id}.geojson"
-            )
-        except Exception as e:
-            logger.warning(f"Could not process route {google_route.id}:")
-            logger.warning(e)
-            continue
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        google_chunks = iter_google_routes(
+            google_routes_file, chunksize=chunksize, hours=hours
+        )
+        for google_routes in profiler.iterate("read_google_routes", google_chunks):
+            futures = {}
+            for index, google_route in google_routes.iterrows():
+                if google_route.id in routes_id_list:
+                    alternative_id += 1
+                else:
+                    alternative_id = 0
+                    routes_id_list.append(google_route.id)
+                google_route.id = f"{google_route.id}_{alternative_id}"  # check if the id was used before and skip it (no alternative routes)
+
+                future = executor.submit(
+                    replay_route,
+                    ors_client,
+                    google_route,
+                    ors_type,
+                    splits,
+                    ors_routes_dir,
+                    profiler,
+                )
+                futures[future] = google_route.id
+
+            # finish the chunk before reading the next one, so that the memory stays flat
+            for future in as_completed(futures):
+                route_id = futures[future]
+                try:
+                    future.result()
+                    logger.info(f"Processed route number {route_id}")
+                except Exception as e:
+                    logger.warning(f"Could not process route {route_id}:")
+                    logger.warning(e)
+                    continue
+
+    for replica in ors_client.stats():
+        logger.info(f"ORS replica statistics: {replica}")
+    if hedge:
+        logger.info(f"Hedging statistics: {ors_client.hedging_stats()}")
+    if single_flight:
+        logger.info(f"Single-flight statistics: {ors_client.single_flight_stats()}")
+    if metrics is not None:
+        metrics.write(metrics_file)
+        logger.info(f"Request metrics written to {metrics_file}")
+    profiler.write(
+        data_dir / city / f"ors_routes_{ors_type}_profile.json",
+        city=city,
+        ors_type=ors_type,
+        workers=workers,
+        hours=hours,
+    )
 
 
 if __name__ == "__main__":
@@ -141,8 +262,98 @@ if __name__ == "__main__":
         default=10,
         help="Route splits, default = 10",
     )
+    parser.add_argument(
+        "-u",
+        required=False,
+        dest="base_urls",
+        metavar="ORS urls",
+        type=str,
+        nargs="+",
+        default=None,
+        help="Urls of one or more replicas of the ORS instance. Overrides the urls in ORS_INSTANCES.",
+    )
+    parser.add_argument(
+        "-w",
+        required=False,
+        dest="workers",
+        metavar="Workers",
+        type=int,
+        default=None,
+        help="Number of concurrent requests, default = the number recommended by ors_capacity_benchmark.py "
+        "in data/ors_workers.json or 1",
+    )
+    parser.add_argument(
+        "-e",
+        required=False,
+        dest="hedge",
+        metavar="Hedging delay",
+        type=str,
+        default=None,
+        help="Send slow requests again to another replica after a delay in seconds (e.g. 5) or "
+        "after a percentile of the observed latencies (e.g. p95). Default: no hedging",
+    )
+    parser.add_argument(
+        "-f",
+        required=False,
+        dest="single_flight",
+        action="store_true",
+        help="Send identical requests which are in flight at the same time only once (single-flight)",
+    )
+    parser.add_argument(
+        "-m",
+        required=False,
+        dest="metrics_file",
+        metavar="Metrics file",
+        type=str,
+        default=None,
+        help="Path to write request metrics to, as JSON summary (.json) or in Prometheus text format (.prom)",
+    )
+    parser.add_argument(
+        "-p",
+        required=False,
+        dest="profile",
+        metavar="Profiling options",
+        nargs="*",
+        choices=["cprofile", "memory"],
+        default=None,
+        help="Write a profile report with the time of each stage. Optionally capture a cProfile "
+        "and/or the peak memory per stage, e.g. -p cprofile memory",
+    )
+    parser.add_argument(
+        "-H",
+        required=False,
+        dest="hours",
+        metavar="Hours",
+        type=int,
+        nargs="+",
+        default=None,
+        help="Departure hours of the Google routes to replay, e.g. to split the routes between several "
+        "processes. Default: all",
+    )
+    parser.add_argument(
+        "-b",
+        required=False,
+        dest="chunksize",
+        metavar="Chunk size",
+        type=int,
+        default=CHUNKSIZE,
+        help=f"Number of Google routes read at once, default = {CHUNKSIZE}",
+    )
     args = parser.parse_args()
 
     data_dir = "data"
 
-    main(data_dir, ors_type=args.ors_type, city=args.city, splits=args.splits)
+    main(
+        data_dir,
+        ors_type=args.ors_type,
+        city=args.city,
+        splits=args.splits,
+        base_urls=args.base_urls,
+        workers=args.workers,
+        hedge=args.hedge,
+        single_flight=args.single_flight,
+        metrics_file=args.metrics_file,
+        profiler=profiler_from_args(args.profile, name="generate_ors_routes"),
+        hours=args.hours,
+        chunksize=args.chunksize,
+    )
@@ -0,0 +1,408 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""Local stand-in for ORS and the Google Directions API to load test the pipeline offline"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+import argparse
+import json
+import logging
+import re
+import sys
+import threading
+import time
+
+import numpy as np
+
+# change to the working directory to the python file location so that the imports work
+sys.path.append(str(Path(__file__).parent.parent.resolve()))
+
+from route_analyst import synthetic
+
+logger = logging.getLogger(__file__)
+logging.basicConfig(level=logging.INFO)
+
+ORS_DIRECTIONS = re.compile(
+    r"^(?:/.*)?/v2/directions/(?P<profile>[^/]+)/(?P<format>[^/]+)/?$"
+)
+ORS_HEALTH = re.compile(r"^(?:/.*)?/health/?$")
+GOOGLE_DIRECTIONS = "/maps/api/directions/json"
+
+
+def latency_sampler(spec):
+    """
+    Creates a function drawing response latencies in seconds from a distribution
+    :param spec: 'const:<s>', 'uniform:<min>,<max>', 'exp:<mean>' or 'lognormal:<median>,<sigma>', e.g.
+    'lognormal:0.05,1' for a median of 50 ms with a long tail
+    :return: function (rng) -> float
+    """
+    name, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(",") if v]
+    if name == "const":
+        return lambda rng: values[0]
+    if name == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if name == "exp":
+        return lambda rng: rng.exponential(values[0])
+    if name == "lognormal":
+        return lambda rng: rng.lognormal(np.log(values[0]), values[1])
+    raise ValueError(f"Unknown latency distribution '{spec}'.")
+
+
+class RecordedResponses(object):
+    """Serves recorded responses, e.g. ORS routes written by generate_ors_routes.py, in turns"""
+
+    def __init__(self, directory, pattern="*.geojson"):
+        """
+        :param directory: Directory containing the recorded responses as JSON files
+        :param pattern: Glob pattern of the files
+        """
+        self.files = sorted(Path(directory).glob(pattern))
+        if not self.files:
+            raise ValueError(f"No recorded responses found in {directory}.")
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            file = self.files[self._next % len(self.files)]
+            self._next += 1
+        return file.read_bytes()
+
+
+class MockRoutingServer(ThreadingHTTPServer):
+    """
+    HTTP server answering ORS directions requests (``/ors/v2/directions/{profile}/geojson``) and Google Directions API
+    requests (``/maps/api/directions/json``) with synthetic routes through the requested coordinates or recorded
+    responses, after a random latency. Errors (HTTP 500) and rate limiting (HTTP 429 for ORS, OVER_QUERY_LIMIT for
+    Google) are injected at the given rates.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address,
+        latency="const:0",
+        error_rate=0.0,
+        rate_limit_rate=0.0,
+        recorded=None,
+        n_points=200,
+        seed=0,
+        capacity=None,
+    ):
+        """
+        :param address: (host, port) to listen on
+        :param latency: Latency distribution, see latency_sampler
+        :param error_rate: Fraction of requests answered with a server error
+        :param rate_limit_rate: Fraction of requests answered with HTTP 429 (ORS) or OVER_QUERY_LIMIT (Google)
+        :param recorded: Directory with recorded ORS responses. If None, synthetic responses are generated.
+        :param n_points: Number of coordinates of synthetic routes
+        :param seed: Seed of the random generator
+        :param capacity: Number of requests processed at the same time, further requests queue like on a
+        saturated ORS instance. Default None, i.e. unlimited.
+        """
+        super().__init__(address, MockRequestHandler)
+        self.capacity = threading.BoundedSemaphore(capacity) if capacity else None
+        self.latency = latency_sampler(latency)
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.recorded = RecordedResponses(recorded) if recorded else None
+        self.n_points = n_points
+        self.rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+        self.counts = {}
+
+    def draw(self):
+        """
+        Draws the latency and the outcome of a request
+        :return: tuple of latency in seconds and 'ok', 'error' or 'rate_limited'
+        """
+        with self._lock:
+            latency = self.latency(self.rng)
+            u = self.rng.random()
+        if u < self.error_rate:
+            return latency, "error"
+        if u < self.error_rate + self.rate_limit_rate:
+            return latency, "rate_limited"
+        return latency, "ok"
+
+    def count(self, endpoint, outcome):
+        with self._lock:
+            key = f"{endpoint} {outcome}"
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def process(self, latency):
+        """Simulates the processing time of a request, waiting for a free slot if the capacity is limited"""
+        if self.capacity is None:
+            time.sleep(latency)
+            return
+        with self.capacity:
+            time.sleep(latency)
+
+    def ors_route(self, coordinates):
+        """
+        Creates a synthetic ORS response through the requested coordinates or returns a recorded response
+        :param coordinates: list of [lon, lat] of the request
+        :return: bytes
+        """
+        if self.recorded is not None:
+            return self.recorded()
+        with self._lock:
+            seed = int(self.rng.integers(2**31))
+        rng = np.random.default_rng(seed)
+        return json.dumps(
+            synthetic.ors_response(
+                rng, coordinates=_densify(coordinates, self.n_points)
+            )
+        ).encode()
+
+    def google_route(self, origin, destination):
+        """
+        Creates a synthetic Google Directions API response between origin and destination
+        :param origin: (lon, lat)
+        :param destination: (lon, lat)
+        :return: bytes
+        """
+        with self._lock:
+            seed = int(self.rng.integers(2**31))
+        rng = np.random.default_rng(seed)
+        coordinates = synthetic.perturb(
+            rng, _densify([origin, destination], self.n_points), detour=0
+        )
+        return json.dumps(
+            synthetic.google_response(rng, coordinates=coordinates)
+        ).encode()
+
+
+def _densify(coordinates, n_points):
+    """Linearly interpolates n_points along the coordinates"""
+    coordinates = np.asarray(coordinates, dtype=float)
+    if len(coordinates) < 2:
+        return np.repeat(coordinates, 2, axis=0)
+    lengths = np.concatenate(
+        [[0], np.cumsum(np.hypot(*np.diff(coordinates, axis=0).T))]
+    )
+    positions = np.linspace(0, lengths[-1], max(n_points, len(coordinates)))
+    return np.column_stack(
+        [
+            np.interp(positions, lengths, coordinates[:, 0]),
+            np.interp(positions, lengths, coordinates[:, 1]),
+        ]
+    )
+
+
+class MockRequestHandler(BaseHTTPRequestHandler):
+    """Handles the requests of the MockRoutingServer"""
+
+    protocol_version = "HTTP/1.1"
+
+    def _send(self, status, body, content_type="application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status, message):
+        self._send(
+            status, json.dumps({"error": {"code": status, "message": message}}).encode()
+        )
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if ORS_HEALTH.match(url.path):
+            self._send(200, b'{"status":"ready"}')
+        elif url.path == GOOGLE_DIRECTIONS:
+            self._google(parse_qs(url.query))
+        else:
+            self._error(404, f"Unknown endpoint {url.path}")
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        match = ORS_DIRECTIONS.match(url.path)
+        if not match:
+            self._error(404, f"Unknown endpoint {url.path}")
+            return
+        try:
+            coordinates = json.loads(body)["coordinates"]
+        except (ValueError, KeyError):
+            self._error(400, "Parameter 'coordinates' is missing or invalid.")
+            return
+        self._ors(coordinates)
+
+    def _ors(self, coordinates):
+        latency, outcome = self.server.draw()
+        self.server.process(latency)
+        self.server.count("ors", outcome)
+        if outcome == "error":
+            self._error(500, "Injected server error.")
+        elif outcome == "rate_limited":
+            self._error(429, "Rate limit exceeded.")
+        else:
+            self._send(200, self.server.ors_route(coordinates), "application/geo+json")
+
+    def _google(self, query):
+        latency, outcome = self.server.draw()
+        self.server.process(latency)
+        self.server.count("google", outcome)
+        if outcome == "error":
+            self._send(200, b'{"status":"UNKNOWN_ERROR","routes":[]}')
+            return
+        if outcome == "rate_limited":
+            self._send(200, b'{"status":"OVER_QUERY_LIMIT","routes":[]}')
+            return
+        try:
+            # Google expects lat,lon
+            origin, destination = (
+                [float(v) for v in reversed(query[key][0].split(","))]
+                for key in ("origin", "destination")
+            )
+        except (KeyError, ValueError):
+            self._send(200, b'{"status":"INVALID_REQUEST","routes":[]}')
+            return
+        self._send(200, self.server.google_route(origin, destination))
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+
+def main(
+    host,
+    port,
+    latency,
+    error_rate,
+    rate_limit_rate,
+    recorded,
+    n_points,
+    seed,
+    capacity=None,
+):
+    """
+    Runs the mock routing server until it is interrupted
+    """
+    server = MockRoutingServer(
+        (host, port),
+        latency=latency,
+        error_rate=error_rate,
+        rate_limit_rate=rate_limit_rate,
+        recorded=recorded,
+        n_points=n_points,
+        seed=seed,
+        capacity=capacity,
+    )
+    logger.info(
+        f"Mock routing server listening on http://{host}:{server.server_port} "
+        f"(ORS: http://{host}:{server.server_port}/ors/, Google: http://{host}:{server.server_port})"
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        logger.info(f"Requests served: {server.counts}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Runs a local mock of ORS and the Google Directions API"
+    )
+    parser.add_argument(
+        "-p",
+        required=False,
+        dest="port",
+        metavar="Port",
+        type=int,
+        default=8080,
+        help="Port to listen on, default = 8080",
+    )
+    parser.add_argument(
+        "-H",
+        required=False,
+        dest="host",
+        metavar="Host",
+        type=str,
+        default="127.0.0.1",
+        help="Host to listen on, default = 127.0.0.1",
+    )
+    parser.add_argument(
+        "-l",
+        required=False,
+        dest="latency",
+        metavar="Latency distribution",
+        type=str,
+        default="const:0",
+        help="Latency in seconds, e.g. const:0.05, uniform:0.01,0.2, exp:0.05 or lognormal:0.05,1 "
+        "(median, sigma), default = const:0",
+    )
+    parser.add_argument(
+        "-e",
+        required=False,
+        dest="error_rate",
+        metavar="Error rate",
+        type=float,
+        default=0.0,
+        help="Fraction of requests answered with a server error, default = 0",
+    )
+    parser.add_argument(
+        "-q",
+        required=False,
+        dest="rate_limit_rate",
+        metavar="Rate limit rate",
+        type=float,
+        default=0.0,
+        help="Fraction of requests answered with HTTP 429 / OVER_QUERY_LIMIT, default = 0",
+    )
+    parser.add_argument(
+        "-r",
+        required=False,
+        dest="recorded",
+        metavar="Recorded responses",
+        type=str,
+        default=None,
+        help="Directory with recorded ORS responses (e.g. data/berlin/ors_routes_normal) to serve "
+        "instead of synthetic routes",
+    )
+    parser.add_argument(
+        "-n",
+        required=False,
+        dest="n_points",
+        metavar="Points per route",
+        type=int,
+        default=200,
+        help="Number of coordinates of synthetic routes, default = 200",
+    )
+    parser.add_argument(
+        "-s",
+        required=False,
+        dest="seed",
+        metavar="Seed",
+        type=int,
+        default=0,
+        help="Seed of the random generator, default = 0",
+    )
+    parser.add_argument(
+        "-k",
+        required=False,
+        dest="capacity",
+        metavar="Capacity",
+        type=int,
+        default=None,
+        help="Number of requests processed at the same time, default = unlimited",
+    )
+    args = parser.parse_args()
+
+    main(
+        host=args.host,
+        port=args.port,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        recorded=args.recorded,
+        n_points=args.n_points,
+        seed=args.seed,
+        capacity=args.capacity,
+    )
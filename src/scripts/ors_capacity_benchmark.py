@@ -0,0 +1,271 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""Load test an ORS instance with replayed Google routes to find the number of workers it can take"""
+
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import argparse
+import json
+import logging
+import sys
+import time
+
+import geopandas as gpd
+import numpy as np
+
+# change to the working directory to the python file location so that the imports work
+sys.path.append(str(Path(__file__).parent.parent.resolve()))
+
+from route_analyst import ORSRoutingClient
+from generate_ors_routes import (
+    FORMAT,
+    ORS_INSTANCES,
+    PROFILE,
+    WORKERS_CONFIG,
+    route_body,
+)
+
+logger = logging.getLogger(__file__)
+logging.basicConfig(level=logging.INFO)
+
+
+def sample_bodies(google_routes_file, n_routes, splits, seed=0):
+    """
+    Creates ORS request bodies from a random sample of Google routes
+    :param google_routes_file: File with the Google routes
+    :param n_routes: Sample size
+    :param splits: Number of waypoints per route
+    :param seed: Seed of the sample
+    :return: list of dict
+    """
+    google_routes = gpd.read_file(google_routes_file)
+    sample = google_routes.sample(
+        n=min(n_routes, len(google_routes)), random_state=seed
+    )
+    return [route_body(google_route, splits) for _, google_route in sample.iterrows()]
+
+
+def run_level(ors_client, bodies, concurrency, n_requests):
+    """
+    Sends n_requests requests with the given concurrency
+    :return: dict with throughput, latency percentiles and error rate
+    """
+
+    def send(body):
+        start = time.perf_counter()
+        try:
+            ors_client.request(params=body, profile=PROFILE, format=FORMAT)
+            return time.perf_counter() - start, None
+        except Exception as e:
+            return time.perf_counter() - start, e
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(
+            executor.map(send, (bodies[i % len(bodies)] for i in range(n_requests)))
+        )
+    wall_time = time.perf_counter() - start
+
+    latencies = np.array([latency for latency, error in results if error is None])
+    errors = sum(error is not None for _, error in results)
+    p50, p95, p99 = (
+        np.percentile(latencies, [50, 95, 99]) if len(latencies) else [np.nan] * 3
+    )
+    return {
+        "concurrency": concurrency,
+        "requests": n_requests,
+        "requests_per_second": len(latencies) / wall_time,
+        "p50": float(p50),
+        "p95": float(p95),
+        "p99": float(p99),
+        "error_rate": errors / n_requests,
+    }
+
+
+def find_knee(levels, min_gain=0.1, max_latency_factor=2.0, max_error_rate=0.01):
+    """
+    Finds the knee of the throughput curve, i.e. the highest concurrency after which more workers don't increase the
+    throughput by at least min_gain, or the p95 latency exceeds max_latency_factor times the latency at the lowest
+    concurrency, or the error rate exceeds max_error_rate
+    :param levels: Results of run_level sorted by concurrency
+    :return: Recommended concurrency
+    """
+    base_p95 = levels[0]["p95"]
+    knee = levels[0]["concurrency"]
+    for previous, level in zip(levels, levels[1:]):
+        if (
+            level["error_rate"] > max_error_rate
+            or level["p95"] > max_latency_factor * base_p95
+            or level["requests_per_second"]
+            < (1 + min_gain) * previous["requests_per_second"]
+        ):
+            break
+        knee = level["concurrency"]
+    return knee
+
+
+def write_config(config_file, ors_type, workers, base_url, levels):
+    """
+    Adds the recommended number of workers of an ORS type to the config file read by generate_ors_routes.py
+    """
+    config_file = Path(config_file)
+    config = {}
+    if config_file.exists():
+        with open(config_file) as src:
+            config = json.load(src)
+    config[ors_type] = {
+        "workers": workers,
+        "base_url": base_url,
+        "date": datetime.now().isoformat(),
+        "levels": levels,
+    }
+    with open(config_file, "w") as dst:
+        json.dump(config, dst, indent=2)
+
+
+def main(
+    data_dir,
+    ors_type,
+    city,
+    base_urls=None,
+    levels=(1, 2, 4, 8, 16, 32),
+    n_routes=50,
+    requests_per_level=200,
+    splits=10,
+    max_error_rate=0.01,
+):
+    """
+    Sweeps the concurrency levels, logs the results per level and writes the recommended number of workers
+    :param base_urls: Urls of the ORS instance replicas. Overrides the urls in ORS_INSTANCES.
+    :param levels: Concurrency levels
+    :param n_routes: Number of Google routes sampled
+    :param requests_per_level: Number of requests sent per level
+    :param splits: Number of waypoints per route, as in generate_ors_routes.py
+    :param max_error_rate: Maximum accepted error rate
+    :return: Recommended number of workers
+    """
+    data_dir = Path(data_dir)
+    ors_url = base_urls or ORS_INSTANCES[ors_type]
+    if isinstance(ors_url, (list, tuple)) and len(ors_url) == 1:
+        ors_url = ors_url[0]
+
+    bodies = sample_bodies(
+        data_dir / city / "google_routes" / f"{city}_50_routes_per_hour.geojson",
+        n_routes,
+        splits,
+    )
+    ors_client = ORSRoutingClient(base_url=ors_url)
+
+    # Warm up the connections and caches of the ORS instance
+    run_level(ors_client, bodies, 1, min(len(bodies), 10))
+
+    results = []
+    for concurrency in sorted(levels):
+        result = run_level(
+            ors_client, bodies, concurrency, max(requests_per_level, concurrency)
+        )
+        logger.info(
+            f"Concurrency {concurrency}: {result['requests_per_second']:.1f} requests/s, "
+            f"p50 {result['p50']:.3f}s, p95 {result['p95']:.3f}s, p99 {result['p99']:.3f}s, "
+            f"error rate {result['error_rate']:.1%}"
+        )
+        results.append(result)
+
+    workers = find_knee(results, max_error_rate=max_error_rate)
+    logger.info(f"Recommended number of workers for {ors_type}: {workers}")
+    write_config(data_dir / WORKERS_CONFIG, ors_type, workers, ors_url, results)
+    return workers
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Finds the number of concurrent requests an ORS instance can take"
+    )
+    parser.add_argument(
+        "-t",
+        required=True,
+        dest="ors_type",
+        metavar="ORS type",
+        type=str,
+        help="Type of ORS. Check Readme for more information.",
+    )
+    parser.add_argument(
+        "-c",
+        required=True,
+        dest="city",
+        metavar="City name",
+        type=str,
+        help="City name, whose Google routes are replayed",
+    )
+    parser.add_argument(
+        "-u",
+        required=False,
+        dest="base_urls",
+        metavar="ORS urls",
+        type=str,
+        nargs="+",
+        default=None,
+        help="Urls of one or more replicas of the ORS instance. Overrides the urls in ORS_INSTANCES.",
+    )
+    parser.add_argument(
+        "-l",
+        required=False,
+        dest="levels",
+        metavar="Concurrency levels",
+        type=int,
+        nargs="+",
+        default=[1, 2, 4, 8, 16, 32],
+        help="Concurrency levels, default = 1 2 4 8 16 32",
+    )
+    parser.add_argument(
+        "-n",
+        required=False,
+        dest="n_routes",
+        metavar="Sample size",
+        type=int,
+        default=50,
+        help="Number of Google routes sampled, default = 50",
+    )
+    parser.add_argument(
+        "-r",
+        required=False,
+        dest="requests_per_level",
+        metavar="Requests per level",
+        type=int,
+        default=200,
+        help="Number of requests per concurrency level, default = 200",
+    )
+    parser.add_argument(
+        "-s",
+        required=False,
+        dest="splits",
+        metavar="LineString splits",
+        type=int,
+        default=10,
+        help="Route splits, default = 10",
+    )
+    parser.add_argument(
+        "-e",
+        required=False,
+        dest="max_error_rate",
+        metavar="Max. error rate",
+        type=float,
+        default=0.01,
+        help="Maximum accepted error rate, default = 0.01",
+    )
+    args = parser.parse_args()
+
+    data_dir = "data"
+
+    main(
+        data_dir,
+        ors_type=args.ors_type,
+        city=args.city,
+        base_urls=args.base_urls,
+        levels=args.levels,
+        n_routes=args.n_routes,
+        requests_per_level=args.requests_per_level,
+        splits=args.splits,
+        max_error_rate=args.max_error_rate,
+    )
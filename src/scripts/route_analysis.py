@@ -2,25 +2,128 @@
 # -*- coding: utf-8 -*-
 """Compare and evaluate Google vs ORS routes"""
 import argparse
+import contextlib
 import os
 import sys
 import json
 import logging
 import geopandas as gpd
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 # change to the working directory to the python file location so that the imports work
 sys.path.append(str(Path(__file__).parent.parent.resolve()))
 
+from route_analyst.archive import open_archives
+from route_analyst.cascade import ComparisonCascade
+from route_analyst.io import CHUNKSIZE, iter_google_routes
+from route_analyst.profiling import Profiler, profiler_from_args
+from route_analyst.projection import local_crs_of, project_routes
+from route_analyst.results import write_results
+from route_analyst.warehouse import Warehouse
 from route_analyst.responses import ORSDirectionsResponse
 from route_analyst.routes import GoogleRoute
 
 
-def extract_info(data_dir, out_dir, city):
+def compare_routes(
+    google_route,
+    google_route_obj,
+    ors_route_obj,
+    ors_type,
+    ors_route,
+    crs,
+    profiler=None,
+    coordinates=None,
+    cascade=None,
+    geometry_diff=None,
+):
+    """
+    Calculates the statistics comparing an ORS route to the according Google route. The geometries are compared in
+    a metric CRS, so that the geometry deviation uses a buffer of METRIC_TOLERANCE metres and the Hausdorff distance
+    is in metres in every city.
+    :param google_route: Row of the Google routes GeoDataFrame
+    :param google_route_obj: GoogleRoute
+    :param ors_route_obj: ORSRoute
+    :param ors_type: ORS type
+    :param ors_route: Path of the ORS route file
+    :param crs: Metric CRS of the city, see projection.local_crs
+    :param profiler: Profiler measuring the stages of the comparison
+    :param coordinates: Coordinates of the Google route and the ORS route already projected to crs. Default None,
+    i.e. they are projected here.
+    :param cascade: ComparisonCascade comparing the geometries and counting how they were decided
+    :param geometry_diff: Geometry deviation in percent and Hausdorff distance already computed, e.g. by
+    ComparisonCascade.compare_batch. Default None, i.e. they are computed here.
+    :return: dict
+    """
+    profiler = profiler or Profiler(enabled=False)
+    cascade = cascade or ComparisonCascade()
+    with profiler.stage("duration_distance_diff"):
+        dur_diff_sec = ors_route_obj.duration_diff_sec(google_route_obj)
+        dur_diff_perc = ors_route_obj.duration_diff_perc(google_route_obj)
+        dist_diff_meter = ors_route_obj.distance_diff_meter(google_route_obj)
+        dist_diff_perc = ors_route_obj.distance_diff_perc(google_route_obj)
+    if geometry_diff is None:
+        if coordinates is None:
+            with profiler.stage("project"):
+                coordinates = project_routes(
+                    [google_route_obj.coordinates, ors_route_obj.coordinates], crs
+                )
+        google_xy, ors_xy = coordinates
+        with profiler.stage("geometry_diff"):
+            geometry_diff = cascade.compare(ors_xy, google_xy)
+    geom_diff_perc, geom_diff_hausdorff = geometry_diff
+
+    return {
+        "route_id": google_route.id,
+        "ors_route": str(ors_route),
+        "ors_type": ors_type,
+        "hour": google_route.hour,
+        "google_distance": round(google_route_obj.distance, 2),
+        "ors_distance": round(ors_route_obj.distance, 2),
+        "google_dur_in_traffic_sec": round(google_route_obj.duration_in_traffic, 2),
+        "google_dur_sec": round(google_route_obj.duration, 2),
+        "ors_dur_sec": round(ors_route_obj.duration, 2),
+        "duration_diff_sec": round(dur_diff_sec, 2),
+        "duration_diff_perc": round(dur_diff_perc, 2),
+        "google_dist_meter": round(google_route_obj.distance, 2),
+        "ors_dist_meter": round(ors_route_obj.distance, 2),
+        "distance_diff_meter": round(dist_diff_meter, 2),
+        "distance_diff_perc": round(dist_diff_perc, 2),
+        "geometry_diff_perc": round(geom_diff_perc, 4),
+        "geometry_diff_hausdorff": round(geom_diff_hausdorff, 2),
+        # "geom_ors": ors_route_obj.geometry,
+        "geometry": google_route_obj.geometry,
+    }
+
+
+def extract_info(
+    data_dir,
+    out_dir,
+    city,
+    profiler=None,
+    chunksize=CHUNKSIZE,
+    archive=False,
+    warehouse=None,
+    threshold=None,
+    workers=1,
+):
     """
     Extracts information about route objects and writes to them file
-    :return: a csv and geojson file with all data
+    :param profiler: Profiler measuring the stages of the analysis. If given, the report is written to the output
+    directory.
+    :param chunksize: Number of Google routes read at once
+    :param archive: If True, the geometries and summaries are taken from the coordinate archives written by
+    build_coordinate_archive.py instead of parsing the GeoJSON files
+    :param warehouse: Path of the SQLite warehouse the results are appended to as a new run. Default None, i.e. the
+    results are only written to files.
+    :param threshold: Hausdorff distance in metres above which only a lower bound is stored, e.g. 30 if only the
+    matching routes are of interest. Default None, i.e. all distances are computed.
+    :param workers: Number of processes comparing the geometries. The projected coordinates of each chunk are
+    passed to them in shared memory. Default 1, i.e. they are compared in this process.
+    :return: a csv, geojson and GeoParquet file with all data
     """
+    profiler = profiler or Profiler(enabled=False)
 
     logger = logging.getLogger(__file__)
     logging.basicConfig(level=logging.INFO)
@@ -33,9 +136,16 @@ def extract_info(data_dir, out_dir, city):
     google_routes_file = (
         google_routes_dir / f"{city}_50_routes_per_hour.geojson"
     )  # 50 routes
-    all_google_routes = gpd.read_file(google_routes_file)
-    all_google_routes["hour"] = all_google_routes.id.apply(
-        lambda x: x[1:].split("_")[0]
+    archives = open_archives(data_dir, city) if archive else {}
+    if archive and "google" not in archives:
+        raise ValueError(
+            f"No coordinate archive of the Google routes found for {city}. Run build_coordinate_archive.py first."
+        )
+    google_chunks = profiler.iterate(
+        "read_google_routes",
+        iter_google_routes(
+            google_routes_file, chunksize=chunksize, geometry="google" not in archives
+        ),
     )
 
     ors_type_list = [
@@ -48,74 +158,141 @@ def extract_info(data_dir, out_dir, city):
 
     routes_list_full = []
     routes_id_list = [None]  # create a value to compare to
+    crs = None
+    cascade = ComparisonCascade(threshold=np.inf if threshold is None else threshold)
 
-    for index, google_route in all_google_routes.iterrows():
-        logger.info(f"Processing route number {google_route.id}")
-        # Google Route
-        if google_route.id in routes_id_list:
-            alternative_id += 1
-        else:
-            alternative_id = 0
-            routes_id_list.append(google_route.id)
-        google_route.id = f"{google_route.id}_{alternative_id}"
-        google_route_obj = GoogleRoute(google_route)
-
-        # ORS Route
-        for ors_type in ors_type_list:
-            item = (
-                data_dir
-                / city
-                / f"ors_routes_{ors_type}"
-                / f"route_{ors_type}_{google_route.hour}_{google_route.id}.geojson"
-            )
-            if os.path.isfile(item):
-                with open(item) as f:
-                    data = json.load(f)
-                    ors_route_obj = ORSDirectionsResponse(data).routes[0]
-                    dur_diff_sec = ors_route_obj.duration_diff_sec(google_route)
-                    dur_diff_perc = ors_route_obj.duration_diff_perc(google_route)
-                    dist_diff_meter = ors_route_obj.distance_diff_meter(google_route)
-                    dist_diff_perc = ors_route_obj.distance_diff_perc(google_route)
-                    geom_diff_perc = ors_route_obj.geometry_diff_perc(google_route)
-                    geom_diff_hausdorff = ors_route_obj.geometry_diff_hausdorff(
-                        google_route
+    with (
+        ProcessPoolExecutor(max_workers=workers)
+        if workers > 1
+        else contextlib.nullcontext()
+    ) as executor:
+        for chunk in google_chunks:
+            google_coordinates, pairs = [], []
+            for index, google_route in chunk.iterrows():
+                logger.info(f"Processing route number {google_route.id}")
+                # Google Route
+                if google_route.id in routes_id_list:
+                    alternative_id += 1
+                else:
+                    alternative_id = 0
+                    routes_id_list.append(google_route.id)
+                google_route.id = f"{google_route.id}_{alternative_id}"
+                if "google" in archives:
+                    google_route_obj = archives["google"].google_route(google_route)
+                else:
+                    google_route_obj = GoogleRoute(google_route)
+                google_coordinates.append(google_route_obj.coordinates)
+
+                # ORS Route
+                for ors_type in ors_type_list:
+                    item = (
+                        data_dir
+                        / city
+                        / f"ors_routes_{ors_type}"
+                        / f"route_{ors_type}_{google_route.hour}_{google_route.id}.geojson"
+                    )
+                    if ors_type in archives and google_route.id in archives[ors_type]:
+                        ors_route_obj = archives[ors_type].ors_route(google_route.id)
+                    elif os.path.isfile(item):
+                        with profiler.stage("json_load"), open(item) as f:
+                            data = json.load(f)
+                        with profiler.stage("parse_response"):
+                            ors_route_obj = ORSDirectionsResponse(data).routes[0]
+                    else:
+                        logger.info(f"Route {item} doesn't exist.")
+                        continue
+                    pairs.append(
+                        (
+                            len(google_coordinates) - 1,
+                            (
+                                google_route,
+                                google_route_obj,
+                                ors_route_obj,
+                                ors_type,
+                                item,
+                            ),
+                        )
                     )
+            if not pairs:
+                continue
+
+            # the geometries of all routes of the chunk are projected in one transformation into the CRS of the city,
+            # which is the UTM zone of the first chunk
+            with profiler.stage("project"):
+                ors_coordinates = [pair[2].coordinates for _, pair in pairs]
+                if crs is None:
+                    crs = local_crs_of(google_coordinates)
+                    logger.info(f"Comparing the geometries in {crs}")
+                projected = project_routes(google_coordinates + ors_coordinates, crs)
+                google_projected = projected[: len(google_coordinates)]
+                ors_projected = projected[len(google_coordinates) :]
+
+            if executor is None:
+                for (google_position, pair), ors_xy in zip(pairs, ors_projected):
+                    routes_list_full.append(
+                        compare_routes(
+                            *pair,
+                            crs,
+                            profiler,
+                            coordinates=(google_projected[google_position], ors_xy),
+                            cascade=cascade,
+                        )
+                    )
+                continue
 
+            with profiler.stage("geometry_diff"):
+                geometry_diff = cascade.compare_batch(
+                    ors_projected,
+                    google_projected,
+                    [google_position for google_position, _ in pairs],
+                    executor,
+                )
+            for (_, pair), pair_diff in zip(pairs, geometry_diff):
                 routes_list_full.append(
-                    {
-                        "route_id": google_route.id,
-                        "ors_route": str(item),
-                        "ors_type": ors_type,
-                        "hour": google_route.hour,
-                        "google_distance": round(google_route_obj.distance, 2),
-                        "ors_distance": round(ors_route_obj.distance, 2),
-                        "google_dur_in_traffic_sec": round(
-                            google_route_obj.duration_in_traffic, 2
-                        ),
-                        "google_dur_sec": round(google_route_obj.duration, 2),
-                        "ors_dur_sec": round(ors_route_obj.duration, 2),
-                        "duration_diff_sec": round(dur_diff_sec, 2),
-                        "duration_diff_perc": round(dur_diff_perc, 2),
-                        "google_dist_meter": round(google_route_obj.distance, 2),
-                        "ors_dist_meter": round(ors_route_obj.distance, 2),
-                        "distance_diff_meter": round(dist_diff_meter, 2),
-                        "distance_diff_perc": round(dist_diff_perc, 2),
-                        "geometry_diff_perc": round(geom_diff_perc, 4),
-                        "geometry_diff_hausdorff": round(geom_diff_hausdorff, 5),
-                        # "geom_ors": ors_route_obj.geometry,
-                        "geometry": google_route_obj.geometry,
-                    }
+                    compare_routes(*pair, crs, profiler, geometry_diff=pair_diff)
                 )
-            else:
-                logger.info(f"Route {item} doesn't exist.")
-                continue
+
+    cascade_report = cascade.report()
+    for metric, counts in cascade.counts.items():
+        logger.info(
+            f"{metric} decided by tier: "
+            + ", ".join(f"{tier} {count}" for tier, count in counts.items())
+        )
 
     # export GeoDataFrame with all routes to file
     logger.info("Generating merged Geodataframe...")
-    gdf_full = gpd.GeoDataFrame(routes_list_full)
-    gdf_full.set_geometry(col="geometry", inplace=True)
-    gdf_full.to_file(out_dir / f"{city}_results_full.geojson")
-    gdf_full.to_csv(out_dir / f"{city}_results_full.csv")
+    with profiler.stage("build_geodataframe"):
+        gdf_full = gpd.GeoDataFrame(routes_list_full)
+        gdf_full.set_geometry(col="geometry", crs="EPSG:4326", inplace=True)
+    with profiler.stage("to_file"):
+        gdf_full.to_file(out_dir / f"{city}_results_full.geojson")
+    with profiler.stage("to_csv"):
+        gdf_full.to_csv(out_dir / f"{city}_results_full.csv")
+    with profiler.stage("to_parquet"):
+        write_results(gdf_full, out_dir / f"{city}_results_full.parquet")
+    if warehouse:
+        with profiler.stage("to_warehouse"), Warehouse(warehouse) as db:
+            run_id = db.add_run(
+                city,
+                gdf_full,
+                chunksize=chunksize,
+                archive=archive,
+                out_dir=out_dir,
+                crs=crs,
+                threshold=threshold,
+                workers=workers,
+                cascade=cascade_report,
+            )
+        logger.info(f"Results appended to {warehouse} as run {run_id}")
+
+    profiler.write(
+        out_dir / f"{city}_route_analysis_profile.json",
+        city=city,
+        n_routes=len(routes_list_full),
+        crs=crs,
+        workers=workers,
+        cascade=cascade_report,
+    )
 
     return len(routes_list_full)  # for testing
 
@@ -132,9 +309,74 @@ if __name__ == "__main__":
         type=str,
         help="City name. Check Readme for more information.",
     )
+    parser.add_argument(
+        "-p",
+        required=False,
+        dest="profile",
+        metavar="Profiling options",
+        nargs="*",
+        choices=["cprofile", "memory"],
+        default=None,
+        help="Write a profile report with the time of each stage. Optionally capture a cProfile "
+        "and/or the peak memory per stage, e.g. -p cprofile memory",
+    )
+    parser.add_argument(
+        "-b",
+        required=False,
+        dest="chunksize",
+        metavar="Chunk size",
+        type=int,
+        default=CHUNKSIZE,
+        help=f"Number of Google routes read at once, default = {CHUNKSIZE}",
+    )
+    parser.add_argument(
+        "-a",
+        required=False,
+        dest="archive",
+        action="store_true",
+        help="Take the geometries from the coordinate archives written by build_coordinate_archive.py",
+    )
+    parser.add_argument(
+        "-d",
+        required=False,
+        dest="warehouse",
+        metavar="Warehouse",
+        type=str,
+        default="data/results.sqlite",
+        help="SQLite database the results are appended to, default = data/results.sqlite. "
+        "Pass an empty string to skip it.",
+    )
+    parser.add_argument(
+        "-T",
+        required=False,
+        dest="threshold",
+        metavar="Hausdorff threshold",
+        type=float,
+        default=None,
+        help="Hausdorff distance in metres above which only a lower bound is stored, e.g. 30. Default: none",
+    )
+    parser.add_argument(
+        "-w",
+        required=False,
+        dest="workers",
+        metavar="Workers",
+        type=int,
+        default=1,
+        help="Number of processes comparing the geometries, default = 1",
+    )
     args = parser.parse_args()
 
     data_dir = "data"
     out_dir = "export"
 
-    extract_info(data_dir=data_dir, out_dir=out_dir, city=args.city)
+    extract_info(
+        data_dir=data_dir,
+        out_dir=out_dir,
+        city=args.city,
+        profiler=profiler_from_args(args.profile, name="route_analysis"),
+        chunksize=args.chunksize,
+        archive=args.archive,
+        warehouse=args.warehouse,
+        threshold=args.threshold,
+        workers=args.workers,
+    )
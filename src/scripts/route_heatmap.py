@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Aggregate the route comparisons of a city in square or hexagonal grid cells (error heatmaps)"""
+
+from pathlib import Path
+import argparse
+import json
+import logging
+import sys
+
+import numpy as np
+import shapely
+
+# change to the working directory to the python file location so that the imports work
+sys.path.append(str(Path(__file__).parent.parent.resolve()))
+
+from route_analyst.archive import open_archives
+from route_analyst.heatmap import CELL_SIZE, GRIDS, HeatmapAccumulator, write_heatmap
+from route_analyst.io import CHUNKSIZE
+from route_analyst.projection import local_crs, project_routes
+from route_analyst.results import read_results
+
+logger = logging.getLogger(__file__)
+logging.basicConfig(level=logging.INFO)
+
+
+def ors_coordinates(archives, ors_type, route_id, ors_route):
+    """
+    Returns the coordinates of an ORS route from its archive or, if it isn't archived, from its file
+    :param archives: Archives returned by open_archives
+    :param ors_route: Path of the ORS route file
+    :return: Array of shape (n, 2) with longitudes and latitudes
+    """
+    if ors_type in archives and route_id in archives[ors_type]:
+        return archives[ors_type].coordinates(route_id)
+    with open(ors_route) as src:
+        return np.asarray(json.load(src)["features"][0]["geometry"]["coordinates"])
+
+
+def main(
+    data_dir,
+    city,
+    cell_size=CELL_SIZE,
+    grid="square",
+    metric="duration_diff_perc",
+    archive=False,
+    chunksize=CHUNKSIZE,
+):
+    """
+    Rasterizes the Google and ORS routes compared by route_analysis.py into grid cells and writes the counts,
+    disagreement share and mean metric per ORS type, hour and cell to
+    data/CITY/export/CITY_heatmap_GRID_SIZEm.parquet
+    :param cell_size: Cell size in metres
+    :param grid: 'square' or 'hex'
+    :param metric: Result column averaged per cell
+    :param archive: If True, the ORS coordinates are taken from the coordinate archives written by
+    build_coordinate_archive.py instead of parsing the GeoJSON files
+    :param chunksize: Number of Google routes rasterized at once
+    :return: Path of the heatmap
+    """
+    out_dir = Path(data_dir) / city / "export"
+    results = read_results(
+        out_dir / f"{city}_results_full.parquet",
+        columns=["route_id", "ors_route", "ors_type", "hour", metric, "geometry"],
+    )
+    archives = open_archives(data_dir, city) if archive else {}
+    minx, miny, maxx, maxy = results.total_bounds
+    crs = local_crs((minx + maxx) / 2, (miny + maxy) / 2)
+    logger.info(f"Rasterizing {len(results)} route pairs in {crs}")
+
+    heatmap = HeatmapAccumulator(cell_size=cell_size, grid=grid, metric=metric)
+    route_ids = results["route_id"].unique()
+    for start in range(0, len(route_ids), chunksize):
+        pairs = results.loc[
+            results["route_id"].isin(route_ids[start : start + chunksize])
+        ]
+        google = pairs.drop_duplicates("route_id")
+        routes = [shapely.get_coordinates(geometry) for geometry in google.geometry]
+        routes += [
+            ors_coordinates(archives, *pair)
+            for pair in zip(pairs.ors_type, pairs.route_id, pairs.ors_route)
+        ]
+        projected = project_routes(routes, crs)
+        heatmap.add(
+            pairs,
+            dict(zip(google.route_id, projected[: len(google)])),
+            projected[len(google) :],
+        )
+        logger.info(f"Rasterized {min(start + chunksize, len(route_ids))} routes")
+
+    result = heatmap.result(crs=crs)
+    path = out_dir / f"{city}_heatmap_{grid}_{cell_size:g}m.parquet"
+    write_heatmap(result, path)
+    logger.info(f"Wrote {len(result)} cells to {path}")
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Aggregates the route comparisons of a city in grid cells"
+    )
+    parser.add_argument(
+        "-c",
+        required=True,
+        dest="city",
+        metavar="City name",
+        type=str,
+        help="City name. Check Readme for more information.",
+    )
+    parser.add_argument(
+        "-g",
+        required=False,
+        dest="grid",
+        metavar="Grid",
+        choices=GRIDS,
+        default="square",
+        help="Cell shape, 'square' or 'hex', default = square",
+    )
+    parser.add_argument(
+        "-s",
+        required=False,
+        dest="cell_size",
+        metavar="Cell size",
+        type=float,
+        default=CELL_SIZE,
+        help=f"Edge length of square cells or distance between hexagon centres in metres, default = {CELL_SIZE:g}",
+    )
+    parser.add_argument(
+        "-M",
+        required=False,
+        dest="metric",
+        metavar="Metric",
+        type=str,
+        default="duration_diff_perc",
+        help="Result column averaged per cell, default = duration_diff_perc",
+    )
+    parser.add_argument(
+        "-a",
+        required=False,
+        dest="archive",
+        action="store_true",
+        help="Take the ORS geometries from the coordinate archives written by build_coordinate_archive.py",
+    )
+    parser.add_argument(
+        "-b",
+        required=False,
+        dest="chunksize",
+        metavar="Chunk size",
+        type=int,
+        default=CHUNKSIZE,
+        help=f"Number of Google routes rasterized at once, default = {CHUNKSIZE}",
+    )
+    args = parser.parse_args()
+
+    main(
+        data_dir="data",
+        city=args.city,
+        cell_size=args.cell_size,
+        grid=args.grid,
+        metric=args.metric,
+        archive=args.archive,
+        chunksize=args.chunksize,
+    )
@@ -0,0 +1,435 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""Benchmarks of the route_analyst hot paths using seeded synthetic routes"""
+
+from pathlib import Path
+from datetime import datetime
+import argparse
+import json
+import logging
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+# change to the working directory to the python file location so that the imports work
+sys.path.append(str(Path(__file__).parent.parent.resolve()))
+
+from route_analyst import synthetic
+from route_analyst.responses import ORSDirectionsResponse
+from route_analyst.routes import GoogleRoute
+from route_analyst.similarity import batch_similarity
+from route_analyst.routingpy.utils import decode_polyline5
+import route_analysis
+
+logger = logging.getLogger(__file__)
+logging.basicConfig(level=logging.INFO)
+
+
+class Benchmark(object):
+    """A benchmark with a setup creating the fixtures for n routes, which is not measured, and a measured run"""
+
+    def __init__(self, name, setup, run):
+        """
+        :param name: Name of the benchmark
+        :param setup: Function (rng, n_routes, n_points, tmp_dir) returning the fixtures
+        :param run: Function (fixtures) running the benchmarked code
+        """
+        self.name = name
+        self.setup = setup
+        self.run = run
+
+
+def _setup_polylines(rng, n_routes, n_points, tmp_dir):
+    return [
+        step["polyline"]["points"]
+        for _ in range(n_routes)
+        for step in synthetic.google_response(rng, n_points)["routes"][0]["legs"][0][
+            "steps"
+        ]
+    ]
+
+
+def _run_decode_polyline(polylines):
+    for polyline in polylines:
+        decode_polyline5(polyline)
+
+
+def _setup_ors_responses(rng, n_routes, n_points, tmp_dir):
+    return [synthetic.ors_response(rng, n_points) for _ in range(n_routes)]
+
+
+def _run_ors_response(responses):
+    for response in responses:
+        ORSDirectionsResponse(response).routes[0].geometry
+
+
+def _setup_ors_routes(rng, n_routes, n_points, tmp_dir):
+    return [
+        ORSDirectionsResponse(response).routes[0]
+        for response in _setup_ors_responses(rng, n_routes, n_points, tmp_dir)
+    ]
+
+
+def _run_ors_values(routes):
+    for route in routes:
+        for criterion in route.extras:
+            route.values(criterion)
+
+
+def _run_ors_as_dataframe(routes):
+    for route in routes:
+        # as_dataframe caches the result on the instance
+        route._ORSRoute__dataframe = None
+        route.as_dataframe()
+
+
+def _setup_route_pairs(rng, n_routes, n_points, tmp_dir):
+    pairs = []
+    routes = synthetic.google_routes(rng, n_routes, n_points=n_points)
+    for _, google_route in routes.iterrows():
+        coordinates = synthetic.perturb(rng, np.asarray(google_route.geometry.coords))
+        ors_route = ORSDirectionsResponse(
+            synthetic.ors_response(rng, coordinates=coordinates)
+        ).routes[0]
+        pairs.append((ors_route, GoogleRoute(google_route)))
+    return pairs
+
+
+def _run_geometry_diff(pairs):
+    for ors_route, google_route in pairs:
+        ors_route.geometry_diff_perc(google_route)
+        ors_route.geometry_diff_hausdorff(google_route)
+
+
+def _run_similarity(pairs):
+    batch_similarity(
+        [ors_route.coordinates for ors_route, _ in pairs],
+        [google_route.coordinates for _, google_route in pairs],
+    )
+
+
+def _setup_extract_info(rng, n_routes, n_points, tmp_dir):
+    seed = int(rng.integers(2**31))
+    synthetic.write_city(tmp_dir, "synthetic", n_routes, n_points=n_points, seed=seed)
+    return tmp_dir
+
+
+def _run_extract_info(data_dir):
+    route_analysis.extract_info(data_dir=data_dir, out_dir="export", city="synthetic")
+
+
+BENCHMARKS = {
+    b.name: b
+    for b in [
+        Benchmark("decode_polyline", _setup_polylines, _run_decode_polyline),
+        Benchmark("ors_response", _setup_ors_responses, _run_ors_response),
+        Benchmark("ors_values", _setup_ors_routes, _run_ors_values),
+        Benchmark("ors_as_dataframe", _setup_ors_routes, _run_ors_as_dataframe),
+        Benchmark("geometry_diff", _setup_route_pairs, _run_geometry_diff),
+        Benchmark("similarity", _setup_route_pairs, _run_similarity),
+        Benchmark("extract_info", _setup_extract_info, _run_extract_info),
+    ]
+}
+
+
+#: Modules that must not be loaded by the imports, since route_analyst loads them lazily on first use
+LAZY_MODULES = ("matplotlib", "geopandas")
+
+#: Imports of which the time is measured in a fresh interpreter
+IMPORTS = {
+    "route_analyst": "import route_analyst",
+    "clients": "from route_analyst import ORSRoutingClient, GoogleRoutingClient",
+    "routes": "from route_analyst import ORSRoute, GoogleRoute",
+    "responses": "from route_analyst import ORSDirectionsResponse",
+}
+
+
+def import_time(statement, repeat=5):
+    """
+    Measures the time of an import statement in fresh interpreters and the heavy modules it loads
+    :param statement: Import statement
+    :param repeat: Number of interpreters, the minimum time is reported
+    :return: dict with the time in seconds and the loaded LAZY_MODULES
+    """
+    code = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        f"{statement}\n"
+        "seconds = time.perf_counter() - start\n"
+        f"print(json.dumps([seconds, [m for m in {LAZY_MODULES!r} if m in sys.modules]]))"
+    )
+    times = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=Path(__file__).parent.parent,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        seconds, loaded = json.loads(output)
+        times.append(seconds)
+    return {"import": statement, "time": min(times), "loaded": loaded}
+
+
+def check_imports(max_time=None):
+    """
+    Measures the import times and checks that the imports don't load any of the LAZY_MODULES
+    :param max_time: Maximum import time in seconds. If None, only the loaded modules are checked.
+    :return: tuple of the results and a list of the violations
+    """
+    results, violations = [], []
+    for name, statement in IMPORTS.items():
+        result = import_time(statement)
+        logger.info(f"import {name}: {result['time'] * 1000:.1f}ms")
+        if result["loaded"]:
+            violations.append(f"'{statement}' loads {', '.join(result['loaded'])}")
+        if max_time is not None and result["time"] > max_time:
+            violations.append(
+                f"'{statement}' takes {result['time']:.3f}s, more than {max_time}s"
+            )
+        results.append(result)
+    return results, violations
+
+
+def git_commit():
+    """
+    Returns the current commit hash and whether the working tree has uncommitted changes
+    :return: tuple of str and bool
+    """
+    cwd = Path(__file__).parent
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=cwd, capture_output=True, text=True
+        ).stdout.strip()
+        dirty = bool(
+            subprocess.run(
+                ["git", "status", "--porcelain", "--untracked-files=no"],
+                cwd=cwd,
+                capture_output=True,
+                text=True,
+            ).stdout.strip()
+        )
+    except OSError:
+        return None, None
+    return commit or None, dirty
+
+
+def run_benchmark(benchmark, n_routes, n_points, seed, memory):
+    """
+    Runs a benchmark for n routes. The time is measured in a first run, the peak memory allocated by Python
+    (tracemalloc) in a second run with fresh fixtures, since tracing slows down the code.
+    :return: dict with time, throughput and peak memory
+    """
+    result = {"benchmark": benchmark.name, "n_routes": n_routes, "n_points": n_points}
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        fixtures = benchmark.setup(
+            np.random.default_rng(seed), n_routes, n_points, tmp_dir
+        )
+        start = time.perf_counter()
+        benchmark.run(fixtures)
+        result["time"] = time.perf_counter() - start
+    result["routes_per_second"] = n_routes / result["time"]
+
+    if memory:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            fixtures = benchmark.setup(
+                np.random.default_rng(seed), n_routes, n_points, tmp_dir
+            )
+            tracemalloc.start()
+            benchmark.run(fixtures)
+            result["peak_memory_bytes"] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+    return result
+
+
+def compare(results, baseline_file):
+    """
+    Logs the change in time of each benchmark compared to a previous results file
+    :param results: list of benchmark results
+    :param baseline_file: Path to a results file written by this script
+    """
+    with open(baseline_file) as src:
+        baseline = json.load(src)
+    previous = {(r["benchmark"], r["n_routes"]): r for r in baseline["results"]}
+    for result in results:
+        other = previous.get((result["benchmark"], result["n_routes"]))
+        if other is None:
+            continue
+        logger.info(
+            f"{result['benchmark']} [{result['n_routes']}]: {result['time']:.3f}s vs "
+            f"{other['time']:.3f}s ({result['time'] / other['time'] - 1:+.1%}) "
+            f"compared to {(baseline.get('commit') or '')[:8]}"
+        )
+
+
+def main(
+    benchmarks,
+    sizes,
+    n_points,
+    seed,
+    out_dir,
+    memory=True,
+    baseline=None,
+    max_import_time=None,
+):
+    """
+    Checks the imports, runs the benchmarks for all sizes and writes the results
+    :param benchmarks: Names of the benchmarks to run
+    :param sizes: Numbers of routes
+    :param n_points: Number of coordinates per route
+    :param seed: Seed of the synthetic routes
+    :param out_dir: Directory the results are written to
+    :param memory: If True, the peak memory is measured in an additional run
+    :param baseline: Results file of a previous run to compare to
+    :param max_import_time: Maximum import time in seconds, see check_imports
+    :return: Path of the results file
+    """
+    imports, violations = check_imports(max_import_time)
+    for violation in violations:
+        logger.error(violation)
+    if violations:
+        raise SystemExit("Import check failed.")
+
+    # extract_info logs every route
+    logging.getLogger(route_analysis.__file__).setLevel(logging.WARNING)
+
+    commit, dirty = git_commit()
+    results = []
+    for name in benchmarks:
+        for n_routes in sizes:
+            result = run_benchmark(BENCHMARKS[name], n_routes, n_points, seed, memory)
+            logger.info(
+                f"{name} [{n_routes}]: {result['time']:.3f}s, "
+                f"{result['routes_per_second']:.1f} routes/s"
+                + (
+                    f", peak memory {result['peak_memory_bytes'] / 2**20:.1f} MiB"
+                    if memory
+                    else ""
+                )
+            )
+            results.append(result)
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    started = datetime.now()
+    outfile = out_dir / f"{started:%Y%m%dT%H%M%S}_{(commit or 'unknown')[:8]}.json"
+    with open(outfile, "w") as dst:
+        json.dump(
+            {
+                "commit": commit,
+                "dirty": dirty,
+                "date": started.isoformat(),
+                "python": sys.version.split()[0],
+                "platform": platform.platform(),
+                "seed": seed,
+                "n_points": n_points,
+                "imports": imports,
+                "results": results,
+            },
+            dst,
+            indent=2,
+        )
+    logger.info(f"Results written to {outfile}")
+
+    if baseline:
+        compare(results, baseline)
+    return outfile
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmarks route_analyst hot paths with synthetic routes"
+    )
+    parser.add_argument(
+        "-b",
+        required=False,
+        dest="benchmarks",
+        metavar="Benchmarks",
+        type=str,
+        nargs="*",
+        choices=list(BENCHMARKS),
+        default=list(BENCHMARKS),
+        help=f"Benchmarks to run, default: all ({', '.join(BENCHMARKS)})",
+    )
+    parser.add_argument(
+        "-n",
+        required=False,
+        dest="sizes",
+        metavar="Number of routes",
+        type=int,
+        nargs="+",
+        default=[1000, 10000, 100000],
+        help="Numbers of routes, default = 1000 10000 100000",
+    )
+    parser.add_argument(
+        "-p",
+        required=False,
+        dest="n_points",
+        metavar="Points per route",
+        type=int,
+        default=200,
+        help="Number of coordinates per route, default = 200",
+    )
+    parser.add_argument(
+        "-s",
+        required=False,
+        dest="seed",
+        metavar="Seed",
+        type=int,
+        default=0,
+        help="Seed of the synthetic routes, default = 0",
+    )
+    parser.add_argument(
+        "-o",
+        required=False,
+        dest="out_dir",
+        metavar="Output directory",
+        type=str,
+        default="data/benchmarks",
+        help="Directory the results are written to, default = data/benchmarks",
+    )
+    parser.add_argument(
+        "-m",
+        required=False,
+        dest="memory",
+        action="store_false",
+        help="Skip the additional run measuring the peak memory",
+    )
+    parser.add_argument(
+        "-r",
+        required=False,
+        dest="baseline",
+        metavar="Baseline results",
+        type=str,
+        default=None,
+        help="Results file of a previous run to compare to",
+    )
+    parser.add_argument(
+        "-i",
+        required=False,
+        dest="max_import_time",
+        metavar="Max. import time",
+        type=float,
+        default=None,
+        help="Fails if an import of route_analyst takes longer (seconds). Use -b with no benchmarks "
+        "to only check the imports.",
+    )
+    args = parser.parse_args()
+
+    main(
+        benchmarks=args.benchmarks,
+        sizes=args.sizes,
+        n_points=args.n_points,
+        seed=args.seed,
+        out_dir=args.out_dir,
+        memory=args.memory,
+        baseline=args.baseline,
+        max_import_time=args.max_import_time,
+    )
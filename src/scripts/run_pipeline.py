@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""Run the route generation and analysis of several cities incrementally"""
+
+from pathlib import Path
+import argparse
+import logging
+import sys
+
+# change to the working directory to the python file location so that the imports work
+sys.path.append(str(Path(__file__).parent.parent.resolve()))
+
+from route_analyst.pipeline import FAILED, UPSTREAM_FAILED, Pipeline, Stage
+from generate_ors_routes import ORS_INSTANCES
+
+logger = logging.getLogger(__file__)
+logging.basicConfig(level=logging.INFO)
+
+root_dir = Path(__file__).parent.parent.parent.resolve()
+scripts_dir = Path(__file__).parent.resolve()
+
+
+def city_stages(data_dir, city, ors_types, n_routes=50, splits=10):
+    """
+    Creates the stages of a city: Google routes -> ORS routes per ORS type -> route analysis
+    :param data_dir: Data directory
+    :param city: City name, the AOI is read from data/CITY/CITY.geojson
+    :param ors_types: ORS types whose routes are generated
+    :param n_routes: Number of Google routes per hour
+    :param splits: Number of waypoints of the ORS requests
+    :return: list of Stage
+    """
+    city_dir = Path(data_dir) / city
+    google_routes_file = (
+        city_dir / "google_routes" / f"{city}_50_routes_per_hour.geojson"
+    )
+    export_dir = city_dir / "export"
+    stages = [
+        Stage(
+            f"google_routes[{city}]",
+            [
+                sys.executable,
+                scripts_dir / "generate_google_routes.py",
+                "-a",
+                city_dir / f"{city}.geojson",
+                "-r",
+                n_routes,
+                "-o",
+                google_routes_file,
+            ],
+            inputs=[city_dir / f"{city}.geojson"],
+            outputs=[google_routes_file],
+            params={"n_routes": n_routes},
+            partition={"city": city},
+        )
+    ]
+    for ors_type in ors_types:
+        # the configuration of the ORS instance, e.g. the docker-compose.yml and the traffic speed data
+        ors_config = root_dir / "ors" / ors_type
+        stages.append(
+            Stage(
+                f"ors_routes[{city}/{ors_type}]",
+                [
+                    sys.executable,
+                    scripts_dir / "generate_ors_routes.py",
+                    "-c",
+                    city,
+                    "-t",
+                    ors_type,
+                    "-s",
+                    splits,
+                ],
+                inputs=[
+                    google_routes_file,
+                    scripts_dir / "generate_ors_routes.py",
+                    *([ors_config] if ors_config.exists() else []),
+                ],
+                outputs=[city_dir / f"ors_routes_{ors_type}"],
+                params={"ors_url": ORS_INSTANCES[ors_type], "splits": splits},
+                partition={"city": city, "ors_type": ors_type},
+            )
+        )
+    stages.append(
+        Stage(
+            f"analysis[{city}]",
+            [sys.executable, scripts_dir / "route_analysis.py", "-c", city],
+            inputs=[
+                google_routes_file,
+                *(city_dir / f"ors_routes_{ors_type}" for ors_type in ORS_INSTANCES),
+                scripts_dir / "route_analysis.py",
+                # the package imported by route_analysis.py
+                root_dir / "src" / "route_analyst",
+            ],
+            outputs=[
+                export_dir / f"{city}_results_full.geojson",
+                export_dir / f"{city}_results_full.csv",
+                export_dir / f"{city}_results_full.parquet",
+            ],
+            partition={"city": city},
+        )
+    )
+    return stages
+
+
+def main(
+    data_dir,
+    cities,
+    ors_types,
+    stages=None,
+    n_routes=50,
+    splits=10,
+    workers=1,
+    force=(),
+    dry_run=False,
+):
+    """
+    Runs the stages of the cities and ORS types which are out of date
+    :param stages: Kinds of stages to run, e.g. ['analysis']. Stages they depend on are run if they are out of date.
+    Default None, i.e. all
+    :param workers: Number of stages run at the same time
+    :param force: Names or kinds of stages which are run even if they are up to date
+    :param dry_run: If True, only logs which stages would run
+    :return: dict with the status of each stage
+    """
+    data_dir = root_dir / data_dir
+    pipeline = Pipeline(
+        [
+            stage
+            for city in cities
+            for stage in city_stages(data_dir, city, ors_types, n_routes, splits)
+        ],
+        state_file=data_dir / ".pipeline_state.json",
+        cwd=root_dir,
+        workers=workers,
+    )
+    names = pipeline.select(kinds=stages, city=cities, ors_type=ors_types)
+    status = pipeline.run(names, force=force, dry_run=dry_run)
+    if any(s in (FAILED, UPSTREAM_FAILED) for s in status.values()):
+        raise SystemExit(1)
+    return status
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Runs the stages of the route analysis whose inputs changed"
+    )
+    parser.add_argument(
+        "-c",
+        required=True,
+        dest="cities",
+        metavar="City names",
+        type=str,
+        nargs="+",
+        help="City names. Check Readme for more information.",
+    )
+    parser.add_argument(
+        "-t",
+        required=False,
+        dest="ors_types",
+        metavar="ORS types",
+        type=str,
+        nargs="+",
+        choices=list(ORS_INSTANCES),
+        default=list(ORS_INSTANCES),
+        help="ORS types, default: all",
+    )
+    parser.add_argument(
+        "-S",
+        required=False,
+        dest="stages",
+        metavar="Stages",
+        type=str,
+        nargs="+",
+        choices=["google_routes", "ors_routes", "analysis"],
+        default=None,
+        help="Stages to run (google_routes, ors_routes, analysis) together with the stages they depend on, "
+        "default: all",
+    )
+    parser.add_argument(
+        "-r",
+        required=False,
+        dest="n_routes",
+        metavar="Routes per hour",
+        type=int,
+        default=50,
+        help="Number of Google routes per hour, default = 50",
+    )
+    parser.add_argument(
+        "-s",
+        required=False,
+        dest="splits",
+        metavar="LineString splits",
+        type=int,
+        default=10,
+        help="Route splits, default = 10",
+    )
+    parser.add_argument(
+        "-w",
+        required=False,
+        dest="workers",
+        metavar="Workers",
+        type=int,
+        default=1,
+        help="Number of independent stages run at the same time, default = 1",
+    )
+    parser.add_argument(
+        "-f",
+        required=False,
+        dest="force",
+        metavar="Forced stages",
+        type=str,
+        nargs="+",
+        default=[],
+        help="Names (e.g. 'analysis[berlin]') or kinds (e.g. analysis) of stages to run even if they are up to date",
+    )
+    parser.add_argument(
+        "-n",
+        required=False,
+        dest="dry_run",
+        action="store_true",
+        help="Only log which stages would run",
+    )
+    args = parser.parse_args()
+
+    data_dir = "data"
+
+    main(
+        data_dir,
+        cities=args.cities,
+        ors_types=args.ors_types,
+        stages=args.stages,
+        n_routes=args.n_routes,
+        splits=args.splits,
+        workers=args.workers,
+        force=args.force,
+        dry_run=args.dry_run,
+    )
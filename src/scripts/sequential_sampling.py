@@ -0,0 +1,396 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""Generate Google and ORS routes in batches until the estimates of the route analysis converge"""
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import argparse
+import json
+import logging
+import os
+import sys
+
+import geopandas as gpd
+import pandas as pd
+
+# change to the working directory to the python file location so that the imports work
+sys.path.append(str(Path(__file__).parent.parent.resolve()))
+
+from route_analyst import ORSRoutingClient, routingpy
+from route_analyst.profiling import Profiler, profiler_from_args
+from route_analyst.projection import local_crs
+from route_analyst.responses import ORSDirectionsResponse
+from route_analyst.results import write_results
+from route_analyst.routes import GoogleRoute
+from route_analyst.stats import bootstrap_ci
+from generate_google_routes import (
+    DEPARTURE_TIMES,
+    GOOGLE_BASE_URL,
+    sample_google_routes,
+)
+from generate_ors_routes import ORS_INSTANCES, replay_route
+from route_analysis import compare_routes
+
+logger = logging.getLogger(__file__)
+logging.basicConfig(level=logging.INFO)
+
+
+def replay_and_compare(ors_client, google_route, ors_type, splits, ors_routes_dir, crs):
+    """
+    Generates the ORS route of a Google route and compares them
+    :param crs: Metric CRS the geometries are compared in
+    :return: dict with the statistics of route_analysis.py
+    """
+    outfile = replay_route(ors_client, google_route, ors_type, splits, ors_routes_dir)
+    with open(outfile) as src:
+        ors_route_obj = ORSDirectionsResponse(json.load(src)).routes[0]
+    return compare_routes(
+        google_route, GoogleRoute(google_route), ors_route_obj, ors_type, outfile, crs
+    )
+
+
+def interval_widths(
+    results, metric, stratum, statistic="mean", confidence=0.95, n_resamples=1000
+):
+    """
+    Computes the bootstrap confidence interval of a statistic of the metric per stratum and ORS type
+    :param stratum: 'hour' for an interval per hour and ORS type or 'all' for an interval per ORS type
+    :return: DataFrame with the statistic, the bounds and the width of the intervals
+    """
+    by = ["hour", "ors_type"] if stratum == "hour" else ["ors_type"]
+    # the samples of a round are small, so the resampling runs in this process
+    intervals = bootstrap_ci(
+        results,
+        metric,
+        by=by,
+        statistic=statistic,
+        n_resamples=n_resamples,
+        confidence=confidence,
+        workers=1,
+    )
+    intervals["width"] = intervals["upper"] - intervals["lower"]
+    return intervals
+
+
+def converged_hours(intervals, hours, ors_types, stratum, max_width, min_routes):
+    """
+    Returns the hours whose intervals of all ORS types are at most max_width wide and based on at least min_routes
+    routes. With stratum 'all' either all or none of the hours are returned.
+    :return: set of hours
+    """
+    done = (intervals["width"] <= max_width) & (intervals["n"] >= min_routes)
+    if stratum == "all":
+        converged = all(done.get(ors_type, False) for ors_type in ors_types)
+        return set(hours) if converged else set()
+    return {
+        hour
+        for hour in hours
+        if all(done.get((hour, ors_type), False) for ors_type in ors_types)
+    }
+
+
+def main(
+    data_dir,
+    city,
+    ors_types,
+    metric="duration_diff_perc",
+    max_width=5.0,
+    stratum="hour",
+    statistic="mean",
+    confidence=0.95,
+    batch_size=10,
+    min_routes=20,
+    max_routes=50,
+    splits=10,
+    workers=4,
+    base_url=GOOGLE_BASE_URL,
+    profiler=None,
+):
+    """
+    Generates Google routes of each hour in batches, replays them with ORS and compares them right away. Sampling of
+    an hour (stratum 'hour') or of all hours (stratum 'all') stops as soon as the confidence interval of the
+    statistic of the metric is at most max_width wide for every ORS type, or when max_routes are reached.
+    :param metric: Result column of route_analysis.py whose estimate has to converge
+    :param max_width: Maximum width of the confidence interval, in the unit of the metric
+    :param stratum: 'hour' to stop each hour on its own or 'all' to stop all hours together
+    :param statistic: 'mean', 'mae', 'rmse' or 'median' of the metric
+    :param confidence: Confidence level of the interval
+    :param batch_size: Number of Google routes per hour and round
+    :param min_routes: Minimum number of routes per hour ('hour') or in total ('all') before sampling can stop
+    :param max_routes: Maximum number of Google routes per hour
+    :param splits: Number of waypoints of the ORS requests
+    :param workers: Number of concurrent ORS requests
+    :param base_url: Base url of the Google Directions API
+    :param profiler: Profiler measuring the stages. If given, the report is written to the export directory.
+    :return: DataFrame with the results of the routes
+    """
+    profiler = profiler or Profiler(enabled=False)
+    city_dir = Path(data_dir) / city
+    google_routes_file = (
+        city_dir / "google_routes" / f"{city}_50_routes_per_hour.geojson"
+    )
+    if google_routes_file.exists():
+        raise FileExistsError(
+            f"{google_routes_file} exists. Move it away to sample the routes of {city} again."
+        )
+    google_routes_file.parent.mkdir(parents=True, exist_ok=True)
+    out_dir = city_dir / "export"
+    out_dir.mkdir(exist_ok=True)
+
+    with profiler.stage("read_aoi"):
+        aoi = gpd.read_file(city_dir / f"{city}.geojson").geometry.unary_union
+    crs = local_crs(*aoi.centroid.coords[0])
+    google_client = routingpy.routers.Google(api_key=os.getenv("GOOGLE_API_KEY"))
+    ors_clients = {t: ORSRoutingClient(base_url=ORS_INSTANCES[t]) for t in ors_types}
+    ors_routes_dirs = {t: city_dir / f"ors_routes_{t}" for t in ors_types}
+    for directory in ors_routes_dirs.values():
+        directory.mkdir(exist_ok=True)
+
+    departure_times = {f"{t:%H}": t for t in DEPARTURE_TIMES}
+    counts = {hour: 0 for hour in departure_times}
+    active = set(departure_times)
+    google_routes, results, rounds = [], [], []
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while active:
+            futures = []
+            for hour in sorted(active):
+                n_routes = min(batch_size, max_routes - counts[hour])
+                batch = sample_google_routes(
+                    google_client,
+                    aoi,
+                    departure_times[hour],
+                    n_routes,
+                    start=counts[hour],
+                    profiler=profiler,
+                    base_url=base_url,
+                )
+                counts[hour] += n_routes
+                google_routes.extend(batch)
+                for routes in batch:
+                    for alternative_id, (_, google_route) in enumerate(
+                        routes.iterrows()
+                    ):
+                        google_route.id = f"{google_route.id}_{alternative_id}"
+                        google_route["hour"] = hour
+                        google_route.departure_time = departure_times[hour]
+                        futures.extend(
+                            executor.submit(
+                                replay_and_compare,
+                                ors_clients[ors_type],
+                                google_route,
+                                ors_type,
+                                splits,
+                                ors_routes_dirs[ors_type],
+                                crs,
+                            )
+                            for ors_type in ors_types
+                        )
+
+            with profiler.stage("replay_and_compare"):
+                for future in futures:
+                    try:
+                        results.append(future.result())
+                    except Exception as e:
+                        logger.warning(f"Could not process route: {e}")
+
+            # write the Google routes after each round, so that no paid request is lost
+            with profiler.stage("to_file"):
+                gpd.GeoDataFrame(pd.concat(google_routes, axis=0)).to_file(
+                    google_routes_file, driver="GeoJSON"
+                )
+
+            with profiler.stage("bootstrap"):
+                intervals = interval_widths(
+                    pd.DataFrame(results), metric, stratum, statistic, confidence
+                )
+            converged = converged_hours(
+                intervals, active, ors_types, stratum, max_width, min_routes
+            )
+            capped = {hour for hour in active if counts[hour] >= max_routes}
+            active -= converged | capped
+            rounds.append(
+                {
+                    "routes": sum(counts.values()),
+                    "converged": sorted(converged),
+                    "capped": sorted(capped - converged),
+                    "max_width": float(intervals["width"].max()),
+                }
+            )
+            logger.info(
+                f"Round {len(rounds)}: {sum(counts.values())} Google routes, max. interval width "
+                f"{intervals['width'].max():.2f}, {len(active)} hours left"
+            )
+
+    results = gpd.GeoDataFrame(results, geometry="geometry", crs="EPSG:4326")
+    with profiler.stage("to_parquet"):
+        write_results(results, out_dir / f"{city}_sampling_results.parquet")
+    report = {
+        "metric": metric,
+        "statistic": statistic,
+        "confidence": confidence,
+        "max_width": max_width,
+        "stratum": stratum,
+        "crs": crs,
+        "routes_per_hour": counts,
+        "google_requests_saved": len(counts) * max_routes - sum(counts.values()),
+        "rounds": rounds,
+        "intervals": json.loads(intervals.reset_index().to_json(orient="records")),
+    }
+    with open(out_dir / f"{city}_sampling_report.json", "w") as dst:
+        json.dump(report, dst, indent=2)
+    logger.info(
+        f"Sampled {sum(counts.values())} instead of {len(counts) * max_routes} Google routes"
+    )
+    profiler.write(
+        out_dir / f"{city}_sampling_profile.json", city=city, ors_types=ors_types
+    )
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Generates and compares Google and ORS routes until the estimates converge"
+    )
+    parser.add_argument(
+        "-c",
+        required=True,
+        dest="city",
+        metavar="City name",
+        type=str,
+        help="City name. The AOI is read from data/CITY/CITY.geojson",
+    )
+    parser.add_argument(
+        "-t",
+        required=False,
+        dest="ors_types",
+        metavar="ORS types",
+        type=str,
+        nargs="+",
+        choices=list(ORS_INSTANCES),
+        default=list(ORS_INSTANCES),
+        help="ORS types, default: all",
+    )
+    parser.add_argument(
+        "-M",
+        required=False,
+        dest="metric",
+        metavar="Metric",
+        type=str,
+        default="duration_diff_perc",
+        help="Result column whose estimate has to converge, default = duration_diff_perc",
+    )
+    parser.add_argument(
+        "-W",
+        required=False,
+        dest="max_width",
+        metavar="Interval width",
+        type=float,
+        default=5.0,
+        help="Maximum width of the confidence interval in the unit of the metric, default = 5",
+    )
+    parser.add_argument(
+        "-S",
+        required=False,
+        dest="stratum",
+        metavar="Stratum",
+        type=str,
+        choices=["hour", "all"],
+        default="hour",
+        help="Stop sampling each hour on its own (hour) or all hours together (all), default = hour",
+    )
+    parser.add_argument(
+        "-x",
+        required=False,
+        dest="statistic",
+        metavar="Statistic",
+        type=str,
+        choices=["mean", "mae", "rmse", "median"],
+        default="mean",
+        help="Statistic of the metric, default = mean",
+    )
+    parser.add_argument(
+        "-b",
+        required=False,
+        dest="batch_size",
+        metavar="Batch size",
+        type=int,
+        default=10,
+        help="Number of Google routes per hour and round, default = 10",
+    )
+    parser.add_argument(
+        "-n",
+        required=False,
+        dest="min_routes",
+        metavar="Minimum routes",
+        type=int,
+        default=20,
+        help="Minimum number of routes before sampling stops, default = 20",
+    )
+    parser.add_argument(
+        "-r",
+        required=False,
+        dest="max_routes",
+        metavar="Maximum routes",
+        type=int,
+        default=50,
+        help="Maximum number of Google routes per hour, default = 50",
+    )
+    parser.add_argument(
+        "-s",
+        required=False,
+        dest="splits",
+        metavar="LineString splits",
+        type=int,
+        default=10,
+        help="Route splits, default = 10",
+    )
+    parser.add_argument(
+        "-w",
+        required=False,
+        dest="workers",
+        metavar="Workers",
+        type=int,
+        default=4,
+        help="Number of concurrent ORS requests, default = 4",
+    )
+    parser.add_argument(
+        "-u",
+        required=False,
+        dest="base_url",
+        metavar="Google url",
+        type=str,
+        default=GOOGLE_BASE_URL,
+        help="Base url of the Google Directions API, e.g. of mock_routing_server.py",
+    )
+    parser.add_argument(
+        "-p",
+        required=False,
+        dest="profile",
+        metavar="Profiling options",
+        nargs="*",
+        choices=["cprofile", "memory"],
+        default=None,
+        help="Write a profile report with the time of each stage. Optionally capture a cProfile "
+        "and/or the peak memory per stage, e.g. -p cprofile memory",
+    )
+    args = parser.parse_args()
+
+    data_dir = "data"
+
+    main(
+        data_dir,
+        city=args.city,
+        ors_types=args.ors_types,
+        metric=args.metric,
+        max_width=args.max_width,
+        stratum=args.stratum,
+        statistic=args.statistic,
+        batch_size=args.batch_size,
+        min_routes=args.min_routes,
+        max_routes=args.max_routes,
+        splits=args.splits,
+        workers=args.workers,
+        base_url=args.base_url,
+        profiler=profiler_from_args(args.profile, name="sequential_sampling"),
+    )
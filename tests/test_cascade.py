@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Compares the comparison cascade to the shapely computation of the geometry deviation and Hausdorff distance"""
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pytest
+import shapely
+
+from route_analyst.cascade import ComparisonCascade, simplify
+from route_analyst.similarity import METRIC_TOLERANCE
+
+SHAPES = ["plain", "repeated_end", "revisit", "repeated"]
+
+
+def random_pair(rng, shape):
+    """
+    Creates a random route and a noisy reference route in metres
+    :param shape: 'plain', 'repeated_end' (the last vertex twice), 'revisit' (the route returns along itself) or
+    'repeated' (every vertex twice)
+    """
+    b = np.cumsum(rng.normal(0, 20, (rng.integers(2, 80), 2)), axis=0)
+    a = b + rng.normal(0, rng.choice([1, 5, 15]), b.shape)
+    if shape == "repeated_end":
+        a = np.vstack([a, a[-1:]])
+    elif shape == "revisit":
+        a = np.vstack([a, a[len(a) // 2 :: -1]])
+    elif shape == "repeated":
+        a = np.repeat(a, 2, axis=0)
+    return a, b
+
+
+def pairs(shape, n=50, seed=0):
+    rng = np.random.default_rng([seed, SHAPES.index(shape)])
+    return [random_pair(rng, shape) for _ in range(n)]
+
+
+def exact(a, b, tolerance=METRIC_TOLERANCE):
+    """
+    Computes the geometry deviation in percent as ORSRoute.geometry_diff_perc and the Hausdorff distance with
+    shapely. The segments are intersected one by one, since the intersection of a route passing a part twice counts
+    that part once.
+    """
+    segments = shapely.linestrings(np.stack([a[:-1], a[1:]], axis=1))
+    area = shapely.buffer(shapely.linestrings(b), tolerance, quad_segs=64)
+    same = shapely.length(shapely.intersection(segments, area)).sum()
+    deviation = (1 - same / shapely.length(segments).sum()) * 100
+    distance = shapely.hausdorff_distance(
+        shapely.linestrings(a), shapely.linestrings(b)
+    )
+    return deviation, distance
+
+
+@pytest.mark.parametrize("shape", SHAPES)
+def test_compare_equals_shapely(shape):
+    cascade = ComparisonCascade()
+    for a, b in pairs(shape):
+        deviation, distance = cascade.compare(a, b)
+        exact_deviation, exact_distance = exact(a, b)
+        # the buffer polygon approximates the circular ends of the exact buffer
+        assert deviation == pytest.approx(exact_deviation, abs=0.05)
+        assert distance == pytest.approx(exact_distance)
+        assert 0 <= deviation <= 100
+
+
+@pytest.mark.parametrize("shape", SHAPES)
+def test_threshold_is_lower_bound(shape):
+    threshold = 10.0
+    cascade = ComparisonCascade(threshold=threshold)
+    for a, b in pairs(shape, seed=1):
+        deviation, distance = cascade.compare(a, b)
+        exact_deviation, exact_distance = exact(a, b)
+        assert deviation == pytest.approx(exact_deviation, abs=0.05)
+        if exact_distance <= threshold:
+            assert distance == pytest.approx(exact_distance)
+        else:
+            assert threshold < distance <= exact_distance * (1 + 1e-9)
+
+
+def test_identical_routes():
+    a, _ = random_pair(np.random.default_rng(2), "plain")
+    assert ComparisonCascade().compare(a, a.copy()) == (0.0, 0.0)
+    assert ComparisonCascade().compare(a, a[::-1]) == (0.0, 0.0)
+
+
+@pytest.mark.parametrize("shape", SHAPES)
+def test_simplify_keeps_endpoints(shape):
+    for a, _ in pairs(shape, n=20, seed=3):
+        simple, positions = simplify(a, 2.0)
+        assert positions[0] == 0 and positions[-1] == len(a) - 1
+        assert np.all(np.diff(positions) > 0)
+        np.testing.assert_array_equal(simple, a[positions])
+
+
+def test_compare_batch_in_processes_equals_serial():
+    routes, references = zip(*[pair for shape in SHAPES for pair in pairs(shape)])
+    serial = ComparisonCascade().compare_batch(routes, references)
+    cascade = ComparisonCascade()
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        parallel = cascade.compare_batch(
+            routes, references, executor=executor, task_size=30
+        )
+    np.testing.assert_array_equal(parallel, serial)
+    assert cascade.report()["pairs"] == len(routes)
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Checks that importing route_analyst is fast and does not load the heavy modules it loads lazily"""
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+SRC_DIR = Path(__file__).parent.parent / "src"
+
+#: Modules loaded on first use, matplotlib is the most expensive one
+LAZY_MODULES = ["matplotlib", "geopandas", "openrouteservice"]
+
+#: Import statements of the package and of its lazily exported names
+IMPORTS = [
+    "import route_analyst",
+    "from route_analyst import ORSRoute, GoogleRoute",
+    "from route_analyst import ORSRoutingClient, GoogleRoutingClient",
+    "from route_analyst import ORSDirectionsResponse, GoogleDirectionsResponse",
+]
+
+#: Maximum import time in seconds, about five times the time of the slowest import without the lazy modules
+MAX_IMPORT_SECONDS = 1.0
+
+
+def run_import(statement, modules, repeat=3):
+    """
+    Runs an import statement in fresh interpreters
+    :param statement: Import statement
+    :param modules: Names of the modules to look for
+    :param repeat: Number of interpreters, the minimum time is returned
+    :return: Import time in seconds and list of the modules loaded by the statement
+    """
+    code = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        f"{statement}\n"
+        "seconds = time.perf_counter() - start\n"
+        f"print(json.dumps([seconds, [m for m in {list(modules)!r} if m in sys.modules]]))"
+    )
+    env = dict(os.environ, PYTHONPATH=str(SRC_DIR))
+    runs = [
+        json.loads(
+            subprocess.run(
+                [sys.executable, "-c", code], env=env, capture_output=True, check=True
+            ).stdout
+        )
+        for _ in range(repeat)
+    ]
+    return min(seconds for seconds, _ in runs), runs[0][1]
+
+
+@pytest.mark.parametrize("module", ["geopandas", "shapely", "pandas", "matplotlib"])
+def test_import_is_lazy(module):
+    assert run_import("import route_analyst", [module], repeat=1)[1] == []
+
+
+@pytest.mark.parametrize("statement", IMPORTS)
+def test_import_is_fast(statement):
+    seconds, loaded = run_import(statement, LAZY_MODULES)
+    assert loaded == []
+    assert seconds < MAX_IMPORT_SECONDS
@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Compares the similarity kernels to shapely and to brute-force references"""
+
+import numpy as np
+import pytest
+import shapely
+
+from route_analyst import similarity
+from route_analyst.similarity import (
+    METRIC_TOLERANCE,
+    POINT_BLOCK,
+    SEGMENT_BLOCK,
+    batch_frechet,
+    batch_similarity,
+    hausdorff,
+    overlap,
+    point_segment_distances,
+)
+
+
+def random_route(rng, n, step=20.0):
+    return np.cumsum(rng.normal(0, step, (n, 2)), axis=0)
+
+
+def random_pairs(seed=0, n=40, max_vertices=60):
+    """Random routes and noisy copies of them, some with repeated vertices, single points or reversed"""
+    rng = np.random.default_rng(seed)
+    pairs = []
+    for k in range(n):
+        b = random_route(rng, rng.integers(1, max_vertices))
+        if k % 5 == 0:
+            # a monotonous route through some of the coordinates of b
+            a = np.sort(
+                b[rng.permutation(len(b))[: rng.integers(1, len(b) + 1)]], axis=0
+            )
+        else:
+            a = b.copy()
+        a = a + rng.normal(0, rng.choice([0.5, 5, 30]), a.shape)
+        if k % 4 == 1:
+            a = np.repeat(a, 2, axis=0)
+        elif k % 4 == 2:
+            a = a[::-1]
+        pairs.append((a, b))
+    return pairs
+
+
+def brute_force_distances(points, line):
+    """Distances of the points to every segment of the line"""
+    if len(line) == 1:
+        line = np.repeat(line, 2, axis=0)
+    start, direction = line[:-1], np.diff(line, axis=0)
+    length_sq = (direction**2).sum(axis=1)
+    offset = points[:, None, :] - start[None]
+    t = np.clip(
+        (offset * direction).sum(axis=2) / np.where(length_sq > 0, length_sq, 1), 0, 1
+    )
+    return np.hypot(*(offset - t[..., None] * direction).transpose(2, 0, 1)).min(axis=1)
+
+
+def reference_frechet(a, b):
+    """Discrete Fréchet distance by the O(nm) dynamic programme over the coupling matrix"""
+    distances = np.hypot(*(a[:, None, :] - b[None, :, :]).transpose(2, 0, 1))
+    coupling = np.empty_like(distances)
+    for i in range(len(a)):
+        for j in range(len(b)):
+            if i == 0 and j == 0:
+                reachable = 0.0
+            elif i == 0:
+                reachable = coupling[i, j - 1]
+            elif j == 0:
+                reachable = coupling[i - 1, j]
+            else:
+                reachable = min(
+                    coupling[i - 1, j], coupling[i - 1, j - 1], coupling[i, j - 1]
+                )
+            coupling[i, j] = max(reachable, distances[i, j])
+    return coupling[-1, -1]
+
+
+def shapely_overlap(a, b, tolerance):
+    """Share of the length of a within the buffer of b, intersecting the segments one by one"""
+    segments = shapely.linestrings(np.stack([a[:-1], a[1:]], axis=1))
+    area = shapely.buffer(shapely.linestrings(b), tolerance, quad_segs=64)
+    return (
+        shapely.length(shapely.intersection(segments, area)).sum()
+        / shapely.length(segments).sum()
+    )
+
+
+def as_line(coordinates):
+    return shapely.linestrings(
+        np.repeat(coordinates, 2, axis=0) if len(coordinates) == 1 else coordinates
+    )
+
+
+def test_point_segment_distances_equal_brute_force():
+    rng = np.random.default_rng(1)
+    # more points than POINT_BLOCK and segments than SEGMENT_BLOCK, so that blocks are pruned and chunked
+    line = random_route(rng, 20 * SEGMENT_BLOCK)
+    points = rng.uniform(
+        line.min(axis=0) - 50, line.max(axis=0) + 50, (POINT_BLOCK + 500, 2)
+    )
+    np.testing.assert_allclose(
+        point_segment_distances(points, line),
+        brute_force_distances(points, line),
+        atol=1e-9,
+    )
+
+
+def test_hausdorff_equals_shapely():
+    for a, b in random_pairs():
+        assert hausdorff(a, b) == pytest.approx(
+            shapely.hausdorff_distance(as_line(a), as_line(b)), abs=1e-9
+        )
+
+
+def test_overlap_equals_shapely_buffer():
+    for a, b in random_pairs(seed=2):
+        if len(a) < 2:
+            continue
+        # the buffer polygon approximates the circular ends of the exact buffer
+        assert overlap(a, b, METRIC_TOLERANCE) == pytest.approx(
+            shapely_overlap(a, b, METRIC_TOLERANCE), abs=5e-4
+        )
+
+
+def test_frechet_numpy_equals_reference():
+    pairs = random_pairs(seed=3)
+    routes_a, routes_b = zip(*pairs)
+    np.testing.assert_allclose(
+        similarity._frechet_numpy(routes_a, routes_b, np.inf),
+        [reference_frechet(a, b) for a, b in pairs],
+    )
+
+
+def test_frechet_jit_equals_reference():
+    pytest.importorskip("numba")
+    for a, b in random_pairs(seed=4):
+        assert similarity._frechet_jit(a, b, np.inf) == pytest.approx(
+            reference_frechet(a, b)
+        )
+
+
+@pytest.mark.parametrize("jit", [False, True])
+def test_frechet_threshold_is_lower_bound(monkeypatch, jit):
+    if jit:
+        pytest.importorskip("numba")
+    else:
+        monkeypatch.setattr(similarity, "njit", None)
+    pairs = random_pairs(seed=5)
+    exact = np.array([reference_frechet(a, b) for a, b in pairs])
+    threshold = np.median(exact)
+    result = batch_frechet(*zip(*pairs), threshold=threshold)
+    below = exact <= threshold
+    np.testing.assert_allclose(result[below], exact[below])
+    assert np.all(result[~below] > threshold)
+    assert np.all(result[~below] <= exact[~below] * (1 + 1e-9))
+
+
+def test_hausdorff_threshold_is_lower_bound():
+    pairs = random_pairs(seed=6)
+    exact = np.array([hausdorff(a, b) for a, b in pairs])
+    threshold = np.median(exact)
+    result = batch_similarity(*zip(*pairs), metrics=["hausdorff"], threshold=threshold)[
+        "hausdorff"
+    ]
+    below = exact <= threshold
+    np.testing.assert_allclose(result[below], exact[below])
+    assert np.all(result[~below] > threshold)
+    assert np.all(result[~below] <= exact[~below] * (1 + 1e-9))
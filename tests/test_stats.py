@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Checks that the bootstrap confidence intervals only depend on the seed"""
+
+import numpy as np
+import pandas as pd
+
+from route_analyst.stats import bootstrap_ci, bootstrap_difference
+
+
+def random_results(seed=0, n=300):
+    rng = np.random.default_rng(seed)
+    google = rng.uniform(300, 3000, n)
+    return pd.DataFrame(
+        {
+            "route_id": np.tile(np.arange(n // 2), 2),
+            "ors_type": np.repeat(["normal", "modelled_p85"], n // 2),
+            "google_dur_in_traffic_sec": google,
+            "ors_dur_sec": google * rng.normal(1, 0.2, n),
+        }
+    )
+
+
+def test_bootstrap_ci_is_independent_of_workers():
+    results = random_results()
+    metric = ("ors_dur_sec", "google_dur_in_traffic_sec")
+    serial = bootstrap_ci(results, metric, n_resamples=1200, workers=1)
+    parallel = bootstrap_ci(results, metric, n_resamples=1200, workers=2)
+    pd.testing.assert_frame_equal(serial, parallel)
+    assert (serial["lower"] <= serial["mae"]).all()
+    assert (serial["mae"] <= serial["upper"]).all()
+
+
+def test_bootstrap_difference_is_independent_of_workers():
+    results = random_results()
+    metric = ("ors_dur_sec", "google_dur_in_traffic_sec")
+    serial = bootstrap_difference(
+        results, metric, "modelled_p85", "normal", n_resamples=1200, workers=1
+    )
+    parallel = bootstrap_difference(
+        results, metric, "modelled_p85", "normal", n_resamples=1200, workers=2
+    )
+    assert serial == parallel